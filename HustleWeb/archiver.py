@@ -0,0 +1,188 @@
+"""
+Archivage du chat: garde la table messages petite
+
+Politique de rétention (par jeu, table chat_retention, sinon défauts globaux):
+- keep_last: les N messages les plus récents restent en table chaude
+- keep_days: les messages de plus de D jours sont archivés
+- Un message est archivé dès qu'il sort d'une des deux limites définies
+- Opt-in: défauts globaux sans limite, rien n'est archivé sans politique explicite
+  (POST /admin/games/{game_id}/retention ou chat_retention_* dans la configuration)
+
+Archiveur:
+- Tâche de fond (chat_archive_interval secondes, 0 par défaut = désactivée),
+  démarrée par le lifespan
+- run_game(): passage immédiat sur un jeu, lancé à chaque changement de sa politique
+- Par lots de chat_archive_chunk lignes: INSERT OR IGNORE dans messages_archive
+  + DELETE dans messages, une transaction courte par lot
+- Pause entre lots: les écritures du chat ne sont jamais bloquées longtemps
+- Idempotent: plusieurs workers peuvent tourner sans doublon (même message_id)
+
+Statistiques exposées:
+- runs, archived_total, last_archived, last_duration, last_run_at, errors
+"""
+import asyncio
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Optional, Tuple
+from sqlalchemy import delete, func, insert, or_, select
+from config import settings
+from models import async_engine, ChatRetention, Message, MessageArchive, User
+
+Policy = Tuple[Optional[int], Optional[int]]  # (keep_last, keep_days)
+
+def default_policy() -> Policy:
+   """Politique globale (0 ou moins = limite désactivée)"""
+   keep_last = settings.chat_retention_keep_last if settings.chat_retention_keep_last > 0 else None
+   keep_days = settings.chat_retention_days if settings.chat_retention_days > 0 else None
+   return keep_last, keep_days
+
+async def load_policies(conn) -> Dict[int, Policy]:
+   """Surcharges par jeu; un champ NULL reprend la valeur globale"""
+   keep_last, keep_days = default_policy()
+   rows = await conn.execute(select(ChatRetention.game_id, ChatRetention.keep_last, ChatRetention.keep_days))
+   return {
+       game_id: (last if last is not None else keep_last, days if days is not None else keep_days)
+       for game_id, last, days in rows
+   }
+
+async def archive_game(game_id: int, policy: Policy, chunk: int, pause: float) -> int:
+   """
+   Archive les messages d'un jeu hors politique, par lots
+   - Retourne le nombre de messages déplacés
+   """
+   keep_last, keep_days = policy
+   conditions = []
+
+   async with async_engine.connect() as conn:
+       if keep_last:
+           # (keep_last + 1)e message le plus récent: lui et les plus anciens sortent
+           boundary = await conn.scalar(
+               select(Message.message_id)
+               .where(Message.game_id == game_id)
+               .order_by(Message.message_id.desc())
+               .offset(keep_last).limit(1)
+           )
+           if boundary is not None:
+               conditions.append(Message.message_id <= boundary)
+   if keep_days:
+       conditions.append(Message.created_at < datetime.now(timezone.utc) - timedelta(days=keep_days))
+   if not conditions:
+       return 0
+
+   moved = 0
+   while True:
+       async with async_engine.begin() as conn:
+           ids = list(await conn.scalars(
+               select(Message.message_id)
+               .where(Message.game_id == game_id, or_(*conditions))
+               .order_by(Message.message_id)
+               .limit(chunk)
+           ))
+           if not ids:
+               return moved
+           await conn.execute(
+               insert(MessageArchive).prefix_with("OR IGNORE").from_select(
+                   ["message_id", "game_id", "user_id", "username", "content", "created_at"],
+                   select(Message.message_id, Message.game_id, Message.user_id, func.coalesce(User.username, ""), Message.content, Message.created_at)
+                   .outerjoin(User, User.user_id == Message.user_id)
+                   .where(Message.message_id.in_(ids))
+               )
+           )
+           await conn.execute(delete(Message).where(Message.message_id.in_(ids)))
+       moved += len(ids)
+       if len(ids) < chunk:
+           return moved
+       await asyncio.sleep(pause)  # laisse passer les écritures du chat
+
+class ChatArchiver:
+   """Tâche périodique d'archivage de tous les jeux ayant des messages"""
+   def __init__(self, interval: float, chunk: int, pause: float):
+       self.interval = interval
+       self.chunk = chunk
+       self.pause = pause
+       self._task: Optional[asyncio.Task] = None
+       self.runs = 0
+       self.errors = 0
+       self.archived_total = 0
+       self.last_archived = 0
+       self.last_duration = 0.0
+       self.last_run_at: Optional[datetime] = None
+
+   async def run_once(self) -> int:
+       """Un passage complet sur tous les jeux; retourne le nombre archivé"""
+       start = time.perf_counter()
+       default = default_policy()
+       async with async_engine.connect() as conn:
+           policies = await load_policies(conn)
+           if any(default):
+               game_ids = list(await conn.scalars(select(Message.game_id).distinct()))
+           else:
+               game_ids = list(policies)  # sans défaut global: jeux ayant une politique seulement
+       archived = 0
+       for game_id in game_ids:
+           archived += await archive_game(game_id, policies.get(game_id, default), self.chunk, self.pause)
+       self._record(archived, start)
+       return archived
+
+   async def run_game(self, game_id: int) -> int:
+       """Passage sur un seul jeu (politique venant de changer); retourne le nombre archivé"""
+       start = time.perf_counter()
+       try:
+           async with async_engine.connect() as conn:
+               policy = (await load_policies(conn)).get(game_id, default_policy())
+           archived = await archive_game(game_id, policy, self.chunk, self.pause)
+       except Exception as e:
+           self.errors += 1
+           print(f"ERREUR ARCHIVAGE: {str(e)}")
+           return 0
+       self._record(archived, start)
+       return archived
+
+   def _record(self, archived: int, start: float):
+       self.runs += 1
+       self.archived_total += archived
+       self.last_archived = archived
+       self.last_duration = time.perf_counter() - start
+       self.last_run_at = datetime.now(timezone.utc)
+
+   async def _loop(self):
+       while True:
+           await asyncio.sleep(self.interval)
+           try:
+               archived = await self.run_once()
+               if archived:
+                   print(f"🗄️  Chat: {archived} message(s) archivé(s)")
+           except asyncio.CancelledError:
+               raise
+           except Exception as e:
+               self.errors += 1
+               print(f"ERREUR ARCHIVAGE: {str(e)}")
+
+   def start(self):
+       """Démarre la tâche périodique (désactivée si chat_archive_interval <= 0)"""
+       if self.interval > 0 and (self._task is None or self._task.done()):
+           self._task = asyncio.create_task(self._loop())
+
+   async def close(self):
+       """Arrête la tâche (un lot en cours est annulé et sa transaction annulée)"""
+       if self._task is not None:
+           self._task.cancel()
+           try:
+               await self._task
+           except asyncio.CancelledError:
+               pass
+           self._task = None
+
+   def stats(self) -> Dict:
+       return {
+           "interval": self.interval,
+           "policy_default": dict(zip(("keep_last", "keep_days"), default_policy())),
+           "runs": self.runs,
+           "errors": self.errors,
+           "archived_total": self.archived_total,
+           "last_archived": self.last_archived,
+           "last_duration": round(self.last_duration, 6),
+           "last_run_at": self.last_run_at.isoformat() if self.last_run_at else None
+       }
+
+archiver = ChatArchiver(settings.chat_archive_interval, settings.chat_archive_chunk, settings.chat_archive_pause)
@@ -4,7 +4,7 @@ Backend Game Store - Gestion utilisateurs, jeux et authentification
 Architecture backend:
 - JWT pour authentification stateless avec cookies httpOnly
 - Bcrypt pour hash sécurisé des mots de passe
-- SQLAlchemy ORM avec pattern Repository
+- SQLAlchemy ORM async (AsyncSession) avec pattern Repository
 - Système d'autorisation par rôles (admin/user)
 
 Responsabilités:
@@ -12,20 +12,28 @@ Responsabilités:
 - CRUD utilisateurs avec permissions
 - Gestion catalogue jeux et achats
 - Système de messages par jeu
-- Administration (ban/unban utilisateurs)
+- Administration (recherche utilisateurs, ban/unban unitaire ou en masse)
 
 Sécurité:
 - Mots de passe hashés avec salt unique
 - Tokens JWT avec expiration 24h
+- Identité (Principal) en cache court, invalidée à chaque ban/unban/MAJ profil
 - Vérification propriété pour messages
 - Protection contre injections SQL via ORM
 """
-import bcrypt
+import hashlib
+import re
 from fastapi import HTTPException, Depends, Cookie
+from dataclasses import dataclass
 from datetime import datetime, timezone, timedelta
-from typing import Optional, List
-from sqlalchemy.orm import Session
-from models import User, Game, Purchase, Message, SessionLocal
+from typing import Optional, List, Tuple, Dict, Any
+from sqlalchemy import select, update, cast, func, literal, tuple_, Float, DateTime, text
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from models import User, Game, Purchase, Message, MessageArchive, Rating, DataVersion, AsyncSessionLocal
+from cache import TTLCache
+from passwords import password_hasher
+from config import settings
 from jose import JWTError, jwt
 
 # Configuration JWT (à sécuriser en production)
@@ -33,17 +41,15 @@ SECRET_KEY = "keydecon145"  # TODO: Variable environnement
 ALGORITHM = "HS256"
 ListeAdmin = ["Mathias", "Alae", "Youssef", "Ziad"]  # TODO: Système rôles en DB
 
-def get_db():
+async def get_db():
    """
-   Générateur de session SQLAlchemy pour injection de dépendances
+   Générateur de session SQLAlchemy async pour injection de dépendances
    - Session par requête avec fermeture automatique
-   - Thread-safe et rollback automatique si exception
+   - Requêtes non bloquantes pour l'event loop (aiosqlite)
+   - Rollback automatique à la fermeture si transaction en cours
    """
-   db = SessionLocal()
-   try:
+   async with AsyncSessionLocal() as db:
        yield db
-   finally:
-       db.close()
 
 def create_jwt(user_id: int) -> str:
    """
@@ -55,35 +61,93 @@ def create_jwt(user_id: int) -> str:
    payload = {"sub": str(user_id), "exp": expires}
    return jwt.encode(payload, SECRET_KEY, algorithm=ALGORITHM)
 
-def get_current_user(token: str = Cookie(default=None, alias="token"), db: Session = Depends(get_db)) -> User:
+# ================== CACHE D'AUTHENTIFICATION ==================
+
+@dataclass(frozen=True)
+class Principal:
+   """
+   Identité authentifiée mise en cache (sous-ensemble immuable de User)
+   - Mêmes noms d'attributs que User pour les routes et middlewares
+   """
+   user_id: int
+   username: str
+   is_admin: bool
+   is_banned: bool
+   photo_url: Optional[str]
+
+# Caches par worker, bornés en taille et en durée
+# - principal_cache: user_id -> Principal (évite la requête users à chaque appel)
+# - token_cache: empreinte du cookie -> user_id (évite la vérification de signature)
+principal_cache = TTLCache("principals", maxsize=settings.principal_cache_maxsize, ttl=settings.principal_cache_ttl)
+token_cache = TTLCache("tokens", maxsize=settings.token_cache_maxsize, ttl=settings.token_cache_ttl)
+
+def user_tag(user_id: int) -> str:
+   """Tag de dépendance des entrées d'authentification d'un utilisateur"""
+   return f"user:{user_id}"
+
+def invalidate_principal(user_id: int):
+   """
+   Oublie immédiatement l'identité en cache d'un utilisateur
+   - Appelé par ban/unban, mise à jour du profil et reset du mot de passe
+   - Retire aussi les tokens vérifiés de cet utilisateur
+   """
+   principal_cache.invalidate_tags(user_tag(user_id))
+   token_cache.invalidate_tags(user_tag(user_id))
+
+def decode_token(token: str) -> int:
+   """
+   Vérifie un JWT et retourne son user_id, avec cache des tokens déjà vérifiés
+   - Entrée du cache expirée au plus tard à l'expiration du token
+   - Raise 401 si signature invalide, token expiré ou payload incomplet
+   """
+   key = hashlib.sha256(token.encode("utf-8")).digest()
+   found, user_id = token_cache.get(key)
+   if found:
+       token_cache.hits += 1
+       return user_id
+   token_cache.misses += 1
+
+   try:
+       payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+       user_id = int(payload.get("sub"))
+       expires = float(payload["exp"])
+   except (JWTError, TypeError, ValueError, KeyError):
+       raise HTTPException(401, "Invalid token")
+
+   remaining = expires - datetime.now(timezone.utc).timestamp()
+   if remaining > 0:
+       token_cache.set(key, user_id, tags=[user_tag(user_id)], ttl=remaining)
+   return user_id
+
+async def load_principal(db: AsyncSession, user_id: int) -> Optional[Principal]:
+   """Identité d'un utilisateur depuis le cache (requête users en cas de miss)"""
+   async def load():
+       row = (await db.execute(
+           select(User.user_id, User.username, User.is_admin, User.is_banned, User.photo_url)
+           .where(User.user_id == user_id)
+       )).first()
+       return Principal(*row) if row else None
+
+   return await principal_cache.get_or_load(user_id, load, tags=[user_tag(user_id)])
+
+async def get_current_user(token: str = Cookie(default=None, alias="token"), db: AsyncSession = Depends(get_db)) -> Principal:
    """
    Récupère l'utilisateur authentifié depuis le token JWT cookie
-   - Décode JWT et valide signature + expiration
-   - Charge utilisateur frais depuis DB
-   - Raise 401 si pas de token ou token invalide
+   - Décode JWT et valide signature + expiration (cache des tokens vérifiés)
+   - Identité servie par le cache des principals, DB si absente ou expirée
+   - Raise 401 si pas de token, token invalide ou utilisateur inconnu
    """
    if not token:
        raise HTTPException(401, "Not authenticated")
    
-   try:
-       payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-       user_id = payload.get("sub")
-       if not user_id:
-           raise HTTPException(401, "Invalid token")
-       
-       user_id_int = int(user_id)
-       user = db.query(User).filter(User.user_id == user_id_int).first()
-       if not user:
-           raise HTTPException(401, "User not found")
-       
-       return user
+   user_id = decode_token(token)
+   principal = await load_principal(db, user_id)
+   if not principal:
+       raise HTTPException(401, "User not found")
    
-   except JWTError:
-       raise HTTPException(401, "Invalid token")
-   except Exception:
-       raise HTTPException(500, "Internal server error")
+   return principal
 
-def verify_admin(user: User = Depends(get_current_user)) -> User:
+def verify_admin(user: Principal = Depends(get_current_user)) -> Principal:
    """
    Vérifie que l'utilisateur a les droits administrateur
    - Utilise get_current_user puis vérifie flag is_admin
@@ -95,88 +159,251 @@ def verify_admin(user: User = Depends(get_current_user)) -> User:
 
 # ================== GESTION MOTS DE PASSE ==================
 
-def hash_password(password: str) -> str:
-   """Hash un mot de passe avec bcrypt et salt unique"""
-   return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
+async def hash_password(password: str) -> str:
+   """Hash un mot de passe avec bcrypt et salt unique (pool de threads dédié)"""
+   return await password_hasher.hash(password)
 
-def verify_password(plain_password: str, hashed_password: str) -> bool:
-   """Vérifie un mot de passe contre son hash (timing-safe)"""
-   return bcrypt.checkpw(plain_password.encode('utf-8'), hashed_password.encode('utf-8'))
+async def verify_password(plain_password: str, hashed_password: str) -> bool:
+   """Vérifie un mot de passe contre son hash (timing-safe, pool de threads dédié)"""
+   return await password_hasher.verify(plain_password, hashed_password)
 
 # ================== GESTION UTILISATEURS ==================
 
-def create_user(db: Session, username: str, email: str, password: str) -> Optional[User]:
+async def create_user(db: AsyncSession, username: str, email: str, password: str) -> Optional[User]:
    """
    Crée un nouvel utilisateur avec vérification d'unicité
    - Vérifie unicité username ET email
    - Détermine si admin selon liste hardcodée
    - Hash le mot de passe avant stockage
    """
-   if db.query(User).filter((User.email == email) | (User.username == username)).first():
+   existing = await db.scalar(select(User.user_id).where((User.email == email) | (User.username == username)).limit(1))
+   if existing:
        return None
    
    user = User(
        username=username,
        email=email,
-       hashed_password=hash_password(password),
+       hashed_password=await hash_password(password),
        created_at=datetime.now(timezone.utc),
        last_login=datetime.now(timezone.utc),
        is_admin=(username in ListeAdmin)
    )
    
    db.add(user)
-   db.commit()
-   db.refresh(user)
+   await db.commit()
+   await db.refresh(user)
    return user
 
-def authenticate_user(db: Session, username: str, password: str) -> Optional[User]:
+async def authenticate_user(db: AsyncSession, username: str, password: str) -> Optional[User]:
    """
    Authentifie un utilisateur et met à jour last_login
    - Vérification timing-safe du password
    - Mise à jour last_login si succès
+   - Hash recalculé si le coût bcrypt configuré a changé
    """
-   user = db.query(User).filter(User.username == username).first()
+   user = await db.scalar(select(User).where(User.username == username))
    
-   if not user or not verify_password(password, user.hashed_password):
+   if not user or not await verify_password(password, user.hashed_password):
        return None
    
+   if password_hasher.needs_rehash(user.hashed_password):
+       user.hashed_password = await hash_password(password)
    user.last_login = datetime.now(timezone.utc)
-   db.commit()
+   await db.commit()
    return user
 
-def get_user_by_id(db: Session, user_id: int) -> Optional[User]:
+async def get_user_by_id(db: AsyncSession, user_id: int) -> Optional[User]:
    """Récupère un utilisateur par son ID"""
-   return db.query(User).filter(User.user_id == user_id).first()
+   return await db.get(User, user_id)
 
 # ================== GESTION CATALOGUE JEUX ==================
 
-def create_game(db: Session, title: str, description: str, price: float, publisher: str, category: str, platforms: str) -> Game:
+async def create_game(db: AsyncSession, title: str, description: str, price: float, publisher: str, category: str, platforms: str) -> Optional[Game]:
    """
    Crée un nouveau jeu dans le catalogue
+   - None si la clé naturelle (title, publisher) existe déjà
+   - INSERT ... ON CONFLICT DO NOTHING: deux créations simultanées du même jeu
+     n'en insèrent qu'un, l'autre obtient None (jamais d'IntegrityError)
    - Release date = date d'ajout au catalogue
    """
-   game = Game(
-       title=title, description=description, price=price,
-       publisher=publisher, category=category, platforms=platforms,
-       release_date=datetime.now(timezone.utc)
+   game_id = await db.scalar(
+       sqlite_insert(Game)
+       .values(
+           title=title, description=description, price=price,
+           publisher=publisher, category=category, platforms=platforms,
+           release_date=datetime.now(timezone.utc)
+       )
+       .on_conflict_do_nothing(index_elements=["title", "publisher"])
+       .returning(Game.game_id)
    )
-   
-   db.add(game)
-   db.commit()
-   db.refresh(game)
-   return game
+   await db.commit()
+   if game_id is None:
+       return None
+   return await db.get(Game, game_id)
+
+GAME_UPSERT_COLUMNS = ("description", "price", "category", "platforms")
+GAME_OPTIONAL_COLUMNS = ("release_date", "image")
+
+async def upsert_games(db: AsyncSession, games: List[Dict[str, Any]]) -> List[bool]:
+   """
+   Insère ou met à jour un lot de jeux validés sur la clé naturelle (title, publisher)
+   - Un SELECT des clés existantes puis INSERT ... ON CONFLICT DO UPDATE multi-lignes
+   - Colonnes optionnelles (release_date, image) mises à jour seulement si fournies
+   - Retourne, dans l'ordre, True pour une création et False pour une mise à jour
+   - Commit par lot: l'appelant découpe les gros imports
+   """
+   if not games:
+       return []
+   keys = [(game["title"], game["publisher"]) for game in games]
+   rows = await db.execute(
+       select(Game.title, Game.publisher, Game.game_id).where(tuple_(Game.title, Game.publisher).in_(set(keys)))
+   )
+   existing = {(title, publisher): game_id for title, publisher, game_id in rows}
+
+   created, seen = [], set(existing)
+   for key in keys:
+       created.append(key not in seen)
+       seen.add(key)
+
+   # Lignes groupées par colonnes optionnelles présentes: VALUES homogène par instruction
+   now = datetime.now(timezone.utc)
+   groups: Dict[Tuple[str, ...], List[Dict[str, Any]]] = {}
+   for game in games:
+       optional = tuple(column for column in GAME_OPTIONAL_COLUMNS if game.get(column) is not None)
+       groups.setdefault(optional, []).append(game)
+   for optional, group in groups.items():
+       values = [
+           {"title": g["title"], "publisher": g["publisher"], "release_date": now, **{c: g[c] for c in GAME_UPSERT_COLUMNS + optional}}
+           for g in group
+       ]
+       stmt = sqlite_insert(Game).values(values)
+       stmt = stmt.on_conflict_do_update(
+           index_elements=["title", "publisher"],
+           set_={column: stmt.excluded[column] for column in GAME_UPSERT_COLUMNS + optional}
+       )
+       await db.execute(stmt)
+   await db.commit()
+   return created
 
-def get_game_by_id(db: Session, game_id: int) -> Optional[Game]:
+async def get_game_by_id(db: AsyncSession, game_id: int) -> Optional[Game]:
    """Récupère un jeu par son ID"""
-   return db.query(Game).filter(Game.game_id == game_id).first()
+   return await db.get(Game, game_id)
+
+async def get_all_games(db: AsyncSession, limit: int = 100, after_id: Optional[int] = None) -> List[Game]:
+   """
+   Liste paginée des jeux par clé primaire (max 100 par défaut)
+   - Keyset: after_id = dernier game_id de la page précédente (pas d'OFFSET)
+   """
+   stmt = select(Game).order_by(Game.game_id).limit(limit)
+   if after_id is not None:
+       stmt = stmt.where(Game.game_id > after_id)
+   result = await db.scalars(stmt)
+   return list(result)
+
+# Pondération bm25 par colonne: title, description, publisher, category
+FTS_WEIGHTS = (10.0, 1.0, 4.0, 4.0)
+MAX_SEARCH_TERMS = 8
+
+def build_fts_query(raw: str) -> Optional[str]:
+   """
+   Convertit une saisie libre en requête FTS5 sûre
+   - Mots extraits puis quotés (aucun opérateur FTS injectable)
+   - Suffixe * pour la recherche par préfixe ("cyb" trouve "Cyber")
+   - Mots combinés en ET implicite, None si aucun mot exploitable
+   """
+   terms = re.findall(r"\w+", raw, flags=re.UNICODE)[:MAX_SEARCH_TERMS]
+   if not terms:
+       return None
+   return " ".join(f'"{term}"*' for term in terms)
+
+async def search_games(db: AsyncSession, raw_query: str, limit: int = 20, after: Optional[Tuple[float, int]] = None) -> List:
+   """
+   Recherche plein texte classée dans le catalogue (index games_fts)
+   - Score bm25 (plus petit = plus pertinent), départage par game_id
+   - Keyset sur (score, game_id) pour paginer sans OFFSET
+   - Retourne des lignes (score, colonnes du jeu)
+   """
+   match = build_fts_query(raw_query)
+   if match is None:
+       return []
+
+   keyset = "WHERE (hits.score, hits.game_id) > (:after_score, :after_id)" if after else ""
+   stmt = text(f"""
+       SELECT hits.score, g.game_id, g.title, g.description, g.price, g.release_date,
+              g.publisher, g.category, g.platforms, g.rating_avg, g.image
+       FROM (
+           SELECT rowid AS game_id, bm25(games_fts, {", ".join(str(w) for w in FTS_WEIGHTS)}) AS score
+           FROM games_fts WHERE games_fts MATCH :match
+       ) AS hits
+       JOIN games AS g ON g.game_id = hits.game_id
+       {keyset}
+       ORDER BY hits.score, hits.game_id
+       LIMIT :limit
+   """).columns(release_date=DateTime)
+   params = {"match": match, "limit": limit}
+   if after:
+       params.update(after_score=after[0], after_id=after[1])
+   result = await db.execute(stmt, params)
+   return list(result)
+
+# ================== CACHE CATALOGUE ==================
+
+# Cache des lectures catalogue (valeurs sérialisées, jamais d'objets ORM)
+# - Clés préfixées par le compteur data_versions (triggers sur games et ratings):
+#   une écriture dans n'importe quel worker change la clé, aucune invalidation locale
+# - Entrées d'une version dépassée jamais relues, libérées par TTL / LRU
+catalog_cache = TTLCache("catalog", maxsize=settings.catalog_cache_maxsize, ttl=settings.catalog_cache_ttl)
 
-def get_all_games(db: Session, skip: int = 0, limit: int = 100) -> List[Game]:
-   """Liste paginée de tous les jeux (max 100 par défaut)"""
-   return db.query(Game).offset(skip).limit(limit).all()
+async def get_catalog_version(db: AsyncSession) -> Tuple[int, Optional[datetime]]:
+   """Compteur du catalogue maintenu par triggers (lecture par clé primaire)"""
+   row = (await db.execute(select(DataVersion.version, DataVersion.updated_at).where(DataVersion.name == "catalog"))).first()
+   return (row.version, row.updated_at) if row else (0, None)
+
+def game_to_dict(game: Game) -> dict:
+   """Sérialisation d'un jeu pour le cache et les réponses JSON"""
+   return {
+       "game_id": game.game_id,
+       "title": game.title,
+       "description": game.description,
+       "price": float(game.price),
+       "release_date": game.release_date.isoformat() if game.release_date else None,
+       "publisher": game.publisher,
+       "category": game.category,
+       "platforms": game.platforms,
+       "rating_avg": float(game.rating_avg or 0),
+       "image": game.image or "#333"
+   }
+
+async def get_catalog_games(db: AsyncSession, limit: int = 100, after_id: Optional[int] = None, version: Optional[int] = None) -> List[dict]:
+   """
+   Page du catalogue servie depuis le cache (get_all_games en cas de miss)
+   - version: compteur du catalogue déjà lu par l'appelant, sinon lu ici
+   """
+   if version is None:
+       version, _ = await get_catalog_version(db)
+
+   async def load():
+       return [game_to_dict(game) for game in await get_all_games(db, limit=limit, after_id=after_id)]
+
+   return await catalog_cache.get_or_load(("games", version, limit, after_id), load)
+
+async def get_catalog_game(db: AsyncSession, game_id: int, version: Optional[int] = None) -> Optional[dict]:
+   """
+   Fiche d'un jeu servie depuis le cache (get_game_by_id en cas de miss)
+   - Un jeu absent est aussi mis en cache, pour cette version du catalogue seulement
+   """
+   if version is None:
+       version, _ = await get_catalog_version(db)
+
+   async def load():
+       game = await get_game_by_id(db, game_id)
+       return game_to_dict(game) if game else None
+
+   return await catalog_cache.get_or_load(("game", version, game_id), load)
 
 # ================== GESTION ACHATS ==================
 
-def create_purchase(db: Session, user_id: int, game_id: int, price: float):
+async def create_purchase(db: AsyncSession, user_id: int, game_id: int, price: float):
    """
    Enregistre un achat de jeu
    - Stocke le prix au moment de l'achat (historique)
@@ -185,30 +412,114 @@ def create_purchase(db: Session, user_id: int, game_id: int, price: float):
    try:
        new_purchase = Purchase(user_id=user_id, game_id=game_id, price=price)
        db.add(new_purchase)
-       db.commit()
-       db.refresh(new_purchase)
+       await db.commit()
+       await db.refresh(new_purchase)
        return new_purchase
    except Exception as e:
-       db.rollback()
+       await db.rollback()
        raise HTTPException(status_code=500, detail=f"Erreur création achat: {str(e)}")
 
-def get_user_purchases(db: Session, user_id: int) -> List[Purchase]:
+@dataclass
+class CheckoutResult:
+   """Issue d'une commande: jeux achetés (avec prix payé), déjà possédés, inconnus"""
+   purchased: List[Tuple[int, float]]
+   already_owned: List[int]
+   not_found: List[int]
+
+   @property
+   def total(self) -> float:
+       return round(sum(price for _, price in self.purchased), 2)
+
+async def purchase_games(db: AsyncSession, user_id: int, game_ids: List[int]) -> CheckoutResult:
+   """
+   Achète un ou plusieurs jeux en une seule instruction (commit par l'appelant)
+   - INSERT ... SELECT price FROM games ... ON CONFLICT (user_id, game_id) DO NOTHING
+     RETURNING: instantané des prix et insertion atomiques, doublon impossible
+     (ux_purchases_user_game), verrou d'écriture pris dès la première instruction
+   - Jeux non achetés seulement: une lecture de plus pour distinguer inconnus et déjà possédés
+   """
+   requested = sorted(set(game_ids))
+   rows = (await db.execute(
+       sqlite_insert(Purchase)
+       .from_select(
+           ["user_id", "game_id", "price", "purchase_date"],
+           select(literal(user_id), Game.game_id, Game.price, literal(datetime.now(timezone.utc), DateTime(timezone=True)))
+           .where(Game.game_id.in_(requested))
+       )
+       .on_conflict_do_nothing(index_elements=["user_id", "game_id"])
+       .returning(Purchase.game_id, Purchase.price)
+   )).all()
+   purchased = sorted((game_id, price) for game_id, price in rows)
+
+   already_owned: List[int] = []
+   not_found: List[int] = []
+   if len(purchased) < len(requested):
+       bought = {game_id for game_id, _ in purchased}
+       existing = set(await db.scalars(select(Game.game_id).where(Game.game_id.in_(requested))))
+       for game_id in requested:
+           if game_id not in existing:
+               not_found.append(game_id)
+           elif game_id not in bought:
+               already_owned.append(game_id)
+   return CheckoutResult(purchased, already_owned, not_found)
+
+async def get_user_purchases(db: AsyncSession, user_id: int) -> List[Purchase]:
    """Récupère tous les achats d'un utilisateur"""
-   return db.query(Purchase).filter(Purchase.user_id == user_id).all()
+   result = await db.scalars(select(Purchase).where(Purchase.user_id == user_id))
+   return list(result)
+
+# ================== GESTION NOTES ==================
+
+async def record_rating(db: AsyncSession, user_id: int, game_id: int, value: int) -> Tuple[float, bool]:
+   """
+   Enregistre la note d'un utilisateur et met à jour les agrégats du jeu en O(1)
+   - INSERT ... ON CONFLICT DO NOTHING prend le verrou d'écriture SQLite en premier
+   - Re-vote: lecture de l'ancienne note sous ce verrou, delta appliqué à rating_sum
+   - Un seul UPDATE sur games (somme, compte et moyenne), pas de rechargement des notes
+   - Retourne (nouvelle moyenne, True si la note existait déjà)
+   """
+   inserted = await db.execute(
+       sqlite_insert(Rating)
+       .values(user_id=user_id, game_id=game_id, value=value, created_at=datetime.now(timezone.utc))
+       .on_conflict_do_nothing(index_elements=["user_id", "game_id"])
+   )
+
+   if inserted.rowcount:
+       delta_sum, delta_count, existed = value, 1, False
+   else:
+       previous = await db.scalar(select(Rating.value).where(Rating.user_id == user_id, Rating.game_id == game_id))
+       await db.execute(update(Rating).where(Rating.user_id == user_id, Rating.game_id == game_id).values(value=value))
+       delta_sum, delta_count, existed = value - previous, 0, True
+
+   # SQLite évalue les expressions SET sur les valeurs d'avant la mise à jour
+   new_average = await db.scalar(
+       update(Game)
+       .where(Game.game_id == game_id)
+       .values(
+           rating_sum=Game.rating_sum + delta_sum,
+           rating_count=Game.rating_count + delta_count,
+           rating_avg=cast(Game.rating_sum + delta_sum, Float) / (Game.rating_count + delta_count)
+       )
+       .returning(Game.rating_avg)
+       .execution_options(synchronize_session=False)
+   )
+   await db.commit()
+   return float(new_average), existed
 
 # ================== GESTION MESSAGES/CHAT ==================
 
-def get_game_messages(db: Session, game_id: int) -> List[Message]:
+async def get_game_messages(db: AsyncSession, game_id: int) -> List[Message]:
    """Récupère les messages d'un jeu triés chronologiquement"""
-   return db.query(Message).filter(Message.game_id == game_id).order_by(Message.created_at).all()
+   result = await db.scalars(select(Message).where(Message.game_id == game_id).order_by(Message.created_at))
+   return list(result)
 
-def create_message(db: Session, user_id: int, game_id: int, content: str) -> Message:
+async def create_message(db: AsyncSession, user_id: int, game_id: int, content: str) -> Message:
    """
    Crée un message dans le chat d'un jeu
    - Vérifie que l'user possède le jeu avant de poster
    - Seuls les propriétaires peuvent poster des messages
    """
-   purchase = db.query(Purchase).filter(Purchase.user_id == user_id, Purchase.game_id == game_id).first()
+   purchase = await db.scalar(select(Purchase.purchase_id).where(Purchase.user_id == user_id, Purchase.game_id == game_id).limit(1))
    
    if not purchase:
        raise HTTPException(status_code=403, detail="Vous devez acheter le jeu pour poster des messages")
@@ -216,42 +527,132 @@ def create_message(db: Session, user_id: int, game_id: int, content: str) -> Mes
    try:
        new_message = Message(user_id=user_id, game_id=game_id, content=content)
        db.add(new_message)
-       db.commit()
-       db.refresh(new_message)
+       await db.commit()
+       await db.refresh(new_message)
        return new_message
    except Exception as e:
-       db.rollback()
+       await db.rollback()
        raise HTTPException(status_code=500, detail=f"Erreur serveur: {str(e)}")
 
+# ================== VERSIONS (VALIDATION HTTP) ==================
+
+async def get_game_messages_version(db: AsyncSession, game_id: int) -> Tuple[Optional[int], Optional[datetime]]:
+   """Dernier message d'un jeu (id, date) via l'index ix_messages_game_created"""
+   row = (await db.execute(
+       select(Message.message_id, Message.created_at)
+       .where(Message.game_id == game_id)
+       .order_by(Message.created_at.desc(), Message.message_id.desc())
+       .limit(1)
+   )).first()
+   return (row.message_id, row.created_at) if row else (None, None)
+
+async def get_game_archive_version(db: AsyncSession, game_id: int) -> Optional[int]:
+   """Dernier message archivé d'un jeu (l'archive ne fait que croître vers les ids récents)"""
+   return await db.scalar(select(func.max(MessageArchive.message_id)).where(MessageArchive.game_id == game_id))
+
+async def get_user_purchases_version(db: AsyncSession, user_id: int) -> Tuple[int, Optional[int], Optional[datetime]]:
+   """Version des achats d'un utilisateur: (nombre, dernier id, dernière date)"""
+   row = (await db.execute(
+       select(func.count(Purchase.purchase_id), func.max(Purchase.purchase_id), func.max(Purchase.purchase_date))
+       .where(Purchase.user_id == user_id)
+   )).first()
+   return row[0], row[1], row[2]
+
 # ================== ADMINISTRATION ==================
 
-def ban_user(db: Session, *, admin_id: int, user_id: int) -> bool:
+@dataclass
+class UserFilter:
+   """
+   Critères de recherche des utilisateurs (administration)
+   - Préfixes en intervalles [p, p + U+10FFFF) pour rester sur les index:
+     username insensible à la casse (ix_users_username_nocase), email stocké
+     en minuscules (index unique)
+   - Bornes de dates: after inclus, before exclu
+   """
+   username_prefix: Optional[str] = None
+   email_prefix: Optional[str] = None
+   banned: Optional[bool] = None
+   created_after: Optional[datetime] = None
+   created_before: Optional[datetime] = None
+   last_login_after: Optional[datetime] = None
+   last_login_before: Optional[datetime] = None
+
+   def __post_init__(self):
+       # Dates stockées en UTC sans fuseau: bornes reçues avec fuseau ramenées en UTC
+       for name in ("created_after", "created_before", "last_login_after", "last_login_before"):
+           value = getattr(self, name)
+           if value is not None and value.tzinfo is not None:
+               setattr(self, name, value.astimezone(timezone.utc).replace(tzinfo=None))
+
+   def is_empty(self) -> bool:
+       return all(value in (None, "") for value in vars(self).values())
+
+   def conditions(self) -> list:
+       """Clauses WHERE sur la table users"""
+       clauses = []
+       if self.username_prefix:
+           username = User.username.collate("NOCASE")
+           clauses += [username >= self.username_prefix, username < self.username_prefix + "\U0010ffff"]
+       if self.email_prefix:
+           prefix = self.email_prefix.lower()
+           clauses += [User.email >= prefix, User.email < prefix + "\U0010ffff"]
+       if self.banned is not None:
+           clauses.append(User.is_banned == self.banned)
+       if self.created_after is not None:
+           clauses.append(User.created_at >= self.created_after)
+       if self.created_before is not None:
+           clauses.append(User.created_at < self.created_before)
+       if self.last_login_after is not None:
+           clauses.append(User.last_login >= self.last_login_after)
+       if self.last_login_before is not None:
+           clauses.append(User.last_login < self.last_login_before)
+       return clauses
+
+async def set_users_banned(db: AsyncSession, banned: bool, *, user_ids: Optional[List[int]] = None, user_filter: Optional[UserFilter] = None) -> List[int]:
+   """
+   Bannit/débannit un ensemble d'utilisateurs en un seul UPDATE ... RETURNING
+   - Cible: liste d'ids et/ou filtre (au moins un des deux)
+   - Admins jamais bannis; utilisateurs déjà dans l'état demandé ignorés
+   - Retourne les ids réellement modifiés, dont les identités en cache sont invalidées
+   - Fermeture des sockets de chat: à la charge de l'appelant (chat.manager)
    """
-   Bannit un utilisateur (admin uniquement)
-   - Vérifie droits admin et que la cible n'est pas admin
+   if user_ids is None and (user_filter is None or user_filter.is_empty()):
+       raise ValueError("user_ids or a non-empty filter is required")
+   stmt = update(User).where(User.is_admin.is_not(True), User.is_banned.is_not(banned))
+   if user_ids is not None:
+       if not user_ids:
+           return []
+       stmt = stmt.where(User.user_id.in_(set(user_ids)))
+   if user_filter is not None:
+       stmt = stmt.where(*user_filter.conditions())
+
+   result = await db.execute(
+       stmt.values(is_banned=banned).returning(User.user_id).execution_options(synchronize_session=False)
+   )
+   changed = list(result.scalars().all())
+   await db.commit()
+   for user_id in changed:
+       invalidate_principal(user_id)
+   return changed
+
+async def _set_user_banned(db: AsyncSession, user_id: int, banned: bool) -> bool:
+   """Idempotent: vrai si la cible existe et n'est pas admin, déjà dans l'état voulu ou non"""
+   if await set_users_banned(db, banned, user_ids=[user_id]):
+       return True
+   return await db.scalar(select(User.user_id).where(User.user_id == user_id, User.is_admin.is_not(True))) is not None
+
+async def ban_user(db: AsyncSession, user_id: int) -> bool:
+   """
+   Bannit un utilisateur (admin uniquement, droits vérifiés par la route)
+   - Cible inexistante ou admin refusée; déjà bannie = succès
    - Ban immédiat avec flag is_banned
    """
-   admin = db.query(User).filter(User.user_id == admin_id, User.is_admin == True).first()
-   user = db.query(User).filter(User.user_id == user_id).first()
-   
-   if not admin or not user or user.is_admin:
-       return False
-   
-   user.is_banned = True
-   db.commit()
-   return True
+   return await _set_user_banned(db, user_id, True)
 
-def unban_user(db: Session, *, admin_id: int, user_id: int) -> bool:
+async def unban_user(db: AsyncSession, user_id: int) -> bool:
    """
-   Débannit un utilisateur (admin uniquement)
+   Débannit un utilisateur (admin uniquement, droits vérifiés par la route)
+   - Cible inexistante ou admin refusée; déjà active = succès
    - Réactivation immédiate du compte
    """
-   admin = db.query(User).filter(User.user_id == admin_id, User.is_admin == True).first()
-   user = db.query(User).filter(User.user_id == user_id, User.is_banned == True).first()
-   
-   if not admin or not user:
-       return False
-   
-   user.is_banned = False
-   db.commit()
-   return True
\ No newline at end of file
+   return await _set_user_banned(db, user_id, False)
@@ -0,0 +1,160 @@
+"""
+Cache mémoire in-process (LRU + TTL) avec invalidation par tags
+
+Architecture:
+- OrderedDict: ordre LRU, éviction de l'entrée la moins récente au-delà de maxsize
+- TTL par entrée: borne la fraîcheur même sans invalidation (multi-workers)
+- Tags: chaque entrée déclare les données dont elle dépend ("user:3")
+  et invalidate_tags() ne retire que les entrées concernées
+- Single-flight: un miss concurrent sur la même clé déclenche un seul chargement,
+  les autres requêtes attendent son résultat
+- Compteurs hits / misses / loads / evictions / invalidations
+
+Limites:
+- Par processus: chaque worker uvicorn a son propre cache et invalidate_tags()
+  n'agit que localement; données écrites par d'autres workers: TTL court, ou
+  version partagée dans la clé (catalogue: compteur data_versions, voir backend.py)
+- Valeurs stockées telles quelles: mettre en cache des dict/list, pas des objets ORM
+"""
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Hashable, Iterable, Optional, Set, Tuple, Union
+
+class TTLCache:
+   """
+   Cache LRU borné avec expiration et chargement single-flight
+   - Usage: value = await cache.get_or_load(key, loader, tags={"user:1"})
+   """
+   def __init__(self, name: str, maxsize: int = 1024, ttl: float = 60.0):
+       self.name = name
+       self.maxsize = maxsize
+       self.ttl = ttl
+       self._entries: "OrderedDict[Hashable, Tuple[float, Any, Set[str]]]" = OrderedDict()
+       self._tags: Dict[str, Set[Hashable]] = {}
+       self._inflight: Dict[Hashable, asyncio.Future] = {}
+       self._generation = 0  # incrémenté à chaque invalidation
+       self.hits = 0
+       self.misses = 0
+       self.loads = 0
+       self.evictions = 0
+       self.invalidations = 0
+
+   # ================== LECTURE / ÉCRITURE ==================
+
+   def get(self, key: Hashable) -> Tuple[bool, Any]:
+       """Retourne (trouvé, valeur); une entrée expirée compte comme absente"""
+       entry = self._entries.get(key)
+       if entry is None:
+           return False, None
+       expires, value, _ = entry
+       if expires < time.monotonic():
+           self._remove(key)
+           return False, None
+       self._entries.move_to_end(key)
+       return True, value
+
+   def set(self, key: Hashable, value: Any, tags: Iterable[str] = (), ttl: Optional[float] = None):
+       """Stocke une valeur avec ses tags de dépendance (ttl: durée propre à l'entrée)"""
+       if key in self._entries:
+           self._remove(key)
+       tag_set = set(tags)
+       self._entries[key] = (time.monotonic() + (self.ttl if ttl is None else min(ttl, self.ttl)), value, tag_set)
+       for tag in tag_set:
+           self._tags.setdefault(tag, set()).add(key)
+       while len(self._entries) > self.maxsize:
+           oldest = next(iter(self._entries))
+           self._remove(oldest)
+           self.evictions += 1
+
+   async def get_or_load(self, key: Hashable, loader: Callable[[], Awaitable[Any]], tags: Union[Iterable[str], Callable[[Any], Iterable[str]]] = ()) -> Any:
+       """
+       Lecture avec chargement single-flight en cas de miss
+       - tags: liste fixe ou fonction valeur -> tags (dépendances connues après chargement)
+       - Un seul loader par clé à la fois, les appels concurrents partagent son résultat
+       - Résultat non mis en cache si une invalidation a eu lieu pendant le chargement
+       - Exception du loader propagée à tous les appelants en attente
+       """
+       found, value = self.get(key)
+       if found:
+           self.hits += 1
+           return value
+       self.misses += 1
+
+       pending = self._inflight.get(key)
+       if pending is not None:
+           try:
+               return await asyncio.shield(pending)
+           except asyncio.CancelledError:
+               if not pending.cancelled():
+                   raise  # annulation de l'appelant lui-même
+               # Requête meneuse annulée: nouvelle tentative de chargement
+               return await self.get_or_load(key, loader, tags)
+
+       future = asyncio.get_running_loop().create_future()
+       self._inflight[key] = future
+       generation = self._generation
+       try:
+           self.loads += 1
+           value = await loader()
+       except asyncio.CancelledError:
+           future.cancel()
+           raise
+       except Exception as exc:
+           future.set_exception(exc)
+           future.exception()  # marqué comme récupéré si personne n'attend
+           raise
+       finally:
+           self._inflight.pop(key, None)
+
+       if generation == self._generation:
+           self.set(key, value, tags(value) if callable(tags) else tags)
+       future.set_result(value)
+       return value
+
+   # ================== INVALIDATION ==================
+
+   def invalidate_tags(self, *tags: str):
+       """Retire toutes les entrées dépendant d'au moins un des tags"""
+       self._generation += 1
+       for tag in tags:
+           for key in list(self._tags.get(tag, ())):
+               self._remove(key)
+               self.invalidations += 1
+
+   def clear(self):
+       """Vide complètement le cache"""
+       self._generation += 1
+       self.invalidations += len(self._entries)
+       self._entries.clear()
+       self._tags.clear()
+
+   def _remove(self, key: Hashable):
+       entry = self._entries.pop(key, None)
+       if entry is None:
+           return
+       for tag in entry[2]:
+           keys = self._tags.get(tag)
+           if keys is not None:
+               keys.discard(key)
+               if not keys:
+                   del self._tags[tag]
+
+   # ================== STATISTIQUES ==================
+
+   def stats(self) -> Dict[str, Any]:
+       """Compteurs et taux de succès du cache"""
+       lookups = self.hits + self.misses
+       return {
+           "name": self.name,
+           "size": len(self._entries),
+           "maxsize": self.maxsize,
+           "ttl": self.ttl,
+           "hits": self.hits,
+           "misses": self.misses,
+           "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+           "loads": self.loads,
+           "inflight": len(self._inflight),
+           "evictions": self.evictions,
+           "invalidations": self.invalidations
+       }
@@ -0,0 +1,234 @@
+"""
+Import en masse du catalogue (CSV ou NDJSON)
+
+Architecture:
+- Lecture en flux: les octets arrivent par morceaux (corps de requête ou fichier
+  multipart), décodés et découpés en lignes au fil de l'eau
+- Enregistrements validés par lots de import_batch_size lignes
+  (ValidationMiddleware.validate_game_data, mêmes règles que /games/add)
+- Écriture d'un lot = backend.upsert_games: un SELECT des clés existantes, un
+  INSERT ... ON CONFLICT (title, publisher) DO UPDATE multi-lignes, un commit
+- Lignes invalides ignorées et listées dans le rapport (numéro de ligne, clé, erreur)
+
+Formats:
+- CSV: ligne d'en-tête obligatoire; colonnes title, price, description,
+  publisher, category, platforms; optionnelles release_date (ISO 8601), image
+- NDJSON: un objet JSON par ligne, mêmes clés
+
+Limites:
+- import_max_bytes par fichier (413 au-delà; les lots déjà écrits restent)
+- Lots indépendants: un import interrompu laisse les lots précédents écrits;
+  relancer le même fichier est sans effet de bord (upsert)
+"""
+import codecs
+import csv
+import json
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+from fastapi import HTTPException
+from sqlalchemy.ext.asyncio import AsyncSession
+from backend import upsert_games
+from config import settings
+from middleware import SecurityMiddleware, ValidationMiddleware
+
+REQUIRED_COLUMNS = ("title", "price", "description", "publisher", "category", "platforms")
+FORMATS = ("csv", "ndjson")
+
+Record = Tuple[int, Optional[Dict[str, Any]], Optional[str]]  # (ligne, champs, erreur de lecture)
+
+@dataclass
+class ImportReport:
+   """Bilan renvoyé à l'administrateur"""
+   format: str
+   rows: int = 0
+   created: int = 0
+   updated: int = 0
+   failed: int = 0
+   batches: int = 0
+   errors: List[Dict[str, Any]] = field(default_factory=list)
+
+   def add_error(self, line: int, error: str, record: Optional[Dict[str, Any]] = None):
+       self.failed += 1
+       if len(self.errors) < settings.import_max_errors:
+           entry = {"line": line, "error": error}
+           if record:
+               entry["title"] = record.get("title")
+               entry["publisher"] = record.get("publisher")
+           self.errors.append(entry)
+
+   def as_dict(self) -> Dict[str, Any]:
+       return {
+           "format": self.format,
+           "rows": self.rows,
+           "created": self.created,
+           "updated": self.updated,
+           "failed": self.failed,
+           "batches": self.batches,
+           "errors": self.errors,
+           "errors_truncated": self.failed > len(self.errors)
+       }
+
+# ================== LECTURE EN FLUX ==================
+
+async def limit_size(chunks: AsyncIterator[bytes], max_bytes: int) -> AsyncIterator[bytes]:
+   """Coupe le flux au-delà de max_bytes (413)"""
+   received = 0
+   async for chunk in chunks:
+       received += len(chunk)
+       if received > max_bytes:
+           raise HTTPException(413, f"Import too large (max {max_bytes} bytes)")
+       yield chunk
+
+async def iter_lines(chunks: AsyncIterator[bytes]) -> AsyncIterator[Tuple[int, str]]:
+   """Lignes décodées (UTF-8, BOM toléré) numérotées à partir de 1, sans fin de ligne"""
+   decoder = codecs.getincrementaldecoder("utf-8-sig")()
+   pending = ""
+   number = 0
+   async for chunk in chunks:
+       pending += decoder.decode(chunk)
+       *lines, pending = pending.split("\n")
+       for line in lines:
+           number += 1
+           yield number, line.rstrip("\r")
+   pending += decoder.decode(b"", final=True)
+   if pending:
+       yield number + 1, pending.rstrip("\r")
+
+async def csv_records(chunks: AsyncIterator[bytes]) -> AsyncIterator[Record]:
+   """
+   Enregistrements CSV (en-tête en première ligne)
+   - Champ entre guillemets sur plusieurs lignes: lignes accumulées jusqu'à
+     un nombre pair de guillemets, puis un seul csv.reader sur l'enregistrement
+   """
+   header: Optional[List[str]] = None
+   buffer: List[str] = []
+   start = 0
+   async for number, line in iter_lines(chunks):
+       if not buffer:
+           start = number
+           if not line.strip():
+               continue
+       buffer.append(line)
+       text = "\n".join(buffer)
+       if text.count('"') % 2:
+           continue  # champ entre guillemets non terminé
+       buffer = []
+       try:
+           values = next(csv.reader([text], strict=True))
+       except csv.Error as e:
+           yield start, None, f"Invalid CSV: {e}"
+           continue
+
+       if header is None:
+           header = [name.strip().lower() for name in values]
+           missing = [column for column in REQUIRED_COLUMNS if column not in header]
+           if missing:
+               raise HTTPException(400, f"Missing CSV columns: {', '.join(missing)}")
+           continue
+       if len(values) != len(header):
+           yield start, None, f"Expected {len(header)} columns, got {len(values)}"
+           continue
+       yield start, dict(zip(header, values)), None
+
+   if buffer:
+       yield start, None, "Unterminated quoted field"
+   if header is None:
+       raise HTTPException(400, "Empty CSV (header row required)")
+
+async def ndjson_records(chunks: AsyncIterator[bytes]) -> AsyncIterator[Record]:
+   """Enregistrements NDJSON (lignes vides ignorées)"""
+   async for number, line in iter_lines(chunks):
+       if not line.strip():
+           continue
+       try:
+           record = json.loads(line)
+       except ValueError as e:
+           yield number, None, f"Invalid JSON: {e}"
+           continue
+       if not isinstance(record, dict):
+           yield number, None, "Each line must be a JSON object"
+           continue
+       yield number, {str(k).lower(): v for k, v in record.items()}, None
+
+# ================== VALIDATION ==================
+
+def validate_record(record: Dict[str, Any]) -> Dict[str, Any]:
+   """Champs d'un jeu validés et nettoyés (HTTPException/ValueError si invalide)"""
+   missing = [column for column in REQUIRED_COLUMNS if record.get(column) in (None, "")]
+   if missing:
+       raise ValueError(f"Missing fields: {', '.join(missing)}")
+   try:
+       price = float(record["price"])
+   except (TypeError, ValueError):
+       raise ValueError("Invalid price")
+
+   game = ValidationMiddleware.validate_game_data(
+       str(record["title"]), price, str(record["description"]), str(record["publisher"]), str(record["category"]), str(record["platforms"])
+   )
+   if record.get("release_date") not in (None, ""):
+       try:
+           game["release_date"] = datetime.fromisoformat(str(record["release_date"]).strip())
+       except ValueError:
+           raise ValueError("Invalid release_date (ISO 8601 expected)")
+   if record.get("image") not in (None, ""):
+       game["image"] = SecurityMiddleware.validate_text_input(str(record["image"]), 200, "Image")
+   return game
+
+# ================== IMPORT ==================
+
+async def import_games(db: AsyncSession, chunks: AsyncIterator[bytes], fmt: str) -> ImportReport:
+   """Lit, valide et écrit le flux par lots; retourne le rapport ligne à ligne"""
+   if fmt not in FORMATS:
+       raise HTTPException(400, f"Unsupported format (expected one of: {', '.join(FORMATS)})")
+   report = ImportReport(format=fmt)
+   records = csv_records if fmt == "csv" else ndjson_records
+   batch: List[Tuple[int, Dict[str, Any]]] = []
+
+   async def flush():
+       if not batch:
+           return
+       created = await upsert_games(db, [game for _, game in batch])
+       report.batches += 1
+       report.created += sum(created)
+       report.updated += len(created) - sum(created)
+       batch.clear()
+
+   async for line, record, error in records(limit_size(chunks, settings.import_max_bytes)):
+       report.rows += 1
+       if error is not None:
+           report.add_error(line, error)
+           continue
+       try:
+           batch.append((line, validate_record(record)))
+       except HTTPException as e:
+           report.add_error(line, str(e.detail), record)
+       except ValueError as e:
+           report.add_error(line, str(e), record)
+       if len(batch) >= settings.import_batch_size:
+           await flush()
+   await flush()
+   return report
+
+def detect_format(content_type: str, filename: Optional[str] = None) -> Optional[str]:
+   """Format d'après l'extension du fichier ou le Content-Type"""
+   if filename:
+       extension = filename.rsplit(".", 1)[-1].lower()
+       if extension == "csv":
+           return "csv"
+       if extension in ("ndjson", "jsonl"):
+           return "ndjson"
+   content_type = content_type.split(";", 1)[0].strip().lower()
+   if content_type in ("text/csv", "application/csv"):
+       return "csv"
+   if content_type in ("application/x-ndjson", "application/ndjson", "application/jsonl", "application/x-jsonlines"):
+       return "ndjson"
+   return None
+
+async def upload_chunks(upload, size: int = 64 * 1024) -> AsyncIterator[bytes]:
+   """Morceaux d'un UploadFile (multipart) sans le charger entièrement en mémoire"""
+   while True:
+       chunk = await upload.read(size)
+       if not chunk:
+           return
+       yield chunk
@@ -0,0 +1,430 @@
+"""
+Diffusion WebSocket du chat par jeu
+
+Architecture:
+- Une ChatConnection par socket: file sortante bornée + tâche d'écriture dédiée
+- broadcast_to_game: sérialisation JSON unique, puis dépôt non bloquant dans la
+  file de chaque connexion (aucun await par destinataire)
+- Envois parallèles: chaque tâche d'écriture avance à la vitesse de son client
+- Politique client lent: file pleine ou envoi plus long que chat_send_timeout
+  => connexion évincée (close 1013 "Try Again Later"), le client se reconnecte
+- Multi-workers: broadcast_to_game publie sur le pub/sub (pubsub.py), chaque
+  worker livre ensuite à ses propres sockets (deliver_local)
+
+Protocole client -> serveur:
+- "ping" -> "pong" (heartbeat)
+- {"type": "send_message", "content": "...", "client_id": "..."}
+  -> {"type": "ack", "client_id", "id", "created_at"} puis diffusion new_message
+  -> {"type": "error", "client_id", "error"} si refusé
+- Identité vérifiée une seule fois au handshake (cookie JWT, ban, achat du jeu)
+  et conservée sur la connexion; socket sans droit d'écriture = lecture seule
+- Persistance par lots (chat_writer.py), diffusion après commit
+
+Reprise après coupure (?since=<message_id>):
+- Tampon circulaire par jeu des dernières trames diffusées (chat_history_size),
+  alimenté à la livraison locale: chaque worker a l'historique complet
+- since couvert par le tampon: rejeu des seules trames manquantes, sans DB
+- Coupure du pub/sub (broker perdu, repli local): trames des autres workers
+  manquées, tampons vidés à la coupure et à la reconnexion, non alimentés
+  pendant la coupure => rejeu depuis la DB
+- Sinon requête indexée (game_id, message_id) > since, bornée à chat_replay_max
+- Fin du rejeu signalée par {"type": "replay_done", "count", "source", "truncated"}
+
+Statistiques exposées:
+- connections / games: état courant
+- broadcasts, frames_queued, frames_sent, evictions, kicks: compteurs cumulés
+
+Canal de contrôle (CONTROL_CHANNEL, jamais un game_id):
+- Ordres entre workers via le même pub/sub, ex. fermeture des sockets des
+  utilisateurs bannis (disconnect_users, close 1008 "Policy Violation")
+"""
+import asyncio
+import json
+import time
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional, Tuple
+from fastapi import HTTPException, WebSocket
+from sqlalchemy import select
+from sqlalchemy.orm import contains_eager
+from starlette.websockets import WebSocketState
+from backend import Principal, decode_token, load_principal
+from chat_writer import ChatWriter, PendingMessage
+from config import settings
+from metrics import chat_fanout
+from middleware import ValidationMiddleware
+from models import AsyncSessionLocal, Message, Purchase, User
+from pubsub import PubSub, create_pubsub
+
+# Code de fermeture RFC 6455 pour un client évincé (surcharge temporaire)
+CLOSE_TRY_AGAIN_LATER = 1013
+# Code de fermeture RFC 6455 pour un client exclu (compte banni)
+CLOSE_POLICY_VIOLATION = 1008
+
+# Canal pub/sub réservé aux ordres de contrôle (les game_id commencent à 1)
+CONTROL_CHANNEL = 0
+# Ids par trame de contrôle (lignes du broker unix bornées à 64 KiB)
+CONTROL_IDS_PER_FRAME = 1000
+
+class ChatConnection:
+   """
+   Socket d'un client + file d'envoi bornée servie par une tâche d'écriture
+   - send(): non bloquant, False si la connexion est (ou vient d'être) évincée
+   """
+   def __init__(self, manager: "ConnectionManager", websocket: WebSocket, game_id: int, principal: Optional[Principal] = None, can_post: bool = False):
+       self.manager = manager
+       self.websocket = websocket
+       self.game_id = game_id
+       self.principal = principal  # identité du handshake (None = anonyme)
+       self.can_post = can_post  # authentifié, non banni, propriétaire du jeu
+       self.queue: asyncio.Queue = asyncio.Queue(maxsize=settings.chat_queue_size)
+       self.closed = False
+       self._writer: Optional[asyncio.Task] = None
+
+   def start(self):
+       """Démarre la tâche d'écriture"""
+       self._writer = asyncio.create_task(self._write_loop())
+
+   def send(self, frame: str) -> bool:
+       """Dépose une trame déjà sérialisée; évince le client si sa file déborde"""
+       if self.closed:
+           return False
+       try:
+           self.queue.put_nowait(frame)
+       except asyncio.QueueFull:
+           self.evict("send queue overflow")
+           return False
+       self.manager.frames_queued += 1
+       return True
+
+   async def _write_loop(self):
+       """Vide la file vers le socket, un envoi à la fois"""
+       try:
+           while True:
+               frame = await self.queue.get()
+               await asyncio.wait_for(self.websocket.send_text(frame), timeout=settings.chat_send_timeout)
+               self.manager.frames_sent += 1
+       except asyncio.CancelledError:
+           raise
+       except asyncio.TimeoutError:
+           self.evict("send timeout")
+       except Exception:
+           # Socket fermé côté client: la boucle de réception fera le nettoyage
+           self.manager.discard(self)
+
+   def evict(self, reason: str):
+       """Politique client lent: retire la connexion et ferme le socket"""
+       if self.closed:
+           return
+       self.manager.evictions += 1
+       self.manager.discard(self)
+       asyncio.create_task(self._close(reason))
+
+   def kick(self, reason: str):
+       """Exclusion (compte banni): retire la connexion et ferme le socket en 1008"""
+       if self.closed:
+           return
+       self.manager.kicks += 1
+       self.manager.discard(self)
+       asyncio.create_task(self._close(reason, CLOSE_POLICY_VIOLATION))
+
+   async def _close(self, reason: str, code: int = CLOSE_TRY_AGAIN_LATER):
+       try:
+           if self.websocket.application_state == WebSocketState.CONNECTED:
+               await asyncio.wait_for(self.websocket.close(code=code, reason=reason), timeout=settings.chat_send_timeout)
+       except Exception:
+           pass
+
+   def stop(self):
+       """Arrête la tâche d'écriture (trames en attente abandonnées)"""
+       self.closed = True
+       if self._writer is not None and self._writer is not asyncio.current_task():
+           self._writer.cancel()
+
+class GameHistory:
+   """
+   Tampon circulaire des dernières trames new_message d'un jeu
+   - floor: tout message de ce jeu d'id > floor est dans le tampon
+   """
+   def __init__(self, size: int):
+       self.frames: Deque[Tuple[int, str]] = deque()
+       self.size = size
+       self.floor: Optional[int] = None
+
+   def append(self, message_id: int, frame: str):
+       if self.floor is None:
+           # ids globaux (non consécutifs par jeu): seuls les messages à partir du
+           # premier reçu sont couverts, since() refuse tout point antérieur
+           self.floor = message_id - 1
+       self.frames.append((message_id, frame))
+       while len(self.frames) > self.size:
+           evicted_id, _ = self.frames.popleft()
+           self.floor = max(self.floor, evicted_id)
+
+   def since(self, message_id: int) -> Optional[List[str]]:
+       """Trames d'id > message_id, ou None si le tampon ne couvre pas ce point"""
+       if self.floor is None or message_id < self.floor:
+           return None
+       return [frame for frame_id, frame in self.frames if frame_id > message_id]
+
+class ConnectionManager:
+   """
+   Gestionnaire connexions WebSocket pour chat temps réel
+   - Connexions groupées par game_id
+   - Broadcast automatique aux connectés d'un même jeu
+   """
+   def __init__(self, pubsub: PubSub):
+       self.pubsub = pubsub
+       self.active_connections: Dict[int, Dict[WebSocket, ChatConnection]] = {}
+       self.history: Dict[int, GameHistory] = {}
+       self.broadcasts = 0
+       self.replays_buffer = 0
+       self.replays_db = 0
+       self.frames_queued = 0
+       self.frames_sent = 0
+       self.evictions = 0
+       self.kicks = 0
+       self.history_resets = 0
+
+   async def connect(self, websocket: WebSocket, game_id: int, principal: Optional[Principal] = None, can_post: bool = False) -> ChatConnection:
+       """Accepte et enregistre nouvelle connexion WebSocket"""
+       await websocket.accept()
+       connection = ChatConnection(self, websocket, game_id, principal, can_post)
+       self.active_connections.setdefault(game_id, {})[websocket] = connection
+       connection.start()
+       return connection
+
+   def disconnect(self, websocket: WebSocket, game_id: int):
+       """Retire connexion et nettoie structures"""
+       connection = self.active_connections.get(game_id, {}).get(websocket)
+       if connection is not None:
+           self.discard(connection)
+
+   def discard(self, connection: ChatConnection):
+       """Retire une connexion et arrête sa tâche d'écriture"""
+       connection.stop()
+       connections = self.active_connections.get(connection.game_id)
+       if connections is None:
+           return
+       connections.pop(connection.websocket, None)
+       if not connections:
+           del self.active_connections[connection.game_id]
+
+   async def start(self):
+       """Démarrage de l'écriture groupée et abonnement au pub/sub (démarrage de l'application)"""
+       chat_writer.start()
+       await self.pubsub.start(self.deliver_local, on_gap=self.reset_history)
+
+   async def close(self):
+       """Écriture des messages en attente, puis désabonnement (arrêt de l'application)"""
+       await chat_writer.close()
+       await self.pubsub.close()
+
+   async def broadcast_to_game(self, game_id: int, message: Any):
+       """
+       Diffuse message à tous les connectés d'un jeu, tous workers confondus
+       - JSON sérialisé une seule fois puis publié sur le pub/sub
+       """
+       self.broadcasts += 1
+       frame = message if isinstance(message, str) else json.dumps(message)
+       await self.pubsub.publish(game_id, frame)
+
+   async def disconnect_users(self, user_ids: List[int]):
+       """Ferme les sockets de ces utilisateurs sur tous les workers (après un ban)"""
+       user_ids = sorted(set(user_ids))
+       for start in range(0, len(user_ids), CONTROL_IDS_PER_FRAME):
+           frame = json.dumps({"type": "disconnect_users", "user_ids": user_ids[start:start + CONTROL_IDS_PER_FRAME]})
+           await self.pubsub.publish(CONTROL_CHANNEL, frame)
+
+   async def deliver_local(self, game_id: int, frame: str):
+       """Dépôt sans attente de la trame dans la file de chaque socket local du jeu"""
+       if game_id == CONTROL_CHANNEL:
+           self._control(frame)
+           return
+       self._record(game_id, frame)
+       connections = self.active_connections.get(game_id)
+       if not connections:
+           return
+       start = time.perf_counter()
+       for connection in list(connections.values()):
+           connection.send(frame)
+       chat_fanout.observe(time.perf_counter() - start)
+
+   def reset_history(self):
+       """Oublie les tampons de reprise (diffusion incomplète: le rejeu passe par la DB)"""
+       self.history.clear()
+       self.history_resets += 1
+
+   def _control(self, frame: str):
+       """Applique un ordre du canal de contrôle aux sockets locaux"""
+       try:
+           message = json.loads(frame)
+           user_ids = set(message["user_ids"]) if message.get("type") == "disconnect_users" else None
+       except (ValueError, KeyError, TypeError):
+           return
+       if not user_ids:
+           return
+       for connections in list(self.active_connections.values()):
+           for connection in list(connections.values()):
+               if connection.principal is not None and connection.principal.user_id in user_ids:
+                   connection.kick("account banned")
+
+   def _record(self, game_id: int, frame: str):
+       """Ajoute une trame new_message à l'historique du jeu (un décodage par worker)"""
+       if settings.chat_history_size <= 0 or not self.pubsub.complete:
+           return
+       try:
+           message = json.loads(frame)
+           message_id = int(message["data"]["id"]) if message.get("type") == "new_message" else None
+       except (ValueError, KeyError, TypeError):
+           return
+       if message_id is None:
+           return
+       history = self.history.get(game_id)
+       if history is None:
+           history = self.history[game_id] = GameHistory(settings.chat_history_size)
+       history.append(message_id, frame)
+
+   def buffered_since(self, game_id: int, message_id: int) -> Optional[List[str]]:
+       """Trames manquées depuis message_id si le tampon les couvre"""
+       history = self.history.get(game_id)
+       return history.since(message_id) if history else None
+
+   def stats(self) -> Dict[str, Any]:
+       """Connexions actives par jeu et compteurs de diffusion"""
+       return {
+           "connections": sum(len(c) for c in self.active_connections.values()),
+           "games": {game_id: len(c) for game_id, c in self.active_connections.items()},
+           "queued_frames": sum(c.queue.qsize() for conns in self.active_connections.values() for c in conns.values()),
+           "broadcasts": self.broadcasts,
+           "frames_queued": self.frames_queued,
+           "frames_sent": self.frames_sent,
+           "evictions": self.evictions,
+           "kicks": self.kicks,
+           "history_games": len(self.history),
+           "history_resets": self.history_resets,
+           "replays_buffer": self.replays_buffer,
+           "replays_db": self.replays_db,
+           "pubsub": self.pubsub.stats()
+       }
+
+manager = ConnectionManager(create_pubsub())
+
+# ================== AUTHENTIFICATION DU SOCKET ==================
+
+async def authenticate_websocket(websocket: WebSocket, game_id: int) -> Tuple[Optional[Principal], bool]:
+   """
+   Identité du client au handshake, via le cookie JWT
+   - Retourne (principal, can_post); (None, False) si anonyme, token invalide ou banni
+   - can_post: achat du jeu vérifié une fois pour toute la durée du socket
+   """
+   token = websocket.cookies.get("token")
+   if not token:
+       return None, False
+   try:
+       user_id = decode_token(token)
+   except HTTPException:
+       return None, False
+
+   async with AsyncSessionLocal() as db:
+       principal = await load_principal(db, user_id)
+       if not principal or principal.is_banned:
+           return None, False
+       purchase = await db.scalar(select(Purchase.purchase_id).where(Purchase.user_id == user_id, Purchase.game_id == game_id).limit(1))
+   return principal, purchase is not None
+
+# ================== REPRISE (SINCE) ==================
+
+async def replay_since(connection: ChatConnection, since: int):
+   """
+   Renvoie au client les messages d'id > since
+   - Tampon mémoire sans await: aucune trame live ne peut s'intercaler ni manquer
+   - Repli DB sinon: les trames live reçues entre-temps sont dédoublonnées
+     côté client par id
+   """
+   frames = manager.buffered_since(connection.game_id, since)
+   source = "buffer"
+   truncated = False
+   if frames is not None:
+       manager.replays_buffer += 1
+   else:
+       manager.replays_db += 1
+       source = "db"
+       async with AsyncSessionLocal() as db:
+           result = await db.scalars(
+               select(Message)
+               .join(User)
+               .options(contains_eager(Message.user))
+               .where(Message.game_id == connection.game_id, Message.message_id > since)
+               .order_by(Message.message_id)
+               .limit(settings.chat_replay_max + 1)
+           )
+           messages = list(result)
+       truncated = len(messages) > settings.chat_replay_max
+       # Trop en retard: le client recharge l'historique récent plutôt qu'un long rejeu
+       frames = [] if truncated else [
+           json.dumps({"type": "new_message", "data": {
+               "id": m.message_id,
+               "content": m.content,
+               "user": {"username": m.user.username},
+               "created_at": m.created_at.isoformat()
+           }})
+           for m in messages
+       ]
+   for frame in frames:
+       connection.send(frame)
+   connection.send(json.dumps({"type": "replay_done", "count": len(frames), "source": source, "truncated": truncated}))
+
+# ================== MESSAGES ==================
+
+async def _broadcast_committed(batch: List[PendingMessage]):
+   """Diffuse un lot tout juste commité, dans l'ordre des ids"""
+   for item in batch:
+       await manager.broadcast_to_game(item.game_id, {"type": "new_message", "data": item.payload()})
+
+chat_writer = ChatWriter(
+   on_commit=_broadcast_committed,
+   max_batch=settings.chat_batch_max_size,
+   window=settings.chat_batch_window_ms / 1000,
+   max_pending=settings.chat_writer_max_pending
+)
+
+async def publish_message(user: Principal, game_id: int, content: str) -> dict:
+   """
+   Persiste un message déjà validé puis le diffuse à la salle du jeu
+   - Écriture groupée avec les messages concurrents (un commit par lot)
+   - Diffusion seulement après commit: aucun client ne voit un message perdu
+   """
+   return await chat_writer.submit(user.user_id, user.username, game_id, content)
+
+async def handle_client_frame(connection: ChatConnection, raw: str):
+   """
+   Traite une trame JSON reçue sur le socket
+   - send_message: mêmes validations que POST /games/{id}/messages, ack avec l'id
+   - Erreurs renvoyées au seul émetteur, le socket reste ouvert
+   """
+   try:
+       frame = json.loads(raw)
+   except ValueError:
+       connection.send(json.dumps({"type": "error", "error": "Invalid frame"}))
+       return
+   if not isinstance(frame, dict) or frame.get("type") != "send_message":
+       connection.send(json.dumps({"type": "error", "error": "Unsupported frame"}))
+       return
+
+   client_id = frame.get("client_id")
+   if not connection.can_post:
+       error = "Authentication and game ownership required to post messages"
+       connection.send(json.dumps({"type": "error", "client_id": client_id, "error": error}))
+       return
+
+   try:
+       content = ValidationMiddleware.validate_message_content(str(frame.get("content", "")))
+       payload = await publish_message(connection.principal, connection.game_id, content)
+   except HTTPException as e:
+       connection.send(json.dumps({"type": "error", "client_id": client_id, "error": e.detail}))
+       return
+   except Exception:
+       connection.send(json.dumps({"type": "error", "client_id": client_id, "error": "Message failed to send"}))
+       return
+
+   connection.send(json.dumps({"type": "ack", "client_id": client_id, "id": payload["id"], "created_at": payload["created_at"]}))
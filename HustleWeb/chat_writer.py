@@ -0,0 +1,206 @@
+"""
+Persistance groupée (group commit) des messages du chat
+
+Architecture:
+- submit(): dépose le message dans une file mémoire bornée et attend son commit
+- Tâche d'écriture unique: regroupe les messages arrivés pendant une fenêtre de
+  quelques millisecondes (chat_batch_window_ms) ou jusqu'à chat_batch_max_size
+- Un seul INSERT multi-lignes ... RETURNING et un seul commit (un fsync) par lot
+- Diffusion après commit, dans l'ordre des ids: aucun client ne voit un message
+  qui ne serait pas persisté
+- Lot en échec: rejoué message par message pour isoler la ligne fautive
+- close(): refuse les nouveaux messages, vide la file puis s'arrête (shutdown)
+- Tâche d'écriture morte (annulation, erreur inattendue): le lot en cours est
+  mis en échec, la tâche relancée au prochain submit() reprend la même file
+
+Statistiques exposées:
+- pending, batches, messages, failures
+- batch_size_avg / batch_size_max, commit_time_total / max / avg
+"""
+import asyncio
+import time
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from typing import Awaitable, Callable, Dict, List, Optional
+from sqlalchemy import insert
+from models import AsyncSessionLocal, Message
+
+@dataclass
+class PendingMessage:
+   """Message validé en attente d'écriture"""
+   user_id: int
+   username: str
+   game_id: int
+   content: str
+   # UTC naïf, comme les lignes relues depuis SQLite: même created_at en direct, en historique et en rejeu
+   created_at: datetime = field(default_factory=lambda: datetime.now(timezone.utc).replace(tzinfo=None))
+   future: Optional[asyncio.Future] = None
+   message_id: Optional[int] = None
+
+   def payload(self) -> dict:
+       """Représentation diffusée aux clients"""
+       return {
+           "id": self.message_id,
+           "content": self.content,
+           "user": {"username": self.username},
+           "created_at": self.created_at.isoformat()
+       }
+
+class ChatWriter:
+   """
+   File d'écriture des messages avec commit par lots
+   - on_commit(batch): appelé après chaque commit réussi (diffusion)
+   """
+   def __init__(self, on_commit: Callable[[List[PendingMessage]], Awaitable[None]], max_batch: int, window: float, max_pending: int):
+       self.on_commit = on_commit
+       self.max_batch = max_batch
+       self.window = window
+       self.max_pending = max_pending
+       self._queue: Optional[asyncio.Queue] = None
+       self._task: Optional[asyncio.Task] = None
+       self._closing = False
+       self.batches = 0
+       self.messages = 0
+       self.failures = 0
+       self.batch_size_max = 0
+       self.commit_time_total = 0.0
+       self.commit_time_max = 0.0
+
+   def start(self):
+       """Démarre la tâche d'écriture (idempotent; les messages déjà en file sont conservés)"""
+       if self._task is None or self._task.done():
+           self._closing = False
+           if self._queue is None:
+               self._queue = asyncio.Queue(maxsize=self.max_pending)
+           self._task = asyncio.create_task(self._run())
+
+   async def submit(self, user_id: int, username: str, game_id: int, content: str) -> dict:
+       """
+       Met un message en file et attend sa persistance
+       - Retourne le payload avec l'id attribué
+       - File pleine: attente (backpressure) plutôt que perte
+       """
+       if self._closing:
+           raise RuntimeError("Chat writer is shutting down")
+       self.start()
+       item = PendingMessage(user_id=user_id, username=username, game_id=game_id, content=content)
+       item.future = asyncio.get_running_loop().create_future()
+       await self._queue.put(item)
+       return await asyncio.shield(item.future)
+
+   async def _run(self):
+       """Boucle: premier message, fenêtre de regroupement, écriture du lot"""
+       batch: List[PendingMessage] = []
+       try:
+           while True:
+               batch = []
+               if await self._collect(batch):
+                   return
+       except BaseException:
+           for item in batch:
+               if not item.future.done():
+                   item.future.set_exception(RuntimeError("Chat writer stopped"))
+           raise
+
+   async def _collect(self, batch: List[PendingMessage]) -> bool:
+       """Remplit et écrit un lot; vrai quand la sentinelle de close() est atteinte"""
+       item = await self._queue.get()
+       if item is None:
+           return True  # sentinelle de close(): la file est vide derrière elle
+       batch.append(item)
+       deadline = time.monotonic() + self.window
+       stop = False
+       while len(batch) < self.max_batch:
+           try:
+               if self._queue.empty():
+                   remaining = deadline - time.monotonic()
+                   if remaining <= 0:
+                       break
+                   nxt = await asyncio.wait_for(self._queue.get(), timeout=remaining)
+               else:
+                   nxt = self._queue.get_nowait()
+           except asyncio.TimeoutError:
+               break
+           if nxt is None:
+               stop = True
+               break
+           batch.append(nxt)
+       await self._write(batch)
+       return stop
+
+   async def _write(self, batch: List[PendingMessage]):
+       """Écrit un lot; en cas d'échec, rejoue chaque message séparément"""
+       try:
+           await self._commit(batch)
+       except Exception:
+           if len(batch) == 1:
+               self._fail(batch[0])
+           else:
+               for item in batch:
+                   try:
+                       await self._commit([item])
+                   except Exception:
+                       self._fail(item)
+
+   async def _commit(self, batch: List[PendingMessage]):
+       """INSERT multi-lignes + commit unique, puis diffusion et réveil des appelants"""
+       start = time.perf_counter()
+       async with AsyncSessionLocal() as db:
+           result = await db.execute(
+               insert(Message).returning(Message.message_id, sort_by_parameter_order=True),
+               [{"user_id": i.user_id, "game_id": i.game_id, "content": i.content, "created_at": i.created_at} for i in batch]
+           )
+           ids = result.scalars().all()
+           await db.commit()
+       elapsed = time.perf_counter() - start
+
+       for item, message_id in zip(batch, ids):
+           item.message_id = message_id
+       self.batches += 1
+       self.messages += len(batch)
+       self.batch_size_max = max(self.batch_size_max, len(batch))
+       self.commit_time_total += elapsed
+       self.commit_time_max = max(self.commit_time_max, elapsed)
+
+       try:
+           await self.on_commit(batch)
+       except Exception:
+           pass  # messages persistés: un échec de diffusion ne doit pas les réécrire
+       for item in batch:
+           if not item.future.done():
+               item.future.set_result(item.payload())
+
+   def _fail(self, item: PendingMessage):
+       self.failures += 1
+       if not item.future.done():
+           item.future.set_exception(RuntimeError("Message failed to persist"))
+
+   async def close(self):
+       """
+       Arrêt propre: les messages déjà en file sont écrits avant de rendre la main
+       - Tâche déjà morte: les messages restés en file sont mis en échec
+       """
+       self._closing = True
+       if self._task is not None and not self._task.done():
+           await self._queue.put(None)
+           await self._task
+       self._task = None
+       while self._queue is not None and not self._queue.empty():
+           item = self._queue.get_nowait()
+           if item is not None and not item.future.done():
+               item.future.set_exception(RuntimeError("Chat writer is shutting down"))
+       self._queue = None
+
+   def stats(self) -> Dict:
+       """Taille des lots et latence de commit"""
+       return {
+           "pending": self._queue.qsize() if self._queue else 0,
+           "batches": self.batches,
+           "messages": self.messages,
+           "failures": self.failures,
+           "batch_size_avg": round(self.messages / self.batches, 2) if self.batches else 0.0,
+           "batch_size_max": self.batch_size_max,
+           "commit_time_total": round(self.commit_time_total, 6),
+           "commit_time_max": round(self.commit_time_max, 6),
+           "commit_time_avg": round(self.commit_time_total / self.batches, 6) if self.batches else 0.0
+       }
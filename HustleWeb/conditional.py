@@ -0,0 +1,95 @@
+"""
+Requêtes conditionnelles HTTP (ETag / Last-Modified) et politiques Cache-Control
+
+Principe:
+- ETag calculé depuis des versions peu coûteuses (compteur catalogue, dernier
+  message d'un jeu, version des achats d'un utilisateur), jamais depuis le corps
+- Vérification AVANT la requête complète et la sérialisation: un 304 ne coûte
+  qu'une lecture d'index
+- If-None-Match prioritaire sur If-Modified-Since (RFC 9110)
+
+Politiques:
+- CACHE_PUBLIC: données partagées (catalogue, chat public), revalidation systématique
+- CACHE_PRIVATE: données par utilisateur, jamais en cache partagé, Vary: Cookie
+"""
+import hashlib
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import Any, Optional
+from fastapi import Request, Response
+
+CACHE_PUBLIC = "public, max-age=0, must-revalidate"
+CACHE_PRIVATE = "private, max-age=0, must-revalidate"
+
+@dataclass
+class Validator:
+   """Validateurs d'une représentation: ETag + date de dernière modification"""
+   etag: str
+   last_modified: Optional[datetime] = None
+   cache_control: str = CACHE_PUBLIC
+
+   def headers(self) -> dict:
+       """En-têtes de validation à joindre à la réponse (200 ou 304)"""
+       headers = {"ETag": self.etag, "Cache-Control": self.cache_control}
+       if self.last_modified:
+           headers["Last-Modified"] = http_date(self.last_modified)
+       if self.cache_control == CACHE_PRIVATE:
+           headers["Vary"] = "Cookie"
+       return headers
+
+   def apply(self, response: Response):
+       """Ajoute les validateurs à une réponse 200"""
+       response.headers.update(self.headers())
+
+def make_etag(*parts: Any) -> str:
+   """ETag faible dérivé des versions (le corps JSON n'est pas octet-stable)"""
+   digest = hashlib.sha1("|".join(str(p) for p in parts).encode("utf-8")).hexdigest()[:20]
+   return f'W/"{digest}"'
+
+def http_date(value: datetime) -> str:
+   """Date HTTP (IMF-fixdate); les datetimes naïfs de SQLite sont en UTC"""
+   if value.tzinfo is None:
+       value = value.replace(tzinfo=timezone.utc)
+   return format_datetime(value.astimezone(timezone.utc).replace(microsecond=0), usegmt=True)
+
+def _etag_matches(header: str, etag: str) -> bool:
+   """Comparaison faible d'une liste If-None-Match"""
+   if header.strip() == "*":
+       return True
+   opaque = etag[2:] if etag.startswith("W/") else etag
+   for candidate in header.split(","):
+       candidate = candidate.strip()
+       if candidate.startswith("W/"):
+           candidate = candidate[2:]
+       if candidate == opaque:
+           return True
+   return False
+
+def is_not_modified(request: Request, validator: Validator) -> bool:
+   """
+   Évalue les préconditions de la requête
+   - If-None-Match présent: seul critère
+   - Sinon If-Modified-Since comparé à la seconde près
+   """
+   if_none_match = request.headers.get("if-none-match")
+   if if_none_match is not None:
+       return _etag_matches(if_none_match, validator.etag)
+
+   if_modified_since = request.headers.get("if-modified-since")
+   if if_modified_since and validator.last_modified:
+       try:
+           since = parsedate_to_datetime(if_modified_since)
+       except (TypeError, ValueError):
+           return False
+       if since.tzinfo is None:
+           since = since.replace(tzinfo=timezone.utc)
+       modified = validator.last_modified
+       if modified.tzinfo is None:
+           modified = modified.replace(tzinfo=timezone.utc)
+       return modified.replace(microsecond=0) <= since
+   return False
+
+def not_modified_response(validator: Validator) -> Response:
+   """Réponse 304 sans corps, avec les mêmes validateurs"""
+   return Response(status_code=304, headers=validator.headers())
@@ -0,0 +1,129 @@
+"""
+Configuration centralisée de l'application Game Store
+
+Architecture:
+- pydantic-settings: valeurs par défaut surchargées par variables d'environnement
+- Préfixe GAMESTORE_ (ex: GAMESTORE_DB_POOL_SIZE=10)
+- Fichier .env optionnel à côté de main.py
+
+Paramètres:
+- Chemin de la base SQLite
+- Dimensionnement du pool de connexions (taille, overflow, timeout)
+- PRAGMAs SQLite appliqués à chaque connexion (WAL, busy_timeout, cache, mmap)
+- Caches catalogue et authentification (TTL, taille)
+- Hachage bcrypt (coût, concurrence, file d'attente)
+- Limitation des tentatives de login / reset password
+- Files d'envoi du chat WebSocket et pub/sub entre workers
+- Rétention et archivage du chat
+- Instrumentation SQL (requêtes lentes, détection N+1)
+- Import en masse du catalogue
+- Achats (clés d'idempotence, taille du panier)
+- Photos de profil (taille max, formats générés, pool de processus)
+- Ban/unban en masse des utilisateurs
+"""
+import os
+import tempfile
+from typing import Literal, Tuple
+from pydantic_settings import BaseSettings, SettingsConfigDict
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+class Settings(BaseSettings):
+   """
+   Paramètres runtime de l'application
+   - Chaque champ est surchargeable par GAMESTORE_<NOM_CHAMP>
+   """
+   model_config = SettingsConfigDict(env_prefix="GAMESTORE_", env_file=os.path.join(BASE_DIR, ".env"), extra="ignore")
+
+   # Base de données
+   database_path: str = os.path.join(BASE_DIR, "game_store.db")
+
+   # Pool de connexions (par moteur: sync et async)
+   db_pool_size: int = 5
+   db_max_overflow: int = 10
+   db_pool_timeout: float = 30.0  # secondes d'attente max d'une connexion libre
+   db_pool_recycle: int = -1  # secondes, -1 = jamais
+
+   # PRAGMAs SQLite
+   sqlite_journal_mode: Literal["WAL", "DELETE", "TRUNCATE", "PERSIST", "MEMORY"] = "WAL"  # lecteurs concurrents + un écrivain
+   sqlite_synchronous: Literal["OFF", "NORMAL", "FULL", "EXTRA"] = "NORMAL"  # sûr en WAL, évite un fsync par commit
+   sqlite_busy_timeout_ms: int = 5000  # attente du verrou au lieu de "database is locked"
+   sqlite_cache_size_kib: int = 64000  # cache de pages par connexion
+   sqlite_mmap_size: int = 256 * 1024 * 1024  # lectures via mmap (0 = désactivé)
+
+   # Cache catalogue in-process (par worker)
+   catalog_cache_ttl: float = 30.0  # secondes (clés versionnées: libère les versions dépassées)
+   catalog_cache_maxsize: int = 1024  # nombre d'entrées (pages + fiches jeu)
+
+   # Cache d'authentification (par worker)
+   principal_cache_ttl: float = 10.0  # secondes, identité relue en DB au-delà
+   principal_cache_maxsize: int = 10000
+   token_cache_ttl: float = 300.0  # secondes, borné aussi par l'expiration du JWT
+   token_cache_maxsize: int = 10000
+
+   # Hachage des mots de passe (bcrypt, par worker)
+   bcrypt_rounds: int = 12  # coût; les hash existants sont recalculés à la connexion si différent
+   password_hash_workers: int = min(4, os.cpu_count() or 1)  # calculs bcrypt simultanés
+   password_hash_max_queue: int = 64  # demandes en attente avant 503 immédiat (0 = illimité)
+   password_hash_queue_timeout: float = 5.0  # secondes d'attente max avant 503
+
+   # Limitation des tentatives (login, reset password): N tentatives par fenêtre de secondes
+   ratelimit_login_ip_attempts: int = 20
+   ratelimit_login_ip_window: float = 60.0
+   ratelimit_login_user_attempts: int = 5
+   ratelimit_login_user_window: float = 300.0
+   ratelimit_reset_ip_attempts: int = 10
+   ratelimit_reset_ip_window: float = 60.0
+   ratelimit_reset_email_attempts: int = 5
+   ratelimit_reset_email_window: float = 900.0
+   ratelimit_lockout_after: int = 3  # refus consécutifs avant verrouillage
+   ratelimit_lockout_base: float = 60.0  # secondes, doublé à chaque récidive
+   ratelimit_lockout_max: float = 3600.0
+   ratelimit_max_keys: int = 100000  # clés suivies par limiteur
+
+   # Chat WebSocket
+   chat_queue_size: int = 256  # trames en attente par connexion avant éviction
+   chat_send_timeout: float = 10.0  # secondes max pour un envoi avant éviction
+   chat_batch_max_size: int = 100  # messages max par commit groupé
+   chat_batch_window_ms: float = 5.0  # fenêtre de regroupement après le premier message
+   chat_writer_max_pending: int = 10000  # messages en file avant backpressure
+   chat_history_size: int = 200  # derniers messages gardés par jeu pour la reprise (since)
+   chat_replay_max: int = 200  # messages max rejoués depuis la DB, au-delà rechargement complet
+
+   # Rétention et archivage du chat (surchargeable par jeu: table chat_retention)
+   # Opt-in: sans limite globale, seuls les jeux ayant une politique explicite sont archivés
+   chat_retention_keep_last: int = 0  # messages gardés en table chaude par jeu (0 = sans limite)
+   chat_retention_days: int = 0  # ancienneté max en jours (0 = sans limite)
+   chat_archive_interval: float = 0.0  # secondes entre deux passages (0 = passage périodique désactivé)
+   chat_archive_chunk: int = 500  # lignes déplacées par transaction
+   chat_archive_pause: float = 0.05  # secondes de pause entre deux lots
+
+   # Instrumentation SQL
+   sql_slow_query_ms: float = 100.0  # seuil de log d'une requête lente (0 = désactivé)
+   sql_n_plus_one_threshold: int = 10  # exécutions d'une même instruction par requête HTTP (0 = désactivé)
+
+   # Import en masse du catalogue (CSV / NDJSON)
+   import_batch_size: int = 500  # lignes validées puis écrites par transaction
+   import_max_bytes: int = 50 * 1024 * 1024  # taille max d'un fichier importé
+   import_max_errors: int = 1000  # erreurs détaillées dans le rapport (au-delà: comptées)
+
+   # Achats: clés d'idempotence et panier
+   idempotency_key_ttl: float = 24 * 3600  # secondes de conservation d'une réponse rejouable
+   cart_max_items: int = 50  # jeux par commande (POST /cart/checkout)
+
+   # Photos de profil: réception en flux, redimensionnement dans un pool de processus
+   photo_max_bytes: int = 5 * 1024 * 1024  # taille max d'une photo reçue (413 au-delà)
+   photo_sizes: Tuple[int, ...] = (64, 128, 256)  # côtés des carrés générés (le plus grand = photo_url)
+   photo_max_pixels: int = 40_000_000  # image décodée refusée au-delà (bombe de décompression)
+   photo_workers: int = 2  # processus de redimensionnement
+   photo_max_queue: int = 32  # photos en attente d'un processus avant 503
+
+   # Ban/unban en masse (administration)
+   admin_bulk_max_ids: int = 10000  # ids par requête, et ids détaillés dans la réponse
+
+   # Pub/sub du chat entre workers: "memory" (un worker) ou "unix" (broker local multi-workers)
+   pubsub_backend: Literal["memory", "unix"] = "memory"
+   pubsub_socket_path: str = os.path.join(tempfile.gettempdir(), "gamestore-chat.sock")
+   pubsub_max_buffer: int = 4 * 1024 * 1024  # octets en attente vers un worker avant déconnexion
+
+settings = Settings()
@@ -0,0 +1,169 @@
+"""
+Fabrique de moteurs SQLAlchemy pour SQLite en production
+
+Architecture:
+- Un moteur sync (init DB, scripts) et un moteur async (routes FastAPI)
+- PRAGMAs appliqués à chaque nouvelle connexion via l'événement "connect"
+- Pool QueuePool dimensionné par la configuration (config.settings)
+- Statistiques de pool pour dimensionner contre le trafic réel
+
+PRAGMAs:
+- journal_mode=WAL: lectures concurrentes pendant une écriture
+- busy_timeout: attente du verrou plutôt que "database is locked"
+- synchronous, cache_size, mmap_size: débit lecture/écriture
+
+Statistiques exposées (par moteur):
+- checked_out / overflow / pool_size: état courant du pool
+- checkouts, connects, timeouts: compteurs cumulés
+- wait_time_total / wait_time_max: temps d'attente d'une connexion libre
+- Requêtes SQL comptées, chronométrées et attribuées à la requête HTTP (sqltrace)
+"""
+import threading
+import time
+from typing import Dict
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.ext.asyncio import create_async_engine, AsyncEngine
+from sqlalchemy.pool import QueuePool, AsyncAdaptedQueuePool
+from config import settings
+from sqltrace import install_query_tracing
+
+# ================== STATISTIQUES DU POOL ==================
+
+class PoolStats:
+   """
+   Compteurs cumulés d'utilisation d'un pool de connexions
+   - Thread-safe (le pool sync est utilisé depuis plusieurs threads)
+   """
+   def __init__(self, name: str):
+       self.name = name
+       self._lock = threading.Lock()
+       self.checkouts = 0
+       self.connects = 0
+       self.timeouts = 0
+       self.wait_time_total = 0.0
+       self.wait_time_max = 0.0
+
+   def record_wait(self, elapsed: float, timed_out: bool = False):
+       """Enregistre la durée d'attente d'une demande de connexion"""
+       with self._lock:
+           if timed_out:
+               self.timeouts += 1
+           else:
+               self.checkouts += 1
+           self.wait_time_total += elapsed
+           if elapsed > self.wait_time_max:
+               self.wait_time_max = elapsed
+
+   def record_connect(self):
+       """Nouvelle connexion DBAPI ouverte par le pool"""
+       with self._lock:
+           self.connects += 1
+
+   def snapshot(self, pool) -> Dict:
+       """État courant du pool + compteurs cumulés"""
+       with self._lock:
+           return {
+               "pool_size": pool.size(),
+               "checked_out": pool.checkedout(),
+               "checked_in": pool.checkedin(),
+               "overflow": pool.overflow(),
+               "checkouts": self.checkouts,
+               "connects": self.connects,
+               "timeouts": self.timeouts,
+               "wait_time_total": round(self.wait_time_total, 6),
+               "wait_time_max": round(self.wait_time_max, 6),
+               "wait_time_avg": round(self.wait_time_total / self.checkouts, 6) if self.checkouts else 0.0
+           }
+
+class _TimedCheckoutMixin:
+   """Mesure le temps passé à obtenir une connexion du pool"""
+   stats: PoolStats
+
+   def connect(self):
+       start = time.perf_counter()
+       try:
+           connection = super().connect()
+       except PoolTimeoutError:
+           self.stats.record_wait(time.perf_counter() - start, timed_out=True)
+           raise
+       self.stats.record_wait(time.perf_counter() - start)
+       return connection
+
+class InstrumentedQueuePool(_TimedCheckoutMixin, QueuePool):
+   """QueuePool du moteur sync avec mesure des attentes"""
+   stats = PoolStats("sync")
+
+class InstrumentedAsyncQueuePool(_TimedCheckoutMixin, AsyncAdaptedQueuePool):
+   """QueuePool du moteur async (aiosqlite) avec mesure des attentes"""
+   stats = PoolStats("async")
+
+# ================== PRAGMAS SQLITE ==================
+
+def apply_sqlite_pragmas(dbapi_connection, connection_record):
+   """
+   Configure chaque nouvelle connexion SQLite
+   - Appelé une seule fois par connexion physique (pas à chaque checkout)
+   """
+   cursor = dbapi_connection.cursor()
+   try:
+       cursor.execute(f"PRAGMA busy_timeout = {int(settings.sqlite_busy_timeout_ms)}")
+       cursor.execute(f"PRAGMA journal_mode = {settings.sqlite_journal_mode}")
+       cursor.execute(f"PRAGMA synchronous = {settings.sqlite_synchronous}")
+       cursor.execute(f"PRAGMA cache_size = -{int(settings.sqlite_cache_size_kib)}")
+       cursor.execute(f"PRAGMA mmap_size = {int(settings.sqlite_mmap_size)}")
+   finally:
+       cursor.close()
+
+def _install_listeners(sync_engine: Engine, stats: PoolStats):
+   """Branche PRAGMAs, compteur de connexions et instrumentation SQL sur le moteur"""
+   event.listen(sync_engine, "connect", apply_sqlite_pragmas)
+   event.listen(sync_engine, "connect", lambda dbapi_connection, connection_record: stats.record_connect())
+   install_query_tracing(sync_engine, stats.name)
+
+def _pool_options() -> Dict:
+   """Dimensionnement commun aux deux moteurs"""
+   return {
+       "pool_size": settings.db_pool_size,
+       "max_overflow": settings.db_max_overflow,
+       "pool_timeout": settings.db_pool_timeout,
+       "pool_recycle": settings.db_pool_recycle
+   }
+
+# ================== FABRIQUES DE MOTEURS ==================
+
+def create_sqlite_engine(url: str) -> Engine:
+   """
+   Moteur sync pour SQLite fichier
+   - check_same_thread=False: connexions partagées entre threads via le pool
+   """
+   engine = create_engine(
+       url,
+       connect_args={"check_same_thread": False},
+       poolclass=InstrumentedQueuePool,
+       **_pool_options()
+   )
+   _install_listeners(engine, InstrumentedQueuePool.stats)
+   return engine
+
+def create_async_sqlite_engine(url: str) -> AsyncEngine:
+   """
+   Moteur async (aiosqlite) pour SQLite fichier
+   - Remplace le NullPool par défaut d'aiosqlite (une connexion + un thread par requête)
+   """
+   engine = create_async_engine(
+       url,
+       poolclass=InstrumentedAsyncQueuePool,
+       **_pool_options()
+   )
+   _install_listeners(engine.sync_engine, InstrumentedAsyncQueuePool.stats)
+   return engine
+
+def pool_statistics(*engines) -> Dict[str, Dict]:
+   """Statistiques des pools des moteurs donnés (Engine ou AsyncEngine)"""
+   result = {}
+   for engine in engines:
+       pool = engine.pool
+       result[pool.stats.name] = pool.stats.snapshot(pool)
+   return result
@@ -13,13 +13,14 @@ Jeux créés:
 - Mystic Lands (MMORPG fantastique, 29.99€)
 """
 from models import Game
+from sqlalchemy import select
 from sqlalchemy.orm import Session
 from datetime import datetime
 
 def initialize_sample_games(db: Session):
    """
    Insère des jeux de démonstration dans la base
-   - Vérification d'unicité par titre
+   - Vérification d'unicité par titre (un seul SELECT)
    - Commit unique pour toutes les insertions
    - Images en placeholder à remplacer
    """
@@ -74,10 +75,11 @@ def initialize_sample_games(db: Session):
        }
    ]
 
-   # Insertion avec vérification d'unicité
+   # Insertion avec vérification d'unicité (une seule requête pour tous les titres)
+   # Gros volumes de test: voir seed.py
+   existing = set(db.scalars(select(Game.title).where(Game.title.in_([game["title"] for game in sample_games]))))
    for game in sample_games:
-       if not db.query(Game).filter(Game.title == game["title"]).first():
-           new_game = Game(**game)
-           db.add(new_game)
+       if game["title"] not in existing:
+           db.add(Game(**game))
    
    db.commit()
\ No newline at end of file
@@ -0,0 +1,86 @@
+"""
+Requêtes rejouables sans double effet (en-tête Idempotency-Key)
+
+Principe:
+- Le client génère une clé par intention (ex: un clic sur "Acheter") et la
+  renvoie telle quelle en cas de nouvelle tentative (timeout, double clic)
+- claim_idempotency_key: INSERT ... ON CONFLICT en première instruction de la
+  transaction, donc sous le verrou d'écriture SQLite; une requête concurrente
+  avec la même clé attend ce verrou puis trouve la réponse déjà commitée
+- remember_response: réponse écrite dans la même transaction que l'effet
+  (achat), clé et effet sont commités ou annulés ensemble
+- Erreur (HTTPException): rollback, la clé est libérée et la requête peut être retentée
+
+Contrat HTTP:
+- Clé: 1 à 100 caractères [A-Za-z0-9_.:-] (UUID conseillé), propre à l'utilisateur
+- Rejeu: même statut et même corps, en-tête Idempotent-Replayed: true
+- Même clé pour une requête différente: 422
+- Clés expirées après idempotency_key_ttl, purgées lors des nouveaux achats de l'utilisateur
+"""
+import hashlib
+import json
+import re
+from datetime import datetime, timedelta, timezone
+from typing import Any, Optional
+from fastapi import Header, HTTPException
+from fastapi.responses import JSONResponse
+from sqlalchemy import delete, select, update
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from config import settings
+from models import IdempotencyKey
+
+KEY_PATTERN = re.compile(r"^[A-Za-z0-9_.:-]{1,100}$")
+REPLAY_HEADER = "Idempotent-Replayed"
+
+def idempotency_key(key: Optional[str] = Header(None, alias="Idempotency-Key")) -> Optional[str]:
+   """Dépendance FastAPI: clé d'idempotence optionnelle (400 si mal formée)"""
+   if key is not None and not KEY_PATTERN.match(key):
+       raise HTTPException(400, "Invalid Idempotency-Key (1-100 characters: letters, digits, _ . : -)")
+   return key
+
+def request_fingerprint(*parts: Any) -> str:
+   """Empreinte d'une requête (opération + paramètres normalisés)"""
+   return hashlib.sha256(json.dumps(parts, separators=(",", ":")).encode("utf-8")).hexdigest()
+
+async def claim_idempotency_key(db: AsyncSession, user_id: int, key: str, fingerprint: str) -> Optional[JSONResponse]:
+   """
+   Réserve la clé pour cette requête (sans commit)
+   - None: clé réservée, traiter la requête puis remember_response + commit
+   - JSONResponse: réponse d'origine à renvoyer telle quelle (rejeu)
+   """
+   now = datetime.now(timezone.utc)
+   cutoff = now - timedelta(seconds=settings.idempotency_key_ttl)
+   claimed = await db.scalar(
+       sqlite_insert(IdempotencyKey)
+       .values(user_id=user_id, key=key, fingerprint=fingerprint, status_code=200, response=None, created_at=now)
+       .on_conflict_do_update(
+           index_elements=["user_id", "key"],
+           set_={"fingerprint": fingerprint, "status_code": 200, "response": None, "created_at": now},
+           where=IdempotencyKey.created_at < cutoff  # clé expirée: réutilisable
+       )
+       .returning(IdempotencyKey.user_id)
+   )
+   if claimed is not None:
+       await db.execute(delete(IdempotencyKey).where(IdempotencyKey.user_id == user_id, IdempotencyKey.created_at < cutoff))
+       return None
+
+   stored = (await db.execute(
+       select(IdempotencyKey.fingerprint, IdempotencyKey.status_code, IdempotencyKey.response)
+       .where(IdempotencyKey.user_id == user_id, IdempotencyKey.key == key)
+   )).first()
+   await db.rollback()  # libère le verrou d'écriture pris par l'INSERT
+   if stored.fingerprint != fingerprint:
+       raise HTTPException(422, "Idempotency-Key already used for a different request")
+   if stored.response is None:
+       raise HTTPException(409, "A request with this Idempotency-Key is still in progress")
+   return JSONResponse(json.loads(stored.response), status_code=stored.status_code, headers={REPLAY_HEADER: "true"})
+
+async def remember_response(db: AsyncSession, user_id: int, key: str, body: Any, status_code: int = 200):
+   """Mémorise la réponse de la clé réservée (commit par l'appelant, avec l'effet)"""
+   await db.execute(
+       update(IdempotencyKey)
+       .where(IdempotencyKey.user_id == user_id, IdempotencyKey.key == key)
+       .values(status_code=status_code, response=json.dumps(body))
+       .execution_options(synchronize_session=False)
+   )
@@ -3,16 +3,21 @@ Initialise la base de données avec tables et données de démo
 """
 from models import Base, engine
 from databaseinit import initialize_sample_games
+from migrations import run_migrations
 from sqlalchemy.orm import Session
 
 def init_db():
     """
     Crée les tables et insère les jeux de démonstration
     - create_all() : crée les tables si elles n'existent pas
+    - run_migrations() : met à niveau le schéma d'une base existante
     - initialize_sample_games() : ajoute 4 jeux exemples
     """
     # Création des tables
     Base.metadata.create_all(bind=engine)
+
+    # Migrations versionnées (index, colonnes ajoutées après coup)
+    run_migrations(engine)
     
     # Insertion des données de démo
     with Session(engine) as session:
@@ -0,0 +1,344 @@
+"""
+Banc de charge HTTP des parcours utilisateurs principaux
+
+Usage:
+   python loadtest.py --users 50 --iterations 5 --output bench.json
+   python loadtest.py --url http://127.0.0.1:8000 ...   (serveur déjà lancé)
+
+Architecture:
+- Autonome: asyncio + client HTTP/1.1 keep-alive minimal, aucune dépendance
+- Par défaut lance uvicorn sur un port libre avec une base SQLite temporaire
+  (GAMESTORE_DATABASE_PATH), limites de tentatives relevées: tout le trafic
+  vient de 127.0.0.1
+- Sortie d'uvicorn dans server.log du répertoire temporaire (la sortie standard
+  reste réservée au rapport JSON), fin du log affichée si le démarrage échoue
+- Utilisateurs virtuels concurrents, parcours déterministes à graine fixe:
+  signup, login, puis N itérations de navigation / achat / note / chat
+- Résultat JSON: débit global, puis par endpoint (template de route)
+  nombre, erreurs, statuts, débit, p50 / p95 / p99 / moyenne / max en ms
+
+Comparaison entre commits:
+- Même graine, mêmes paramètres, même machine: seuls les temps varient
+- Le commit courant (git rev-parse) est inclus dans le rapport
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import urlencode, urlsplit
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+PASSWORD = "LoadTest1"
+
+# ================== CLIENT HTTP ==================
+
+class HttpClient:
+   """
+   Client HTTP/1.1 minimal sur une connexion keep-alive
+   - Cookies de session conservés (cookie JWT "token")
+   - Corps lu par Content-Length ou chunked
+   """
+   def __init__(self, host: str, port: int):
+       self.host = host
+       self.port = port
+       self.cookies: Dict[str, str] = {}
+       self._reader: Optional[asyncio.StreamReader] = None
+       self._writer: Optional[asyncio.StreamWriter] = None
+
+   async def _connect(self):
+       self._reader, self._writer = await asyncio.open_connection(self.host, self.port)
+
+   async def close(self):
+       if self._writer is not None:
+           self._writer.close()
+           try:
+               await self._writer.wait_closed()
+           except ConnectionError:
+               pass
+           self._writer = None
+
+   async def request(self, method: str, path: str, body: bytes = b"", headers: Optional[Dict[str, str]] = None) -> Tuple[int, Dict[str, str], bytes]:
+       """Envoie une requête; une reconnexion si le serveur a fermé la connexion"""
+       for attempt in (1, 2):
+           if self._writer is None or self._writer.is_closing():
+               await self._connect()
+           try:
+               return await self._exchange(method, path, body, headers or {})
+           except (ConnectionError, asyncio.IncompleteReadError):
+               await self.close()
+               if attempt == 2:
+                   raise
+
+   async def _exchange(self, method: str, path: str, body: bytes, headers: Dict[str, str]):
+       lines = [f"{method} {path} HTTP/1.1", f"Host: {self.host}:{self.port}", f"Content-Length: {len(body)}"]
+       if self.cookies:
+           lines.append("Cookie: " + "; ".join(f"{k}={v}" for k, v in self.cookies.items()))
+       lines.extend(f"{k}: {v}" for k, v in headers.items())
+       self._writer.write(("\r\n".join(lines) + "\r\n\r\n").encode("latin-1") + body)
+       await self._writer.drain()
+
+       status_line = await self._reader.readuntil(b"\r\n")
+       status = int(status_line.split(b" ", 2)[1])
+       response_headers: Dict[str, str] = {}
+       while True:
+           line = await self._reader.readuntil(b"\r\n")
+           if line == b"\r\n":
+               break
+           name, _, value = line.decode("latin-1").partition(":")
+           name, value = name.strip().lower(), value.strip()
+           if name == "set-cookie":
+               self._store_cookie(value)
+           response_headers[name] = value
+
+       if response_headers.get("transfer-encoding", "").lower() == "chunked":
+           chunks = []
+           while True:
+               size = int((await self._reader.readuntil(b"\r\n")).split(b";")[0], 16)
+               if size == 0:
+                   await self._reader.readuntil(b"\r\n")
+                   break
+               chunks.append(await self._reader.readexactly(size))
+               await self._reader.readexactly(2)
+           payload = b"".join(chunks)
+       else:
+           payload = await self._reader.readexactly(int(response_headers.get("content-length", "0")))
+
+       if response_headers.get("connection", "").lower() == "close":
+           await self.close()
+       return status, response_headers, payload
+
+   def _store_cookie(self, header: str):
+       pair = header.split(";", 1)[0]
+       name, _, value = pair.partition("=")
+       value = value.strip().strip('"')
+       if value and "max-age=0" not in header.lower():
+           self.cookies[name.strip()] = value
+       else:
+           self.cookies.pop(name.strip(), None)
+
+   async def form(self, path: str, data: Dict) -> Tuple[int, Dict[str, str], bytes]:
+       return await self.request("POST", path, urlencode(data).encode(), {"Content-Type": "application/x-www-form-urlencoded"})
+
+   async def json(self, path: str, data: Dict) -> Tuple[int, Dict[str, str], bytes]:
+       return await self.request("POST", path, json.dumps(data).encode(), {"Content-Type": "application/json"})
+
+# ================== MESURES ==================
+
+class Recorder:
+   """Latences et statuts par endpoint (nom = template de route)"""
+   def __init__(self):
+       self.latencies: Dict[str, List[float]] = {}
+       self.statuses: Dict[str, Dict[int, int]] = {}
+       self.errors: Dict[str, int] = {}
+
+   async def call(self, name: str, coro, expected=(200,)) -> Tuple[int, bytes]:
+       start = time.perf_counter()
+       try:
+           status, _, body = await coro
+       except (OSError, asyncio.IncompleteReadError, ValueError):
+           status, body = 0, b""
+       elapsed = time.perf_counter() - start
+       self.latencies.setdefault(name, []).append(elapsed)
+       counts = self.statuses.setdefault(name, {})
+       counts[status] = counts.get(status, 0) + 1
+       if status not in expected:
+           self.errors[name] = self.errors.get(name, 0) + 1
+       return status, body
+
+   def report(self, duration: float) -> Dict:
+       endpoints = {}
+       for name in sorted(self.latencies):
+           samples = sorted(self.latencies[name])
+           endpoints[name] = {
+               "count": len(samples),
+               "errors": self.errors.get(name, 0),
+               "statuses": {str(k): v for k, v in sorted(self.statuses[name].items())},
+               "throughput_rps": round(len(samples) / duration, 2),
+               "p50_ms": percentile(samples, 50),
+               "p95_ms": percentile(samples, 95),
+               "p99_ms": percentile(samples, 99),
+               "mean_ms": round(sum(samples) / len(samples) * 1000, 3),
+               "max_ms": round(samples[-1] * 1000, 3)
+           }
+       total = sum(len(v) for v in self.latencies.values())
+       return {
+           "duration_s": round(duration, 3),
+           "requests": total,
+           "errors": sum(self.errors.values()),
+           "throughput_rps": round(total / duration, 2) if duration else 0.0,
+           "endpoints": endpoints
+       }
+
+def percentile(sorted_samples: List[float], p: float) -> float:
+   """Percentile au rang le plus proche, en millisecondes"""
+   if not sorted_samples:
+       return 0.0
+   rank = max(0, min(len(sorted_samples) - 1, int(round(p / 100 * len(sorted_samples) + 0.5)) - 1))
+   return round(sorted_samples[rank] * 1000, 3)
+
+# ================== PARCOURS UTILISATEUR ==================
+
+async def user_session(index: int, args, host: str, port: int, recorder: Recorder):
+   """Un utilisateur virtuel: inscription, connexion puis itérations de parcours"""
+   rng = random.Random(args.seed * 100003 + index)
+   client = HttpClient(host, port)
+   username = f"lt{args.seed}_{index}"
+   try:
+       await recorder.call("POST /signup", client.form("/signup", {"username": username, "email": f"{username}@load.test", "password": PASSWORD}), expected=(303, 400))
+       status, _ = await recorder.call("POST /login", client.form("/login", {"username": username, "password": PASSWORD}))
+       if status != 200:
+           return
+
+       owned: List[int] = []
+       for _ in range(args.iterations):
+           status, body = await recorder.call("GET /api/games", client.request("GET", "/api/games?limit=50"))
+           game_ids = [g["game_id"] for g in json.loads(body)] if status == 200 else []
+           await recorder.call("GET /games", client.request("GET", "/games"))
+           if not game_ids:
+               continue
+
+           # Popularité asymétrique: les premiers jeux du catalogue sont les plus vus
+           game_id = game_ids[min(int(rng.expovariate(1 / 3)), len(game_ids) - 1)]
+           await recorder.call("GET /game/{game_id}", client.request("GET", f"/game/{game_id}"))
+           await recorder.call("GET /games/{game_id}/messages", client.request("GET", f"/games/{game_id}/messages?limit=50"))
+
+           if rng.random() < args.purchase_ratio and game_id not in owned:
+               status, _ = await recorder.call("POST /purchase/{game_id}", client.request("POST", f"/purchase/{game_id}"), expected=(200, 400))
+               owned.append(game_id)
+           if owned and rng.random() < args.rate_ratio:
+               await recorder.call("POST /games/rate", client.json("/games/rate", {"game_id": rng.choice(owned), "rating": rng.randint(1, 5)}))
+           if owned and rng.random() < args.chat_ratio:
+               target = rng.choice(owned)
+               await recorder.call("POST /games/{game_id}/messages", client.form(f"/games/{target}/messages", {"content": f"gg #{rng.randint(1, 10**6)}"}))
+   finally:
+       await client.close()
+
+async def run_load(args, host: str, port: int) -> Dict:
+   recorder = Recorder()
+   semaphore = asyncio.Semaphore(args.concurrency)
+
+   async def limited(index: int):
+       async with semaphore:
+           await user_session(index, args, host, port, recorder)
+
+   start = time.perf_counter()
+   await asyncio.gather(*(limited(i) for i in range(args.users)))
+   return recorder.report(time.perf_counter() - start)
+
+# ================== SERVEUR SOUS TEST ==================
+
+def free_port() -> int:
+   with socket.socket() as sock:
+       sock.bind(("127.0.0.1", 0))
+       return sock.getsockname()[1]
+
+def start_server(args, workdir: str) -> Tuple[subprocess.Popen, int]:
+   """uvicorn sur une base temporaire, prêt quand GET / répond"""
+   port = free_port()
+   env = dict(os.environ)
+   env.update({
+       "GAMESTORE_DATABASE_PATH": os.path.join(workdir, "loadtest.db"),
+       "GAMESTORE_PUBSUB_SOCKET_PATH": os.path.join(workdir, "chat.sock"),
+       "GAMESTORE_PUBSUB_BACKEND": "unix" if args.workers > 1 else "memory",
+       "GAMESTORE_RATELIMIT_LOGIN_IP_ATTEMPTS": "1000000",
+       "GAMESTORE_RATELIMIT_LOGIN_USER_ATTEMPTS": "1000000",
+   })
+   if args.bcrypt_rounds:
+       env["GAMESTORE_BCRYPT_ROUNDS"] = str(args.bcrypt_rounds)
+   command = [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(port), "--workers", str(args.workers), "--log-level", "warning"]
+   log_path = os.path.join(workdir, "server.log")
+   with open(log_path, "wb") as log:
+       process = subprocess.Popen(command, cwd=BASE_DIR, env=env, stdin=subprocess.DEVNULL, stdout=log, stderr=subprocess.STDOUT)
+
+   deadline = time.monotonic() + 60
+   while time.monotonic() < deadline:
+       if process.poll() is not None:
+           raise RuntimeError(f"uvicorn exited with code {process.returncode}:\n{log_tail(log_path)}")
+       try:
+           with socket.create_connection(("127.0.0.1", port), timeout=0.5) as sock:
+               sock.sendall(b"GET / HTTP/1.1\r\nHost: localhost\r\nConnection: close\r\n\r\n")
+               if sock.recv(12).startswith(b"HTTP/1.1 200"):
+                   return process, port
+       except OSError:
+           pass
+       time.sleep(0.2)
+   stop_server(process)
+   raise RuntimeError(f"uvicorn did not become ready in 60s:\n{log_tail(log_path)}")
+
+def log_tail(path: str, size: int = 4000) -> str:
+   with open(path, "rb") as log:
+       log.seek(max(0, os.path.getsize(path) - size))
+       return log.read().decode(errors="replace")
+
+def stop_server(process: subprocess.Popen):
+   process.terminate()
+   try:
+       process.wait(timeout=15)
+   except subprocess.TimeoutExpired:
+       process.kill()
+       process.wait()
+
+def git_commit() -> Optional[str]:
+   try:
+       return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=BASE_DIR, capture_output=True, text=True, check=True).stdout.strip()
+   except (OSError, subprocess.CalledProcessError):
+       return None
+
+# ================== POINT D'ENTRÉE ==================
+
+def parse_args(argv=None):
+   parser = argparse.ArgumentParser(description="Banc de charge HTTP du Game Store")
+   parser.add_argument("--users", type=int, default=50, help="utilisateurs virtuels (un compte chacun)")
+   parser.add_argument("--concurrency", type=int, default=20, help="sessions simultanées")
+   parser.add_argument("--iterations", type=int, default=5, help="parcours par utilisateur après connexion")
+   parser.add_argument("--seed", type=int, default=1, help="graine des parcours (reproductibilité)")
+   parser.add_argument("--purchase-ratio", type=float, default=0.5)
+   parser.add_argument("--rate-ratio", type=float, default=0.3)
+   parser.add_argument("--chat-ratio", type=float, default=0.5)
+   parser.add_argument("--workers", type=int, default=1, help="workers uvicorn du serveur lancé")
+   parser.add_argument("--bcrypt-rounds", type=int, default=0, help="surcharge GAMESTORE_BCRYPT_ROUNDS (0 = configuration)")
+   parser.add_argument("--url", help="serveur existant (pas de base temporaire ni de surcharge)")
+   parser.add_argument("--output", help="fichier JSON du rapport (sinon sortie standard)")
+   return parser.parse_args(argv)
+
+def main(argv=None):
+   args = parse_args(argv)
+   workdir, process = None, None
+   if args.url:
+       target = urlsplit(args.url)
+       host, port = target.hostname, target.port or 80
+   else:
+       workdir = tempfile.mkdtemp(prefix="gamestore-load-")
+       process, port = start_server(args, workdir)
+       host = "127.0.0.1"
+
+   try:
+       results = asyncio.run(run_load(args, host, port))
+   finally:
+       if process is not None:
+           stop_server(process)
+       if workdir is not None:
+           shutil.rmtree(workdir, ignore_errors=True)
+
+   report = {
+       "commit": git_commit(),
+       "config": {k: v for k, v in vars(args).items() if k != "output"},
+       **results
+   }
+   text = json.dumps(report, indent=2)
+   if args.output:
+       with open(args.output, "w") as f:
+           f.write(text + "\n")
+   else:
+       print(text)
+
+if __name__ == "__main__":
+   main()
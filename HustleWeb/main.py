@@ -5,6 +5,7 @@ Architecture:
 - FastAPI comme framework web avec support async
 - Organisation modulaire avec routers séparés (views/post)
 - Middleware CORS pour développement
+- Middlewares de métriques (latence par route, requêtes SQL par requête, N+1)
 - Serveur de fichiers statiques (CSS/JS/images)
 - Initialisation automatique de la base de données
 
@@ -19,20 +20,46 @@ Structure:
 - post: Routes POST pour actions/API
 - static: Ressources CSS, JS, images, photos profil
 """
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.staticfiles import StaticFiles
 import uvicorn
 from views import router as views_router
 from post import router as post_router
 from initdb import init_db
+from models import engine, async_engine
+from chat import manager
+from archiver import archiver
+from photos import PHOTOS_DIR, PhotoStaticFiles, photo_processor
+from metrics import MetricsMiddleware
+from sqltrace import QueryTraceMiddleware
 import os 
 from fastapi.middleware.cors import CORSMiddleware
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+   """
+   Cycle de vie de l'application
+   - Démarrage: abonnement du chat au pub/sub (broker partagé entre workers),
+     archiveur périodique du chat
+   - Arrêt: archiveur, chat (messages en attente écrits), pub/sub, pool de
+     traitement des photos, puis connexions poolées (threads aiosqlite inclus)
+   """
+   await manager.start()
+   archiver.start()
+   yield
+   await archiver.close()
+   await manager.close()
+   await photo_processor.close()
+   await async_engine.dispose()
+   engine.dispose()
+
 # Configuration FastAPI
 app = FastAPI(
    title="GamerZone",
    description="Plateforme de jeux vidéo", 
-   version="1.0.0"
+   version="1.0.0",
+   lifespan=lifespan
 )
 
 # CORS en mode développement (à sécuriser en production)
@@ -40,9 +67,14 @@ app.add_middleware(
    CORSMiddleware,
    allow_origins=["*"],
    allow_methods=["*"],
-   allow_headers=["*"]
+   allow_headers=["*"],
+   expose_headers=["X-Next-Cursor", "X-Prev-Cursor"]  # Curseurs de pagination
 )
 
+# Durée et statut par template de route, requêtes SQL par requête HTTP (/metrics)
+app.add_middleware(QueryTraceMiddleware)
+app.add_middleware(MetricsMiddleware)
+
 # Montage des routers modulaires
 app.include_router(views_router)  # Pages HTML
 app.include_router(post_router)   # Actions POST/API
@@ -50,6 +82,8 @@ app.include_router(post_router)   # Actions POST/API
 # Serveur de fichiers statiques sur /static
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))  
 STATIC_DIR = os.path.join(BASE_DIR, "static")
+os.makedirs(PHOTOS_DIR, exist_ok=True)
+app.mount("/static/photos", PhotoStaticFiles(directory=PHOTOS_DIR), name="photos")  # Avant /static: cache permanent des photos
 app.mount("/static", StaticFiles(directory=STATIC_DIR), name="static")
 
 # Debug paths (à retirer en production)
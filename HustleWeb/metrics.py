@@ -0,0 +1,318 @@
+"""
+Métriques de l'application au format texte Prometheus
+
+Architecture:
+- Registre en mémoire par processus (chaque worker uvicorn expose les siennes)
+- Counter / Gauge / Histogram avec labels, sans dépendance externe
+- Chemin chaud minimal: un dict lookup + une addition sous verrou par mesure
+- Collecteurs appelés au moment du scrape: les statistiques existantes (pools,
+  caches, bcrypt, limiteurs, chat) ne coûtent rien entre deux scrapes
+- MetricsMiddleware (ASGI pur): durée et statut par template de route
+  (/purchase/{game_id} plutôt que /purchase/42: cardinalité bornée)
+
+Métriques natives:
+- gamestore_http_requests_total{method,route,status}
+- gamestore_http_request_duration_seconds{method,route} (histogramme)
+- gamestore_http_requests_in_flight
+- gamestore_chat_fanout_seconds (dépôt d'une trame dans les files locales)
+- gamestore_db_queries_total{engine,statement}
+"""
+import abc
+import threading
+import time
+from functools import lru_cache
+from bisect import bisect_left
+from typing import Callable, Dict, Iterable, List, Sequence, Tuple
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+FANOUT_BUCKETS = (0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.05)
+
+Labels = Tuple[str, ...]
+Sample = Tuple[str, Dict[str, str], float]  # (suffixe, labels, valeur)
+
+# ================== FORMAT TEXTE ==================
+
+def _escape_help(value: str) -> str:
+   """Texte de # HELP: seuls \\ et saut de ligne sont échappés"""
+   return str(value).replace("\\", "\\\\").replace("\n", "\\n")
+
+def _escape(value: str) -> str:
+   """Valeur de label: \\, saut de ligne et guillemet échappés"""
+   return _escape_help(value).replace('"', '\\"')
+
+def _format_value(value: float) -> str:
+   if value == float("inf"):
+       return "+Inf"
+   if isinstance(value, bool):
+       return "1" if value else "0"
+   if isinstance(value, int) or float(value).is_integer():
+       return str(int(value))
+   return repr(float(value))
+
+def _format_labels(labels: Dict[str, str]) -> str:
+   if not labels:
+       return ""
+   return "{" + ",".join(f'{key}="{_escape(value)}"' for key, value in labels.items()) + "}"
+
+class Family:
+   """Métrique complète à rendre: nom, type, aide et échantillons"""
+   def __init__(self, name: str, kind: str, help: str, samples: Iterable[Sample] = ()):
+       self.name = name
+       self.kind = kind
+       self.help = help
+       self.samples: List[Sample] = list(samples)
+
+   def add(self, labels: Dict[str, str], value: float, suffix: str = ""):
+       self.samples.append((suffix, labels, value))
+       return self
+
+   def render(self) -> str:
+       lines = [f"# HELP {self.name} {_escape_help(self.help)}", f"# TYPE {self.name} {self.kind}"]
+       for suffix, labels, value in self.samples:
+           lines.append(f"{self.name}{suffix}{_format_labels(labels)} {_format_value(value)}")
+       return "\n".join(lines)
+
+# ================== MÉTRIQUES NATIVES ==================
+
+class _Metric(abc.ABC):
+   """Base: enfants par valeurs de labels, créés à la première mesure"""
+   kind = "untyped"
+
+   def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+       self.name = name
+       self.help = help
+       self.labelnames = tuple(labelnames)
+       self._lock = threading.Lock()
+       self._children: Dict[Labels, object] = {}
+       if not self.labelnames:
+           self._children[()] = self._new_child()
+
+   @abc.abstractmethod
+   def _new_child(self):
+       """Valeur d'un jeu de labels (compteur, jauge ou histogramme)"""
+
+   def labels(self, *values):
+       key = tuple(str(v) for v in values)
+       child = self._children.get(key)
+       if child is None:
+           with self._lock:
+               child = self._children.setdefault(key, self._new_child())
+       return child
+
+   def collect(self) -> Family:
+       family = Family(self.name, self.kind, self.help)
+       with self._lock:
+           children = list(self._children.items())
+       for key, child in children:
+           for suffix, extra, value in child.samples():
+               labels = dict(zip(self.labelnames, key))
+               labels.update(extra)
+               family.add(labels, value, suffix)
+       return family
+
+class _Value:
+   __slots__ = ("value", "_lock")
+
+   def __init__(self):
+       self.value = 0.0
+       self._lock = threading.Lock()
+
+   def inc(self, amount: float = 1.0):
+       with self._lock:
+           self.value += amount
+
+   def dec(self, amount: float = 1.0):
+       with self._lock:
+           self.value -= amount
+
+   def set(self, value: float):
+       self.value = value
+
+   def samples(self):
+       return [("", {}, self.value)]
+
+class Counter(_Metric):
+   """Compteur cumulatif (nom terminé par _total)"""
+   kind = "counter"
+
+   def _new_child(self):
+       return _Value()
+
+   def inc(self, amount: float = 1.0):
+       self._children[()].inc(amount)
+
+class Gauge(_Metric):
+   """Valeur instantanée"""
+   kind = "gauge"
+
+   def _new_child(self):
+       return _Value()
+
+   def inc(self, amount: float = 1.0):
+       self._children[()].inc(amount)
+
+   def dec(self, amount: float = 1.0):
+       self._children[()].dec(amount)
+
+   def set(self, value: float):
+       self._children[()].set(value)
+
+class _HistogramValue:
+   __slots__ = ("bounds", "counts", "sum", "_lock")
+
+   def __init__(self, bounds: Tuple[float, ...]):
+       self.bounds = bounds
+       self.counts = [0] * (len(bounds) + 1)  # dernier: au-delà du plus grand seuil
+       self.sum = 0.0
+       self._lock = threading.Lock()
+
+   def observe(self, value: float):
+       index = bisect_left(self.bounds, value)
+       with self._lock:
+           self.counts[index] += 1
+           self.sum += value
+
+   def samples(self):
+       with self._lock:
+           counts = list(self.counts)
+           total = self.sum
+       result, cumulative = [], 0
+       for bound, count in zip(self.bounds + (float("inf"),), counts):
+           cumulative += count
+           result.append(("_bucket", {"le": _format_value(bound)}, cumulative))
+       result.append(("_sum", {}, total))
+       result.append(("_count", {}, cumulative))
+       return result
+
+class Histogram(_Metric):
+   """Distribution par seuils cumulés (le="..."), plus _sum et _count"""
+   kind = "histogram"
+
+   def __init__(self, name: str, help: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS):
+       self.buckets = tuple(sorted(buckets))
+       super().__init__(name, help, labelnames)
+
+   def _new_child(self):
+       return _HistogramValue(self.buckets)
+
+   def observe(self, value: float):
+       self._children[()].observe(value)
+
+# ================== REGISTRE ==================
+
+Collector = Callable[[], Iterable[Family]]
+
+class Registry:
+   """Métriques natives + collecteurs évalués à chaque scrape"""
+   def __init__(self):
+       self._metrics: List[_Metric] = []
+       self._collectors: List[Collector] = []
+
+   def register(self, metric: _Metric) -> _Metric:
+       self._metrics.append(metric)
+       return metric
+
+   def register_collector(self, collector: Collector) -> Collector:
+       """Utilisable en décorateur"""
+       self._collectors.append(collector)
+       return collector
+
+   def render(self) -> str:
+       families = [metric.collect() for metric in self._metrics]
+       for collector in self._collectors:
+           try:
+               families.extend(collector())
+           except Exception as e:
+               families.append(Family("gamestore_metrics_collector_errors", "gauge", "Collecteur en échec", [("", {"collector": getattr(collector, "__name__", "?"), "error": type(e).__name__}, 1)]))
+       return "\n".join(family.render() for family in families) + "\n"
+
+registry = Registry()
+
+def stats_families(prefix: str, help: str, stats_by_label: Dict[str, Dict], label: str, skip: Sequence[str] = ()) -> List[Family]:
+   """
+   Traduit des dicts de statistiques existants (stats()) en familles Prometheus
+   - Une famille par clé numérique: <prefix>_<clé>{<label>="..."}
+   - Type untyped: les dicts mélangent compteurs cumulés et valeurs instantanées
+   """
+   families: Dict[str, Family] = {}
+   for label_value, stats in stats_by_label.items():
+       for key, value in stats.items():
+           if key in skip or isinstance(value, str) or not isinstance(value, (int, float)):
+               continue
+           name = f"{prefix}_{key}"
+           family = families.get(name)
+           if family is None:
+               family = families[name] = Family(name, "untyped", f"{help}: {key}")
+           family.add({label: str(label_value)} if label else {}, value)
+   return list(families.values())
+
+# ================== MÉTRIQUES DE L'APPLICATION ==================
+
+http_requests = registry.register(Counter(
+   "gamestore_http_requests_total", "Requêtes HTTP terminées", ("method", "route", "status")
+))
+http_duration = registry.register(Histogram(
+   "gamestore_http_request_duration_seconds", "Durée des requêtes HTTP par template de route", ("method", "route")
+))
+http_in_flight = registry.register(Gauge(
+   "gamestore_http_requests_in_flight", "Requêtes HTTP en cours"
+))
+chat_fanout = registry.register(Histogram(
+   "gamestore_chat_fanout_seconds", "Dépôt d'une trame du chat dans les files des sockets locaux", buckets=FANOUT_BUCKETS
+))
+db_queries = registry.register(Counter(
+   "gamestore_db_queries_total", "Requêtes SQL exécutées", ("engine", "statement")
+))
+
+@lru_cache(maxsize=2048)
+def statement_kind(statement: str) -> str:
+   """Premier mot de la requête (SELECT, INSERT, PRAGMA...): cardinalité bornée"""
+   head = statement.lstrip()[:8].split(None, 1)
+   return head[0].upper() if head else "OTHER"
+
+def route_template(scope: dict) -> str:
+   """Template de la route résolue par le routeur (scope complété pendant le routage)"""
+   route = scope.get("route")
+   if route is not None:
+       return getattr(route, "path", "<unknown>")
+   if scope.get("endpoint") is not None:
+       return scope.get("root_path", "") + "/{path}"  # Mount (fichiers statiques)
+   return "<unmatched>"
+
+class MetricsMiddleware:
+   """
+   Middleware ASGI pur (pas de BaseHTTPMiddleware: aucun buffer ni tâche en plus)
+   - Requêtes HTTP uniquement; les WebSockets sont comptés par le chat
+   """
+   def __init__(self, app):
+       self.app = app
+
+   async def __call__(self, scope, receive, send):
+       if scope["type"] != "http":
+           await self.app(scope, receive, send)
+           return
+
+       status = 500
+       async def send_with_status(message):
+           nonlocal status
+           if message["type"] == "http.response.start":
+               status = message["status"]
+           await send(message)
+
+       http_in_flight.inc()
+       start = time.perf_counter()
+       try:
+           await self.app(scope, receive, send_with_status)
+       finally:
+           elapsed = time.perf_counter() - start
+           http_in_flight.dec()
+           route = route_template(scope)
+           method = scope.get("method", "GET")
+           http_duration.labels(method, route).observe(elapsed)
+           http_requests.labels(method, route, status).inc()
+
+def render_metrics() -> str:
+   """Texte complet exposé sur /metrics"""
+   return registry.render()
@@ -20,12 +20,12 @@ Sécurité:
 - Tags HTML whitelist strict
 """
 from fastapi import HTTPException, Depends, Cookie
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import Callable
 from functools import wraps
 import re
-from models import User
-from backend import get_db, get_current_user, verify_admin
+from backend import get_db, get_current_user, verify_admin, Principal
 import bleach
 
 # Constantes de validation
@@ -158,26 +158,26 @@ class AuthMiddleware:
    """
    
    @staticmethod
-   def check_user_not_banned(user: User) -> User:
+   def check_user_not_banned(user: Principal) -> Principal:
        """Vérifie qu'un utilisateur n'est pas banni"""
        if user.is_banned:
            raise HTTPException(403, "Account is banned")
        return user
    
    @staticmethod
-   def require_authenticated_user(db: Session = Depends(get_db)) -> Callable:
+   def require_authenticated_user(db: AsyncSession = Depends(get_db)) -> Callable:
        """Décorateur: exige utilisateur authentifié non banni"""
        def decorator(func):
            @wraps(func)
            async def wrapper(*args, **kwargs):
-               user = get_current_user()
+               user = await get_current_user()
                user = AuthMiddleware.check_user_not_banned(user)
                return await func(*args, **kwargs)
            return wrapper
        return decorator
    
    @staticmethod
-   def require_admin(db: Session = Depends(get_db)) -> Callable:
+   def require_admin(db: AsyncSession = Depends(get_db)) -> Callable:
        """Décorateur: exige droits administrateur"""
        def decorator(func):
            @wraps(func)
@@ -189,17 +189,17 @@ class AuthMiddleware:
        return decorator
    
    @staticmethod
-   def require_game_ownership(game_id: int, db: Session) -> Callable:
+   def require_game_ownership(game_id: int, db: AsyncSession) -> Callable:
        """Décorateur: exige possession d'un jeu spécifique"""
        def decorator(func):
            @wraps(func)
-           async def wrapper(current_user: User = Depends(get_current_user), *args, **kwargs):
+           async def wrapper(current_user: Principal = Depends(get_current_user), *args, **kwargs):
                from models import Purchase
                
-               purchase = db.query(Purchase).filter(
+               purchase = await db.scalar(select(Purchase.purchase_id).where(
                    Purchase.user_id == current_user.user_id,
                    Purchase.game_id == game_id
-               ).first()
+               ).limit(1))
                
                if not purchase:
                    raise HTTPException(403, "Game ownership required")
@@ -254,20 +254,20 @@ class ValidationMiddleware:
 
 # ================== DEPENDENCY INJECTION HELPERS ==================
 
-def get_validated_user(token: str = Cookie(default=None, alias="token"), db: Session = Depends(get_db)) -> User:
+async def get_validated_user(token: str = Cookie(default=None, alias="token"), db: AsyncSession = Depends(get_db)) -> Principal:
    """
    Helper pour injection: récupère utilisateur validé et non banni
-   - Usage: async def route(user: User = Depends(get_validated_user))
+   - Usage: async def route(user: Principal = Depends(get_validated_user))
    """
-   user = get_current_user(token=token, db=db)
+   user = await get_current_user(token=token, db=db)
    return AuthMiddleware.check_user_not_banned(user)
 
-def get_validated_admin(token: str = Cookie(default=None, alias="token"), db: Session = Depends(get_db)) -> User:
+async def get_validated_admin(token: str = Cookie(default=None, alias="token"), db: AsyncSession = Depends(get_db)) -> Principal:
    """
    Helper pour injection: récupère admin validé et non banni
    - Double vérification auth + admin + statut
    """
-   user = get_current_user(token=token, db=db)
+   user = await get_current_user(token=token, db=db)
    admin = verify_admin(user=user)
    return AuthMiddleware.check_user_not_banned(admin)
 
@@ -0,0 +1,236 @@
+"""
+Migrations de schéma versionnées pour la base SQLite
+
+Architecture:
+- Version du schéma stockée dans PRAGMA user_version (en-tête du fichier SQLite)
+- Migrations numérotées, appliquées dans l'ordre, une transaction chacune
+- BEGIN IMMEDIATE: un seul worker migre à la fois, les autres attendent puis sautent
+- Migrations idempotentes (IF NOT EXISTS): sûres sur base neuve créée par create_all
+
+Usage:
+- Automatique au démarrage via initdb.init_db()
+- Manuel: python migrations.py (affiche la version avant/après)
+
+Ajouter une migration:
+- Décorer une fonction avec @migration(<version suivante>, "description")
+- La fonction reçoit une Connection SQLAlchemy déjà en transaction
+"""
+from typing import Callable, List, NamedTuple
+from sqlalchemy.engine import Connection, Engine
+
+class Migration(NamedTuple):
+   version: int
+   description: str
+   apply: Callable[[Connection], None]
+
+MIGRATIONS: List[Migration] = []
+
+def migration(version: int, description: str):
+   """Décorateur: enregistre une migration de schéma"""
+   def decorator(func: Callable[[Connection], None]):
+       MIGRATIONS.append(Migration(version, description, func))
+       MIGRATIONS.sort(key=lambda m: m.version)
+       return func
+   return decorator
+
+def get_schema_version(conn: Connection) -> int:
+   """Version courante du schéma (0 = jamais migré)"""
+   return conn.exec_driver_sql("PRAGMA user_version").scalar()
+
+def column_exists(conn: Connection, table: str, column: str) -> bool:
+   """Vérifie la présence d'une colonne (ALTER TABLE ADD COLUMN non idempotent)"""
+   return any(row[1] == column for row in conn.exec_driver_sql(f"PRAGMA table_info({table})"))
+
+def backfill_rating_aggregates(conn: Connection):
+   """
+   Recalcule rating_sum / rating_count / rating_avg depuis la table ratings
+   - Jeux sans note: rating_avg conservé (notes de démonstration)
+   - Une seule agrégation GROUP BY puis UPDATE ... FROM (SQLite >= 3.33): pas de
+     sous-requête corrélée par jeu (ratings n'est pas indexée par game_id seul)
+   """
+   conn.exec_driver_sql("UPDATE games SET rating_sum = 0, rating_count = 0 WHERE rating_count != 0 OR rating_sum != 0")
+   conn.exec_driver_sql("""
+       UPDATE games SET
+           rating_sum = agg.total,
+           rating_count = agg.n,
+           rating_avg = CAST(agg.total AS REAL) / agg.n
+       FROM (SELECT game_id, SUM(value) AS total, COUNT(*) AS n FROM ratings GROUP BY game_id) AS agg
+       WHERE agg.game_id = games.game_id
+   """)
+
+def latest_version() -> int:
+   """Version cible (dernière migration connue)"""
+   return MIGRATIONS[-1].version if MIGRATIONS else 0
+
+def run_migrations(engine: Engine) -> int:
+   """
+   Applique les migrations en attente
+   - Chaque migration + mise à jour de user_version dans la même transaction
+   - Rollback complet de la migration en cas d'erreur
+   - Retourne la version finale du schéma
+   """
+   with engine.connect() as conn:
+       current = get_schema_version(conn)
+       conn.rollback()
+       if current >= latest_version():
+           return current
+
+       for step in MIGRATIONS:
+           # BEGIN explicite: pysqlite n'ouvre pas de transaction avant un DDL
+           conn.exec_driver_sql("BEGIN IMMEDIATE")
+           try:
+               if get_schema_version(conn) >= step.version:
+                   conn.rollback()
+                   continue
+               step.apply(conn)
+               conn.exec_driver_sql(f"PRAGMA user_version = {int(step.version)}")
+               conn.commit()
+               print(f"🛠️  Migration {step.version} appliquée: {step.description}")
+           except Exception:
+               conn.rollback()
+               raise
+       return get_schema_version(conn)
+
+# ================== MIGRATIONS ==================
+
+@migration(1, "Index composites achats/notes/messages + unicité (user, game)")
+def _composite_indexes(conn: Connection):
+   # Dédoublonnage préalable aux index uniques (premier achat, dernière note conservés)
+   conn.exec_driver_sql("""
+       DELETE FROM purchases WHERE purchase_id NOT IN (
+           SELECT MIN(purchase_id) FROM purchases GROUP BY user_id, game_id
+       )
+   """)
+   conn.exec_driver_sql("""
+       DELETE FROM ratings WHERE rating_id NOT IN (
+           SELECT MAX(rating_id) FROM ratings GROUP BY user_id, game_id
+       )
+   """)
+   conn.exec_driver_sql("CREATE UNIQUE INDEX IF NOT EXISTS ux_purchases_user_game ON purchases (user_id, game_id)")
+   conn.exec_driver_sql("CREATE UNIQUE INDEX IF NOT EXISTS ux_ratings_user_game ON ratings (user_id, game_id)")
+   conn.exec_driver_sql("CREATE INDEX IF NOT EXISTS ix_messages_game_created ON messages (game_id, created_at, message_id)")
+   conn.exec_driver_sql("CREATE INDEX IF NOT EXISTS ix_messages_user_created ON messages (user_id, created_at)")
+
+@migration(2, "Agrégats rating_sum / rating_count sur games + backfill")
+def _rating_aggregates(conn: Connection):
+   if not column_exists(conn, "games", "rating_sum"):
+       conn.exec_driver_sql("ALTER TABLE games ADD COLUMN rating_sum INTEGER NOT NULL DEFAULT 0")
+   if not column_exists(conn, "games", "rating_count"):
+       conn.exec_driver_sql("ALTER TABLE games ADD COLUMN rating_count INTEGER NOT NULL DEFAULT 0")
+   backfill_rating_aggregates(conn)
+
+@migration(3, "Index plein texte FTS5 sur le catalogue (titre, description, éditeur, catégorie)")
+def _games_fts(conn: Connection):
+   # Table FTS à contenu externe: l'index référence games.game_id sans dupliquer le texte
+   conn.exec_driver_sql("""
+       CREATE VIRTUAL TABLE IF NOT EXISTS games_fts USING fts5(
+           title, description, publisher, category,
+           content='games', content_rowid='game_id',
+           tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+       )
+   """)
+   # Synchronisation par triggers: couvre create_game et toute écriture future sur games
+   conn.exec_driver_sql("""
+       CREATE TRIGGER IF NOT EXISTS games_fts_ai AFTER INSERT ON games BEGIN
+           INSERT INTO games_fts(rowid, title, description, publisher, category)
+           VALUES (new.game_id, new.title, new.description, new.publisher, new.category);
+       END
+   """)
+   conn.exec_driver_sql("""
+       CREATE TRIGGER IF NOT EXISTS games_fts_ad AFTER DELETE ON games BEGIN
+           INSERT INTO games_fts(games_fts, rowid, title, description, publisher, category)
+           VALUES ('delete', old.game_id, old.title, old.description, old.publisher, old.category);
+       END
+   """)
+   # Uniquement sur les colonnes indexées: les votes (rating_*) ne réécrivent pas l'index
+   conn.exec_driver_sql("""
+       CREATE TRIGGER IF NOT EXISTS games_fts_au AFTER UPDATE OF title, description, publisher, category ON games BEGIN
+           INSERT INTO games_fts(games_fts, rowid, title, description, publisher, category)
+           VALUES ('delete', old.game_id, old.title, old.description, old.publisher, old.category);
+           INSERT INTO games_fts(rowid, title, description, publisher, category)
+           VALUES (new.game_id, new.title, new.description, new.publisher, new.category);
+       END
+   """)
+   conn.exec_driver_sql("INSERT INTO games_fts(games_fts) VALUES ('rebuild')")
+
+@migration(4, "Compteur de version du catalogue (data_versions + triggers), clé du cache catalogue")
+def _data_versions(conn: Connection):
+   conn.exec_driver_sql("""
+       CREATE TABLE IF NOT EXISTS data_versions (
+           name VARCHAR(50) NOT NULL PRIMARY KEY,
+           version INTEGER NOT NULL DEFAULT 0,
+           updated_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP
+       )
+   """)
+   conn.exec_driver_sql("INSERT OR IGNORE INTO data_versions (name) VALUES ('catalog')")
+   # Toute écriture sur games ou ratings change une représentation du catalogue
+   for table in ("games", "ratings"):
+       for operation in ("INSERT", "UPDATE", "DELETE"):
+           conn.exec_driver_sql(f"""
+               CREATE TRIGGER IF NOT EXISTS {table}_version_{operation.lower()} AFTER {operation} ON {table} BEGIN
+                   UPDATE data_versions SET version = version + 1, updated_at = CURRENT_TIMESTAMP
+                   WHERE name = 'catalog';
+               END
+           """)
+
+@migration(5, "Index (game_id, message_id) pour la reprise du chat depuis un id")
+def _messages_game_id(conn: Connection):
+   conn.exec_driver_sql("CREATE INDEX IF NOT EXISTS ix_messages_game_id ON messages (game_id, message_id)")
+
+@migration(6, "Archive du chat (messages_archive) et rétention par jeu (chat_retention)")
+def _chat_archive(conn: Connection):
+   conn.exec_driver_sql("""
+       CREATE TABLE IF NOT EXISTS messages_archive (
+           message_id INTEGER NOT NULL PRIMARY KEY,
+           game_id INTEGER NOT NULL,
+           user_id INTEGER NOT NULL,
+           username VARCHAR(50) NOT NULL,
+           content TEXT NOT NULL,
+           created_at DATETIME NOT NULL,
+           archived_at DATETIME DEFAULT (CURRENT_TIMESTAMP)
+       )
+   """)
+   conn.exec_driver_sql("CREATE INDEX IF NOT EXISTS ix_messages_archive_game ON messages_archive (game_id, message_id)")
+   conn.exec_driver_sql("""
+       CREATE TABLE IF NOT EXISTS chat_retention (
+           game_id INTEGER NOT NULL PRIMARY KEY REFERENCES games (game_id) ON DELETE CASCADE,
+           keep_last INTEGER,
+           keep_days INTEGER
+       )
+   """)
+
+@migration(7, "Clé naturelle unique des jeux (title, publisher) pour l'import en masse")
+def _games_natural_key(conn: Connection):
+   # Doublons existants: renommés (suffixe #id) plutôt que supprimés, achats et notes conservés
+   conn.exec_driver_sql("""
+       UPDATE games SET title = substr(title, 1, 90) || ' #' || game_id
+       WHERE game_id NOT IN (SELECT MIN(game_id) FROM games GROUP BY title, publisher)
+   """)
+   conn.exec_driver_sql("CREATE UNIQUE INDEX IF NOT EXISTS ux_games_title_publisher ON games (title, publisher)")
+
+@migration(8, "Index de recherche et de pagination des utilisateurs (administration)")
+def _users_admin_indexes(conn: Connection):
+   conn.exec_driver_sql("CREATE INDEX IF NOT EXISTS ix_users_username_nocase ON users (username COLLATE NOCASE)")
+   conn.exec_driver_sql("CREATE INDEX IF NOT EXISTS ix_users_banned ON users (is_banned, user_id)")
+   conn.exec_driver_sql("CREATE INDEX IF NOT EXISTS ix_users_created ON users (created_at, user_id)")
+   conn.exec_driver_sql("CREATE INDEX IF NOT EXISTS ix_users_last_login ON users (last_login, user_id)")
+
+@migration(9, "Clés d'idempotence des achats (idempotency_keys)")
+def _idempotency_keys(conn: Connection):
+   conn.exec_driver_sql("""
+       CREATE TABLE IF NOT EXISTS idempotency_keys (
+           user_id INTEGER NOT NULL REFERENCES users (user_id) ON DELETE CASCADE,
+           key VARCHAR(100) NOT NULL,
+           fingerprint VARCHAR(64) NOT NULL,
+           status_code INTEGER NOT NULL DEFAULT 200,
+           response TEXT,
+           created_at DATETIME NOT NULL,
+           PRIMARY KEY (user_id, key)
+       )
+   """)
+
+if __name__ == "__main__":
+   from models import engine
+   with engine.connect() as connection:
+       print(f"Version actuelle: {get_schema_version(connection)} / cible: {latest_version()}")
+   print(f"Version finale: {run_migrations(engine)}")
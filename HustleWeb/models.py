@@ -6,6 +6,8 @@ Architecture de données:
 - Relations bidirectionnelles entre entités
 - Timestamps UTC pour cohérence globale
 - Contraintes d'intégrité référentielle
+- Index composites sur les accès chauds (migrations.py pour les bases existantes)
+- Moteur sync (init/scripts) + moteur async aiosqlite (routes FastAPI)
 
 Tables principales:
 - User: Utilisateurs avec rôles et statuts
@@ -13,18 +15,23 @@ Tables principales:
 - Purchase: Historique d'achats (relation M2M User-Game)
 - Message: Chat par jeu
 - Rating: Notes des jeux (relation M2M User-Game)
+- DataVersion: Compteurs de version partagés entre workers (cache catalogue, ETag HTTP)
+- MessageArchive / ChatRetention: Historique de chat archivé et politique de rétention
 
 Fonctionnalités:
 - Authentification par username/email + password hashé
 - Système de permissions (admin/user) et bannissement
 - Chat séparé par jeu (seuls propriétaires peuvent poster)
-- Système de notation avec moyenne dénormalisée
+- Système de notation avec somme/compte/moyenne dénormalisés
 - Historique d'achats avec prix au moment de l'achat
 """
 from datetime import datetime, timezone
 from typing import Optional, List
-from sqlalchemy import create_engine, String, Integer, DateTime, ForeignKey, Float, Boolean, Text
+from sqlalchemy import String, Integer, DateTime, ForeignKey, Float, Boolean, Text, Index, func, text
 from sqlalchemy.orm import relationship, declarative_base, Mapped, mapped_column, sessionmaker
+from sqlalchemy.ext.asyncio import async_sessionmaker, AsyncSession
+from config import settings
+from database import create_sqlite_engine, create_async_sqlite_engine
 import os
 
 Base = declarative_base()
@@ -37,6 +44,9 @@ class Rating(Base):
    - Relations Many-to-One avec User et Game
    """
    __tablename__ = "ratings"
+   __table_args__ = (
+       Index("ux_ratings_user_game", "user_id", "game_id", unique=True),  # Une note par couple
+   )
    
    rating_id: Mapped[int] = mapped_column(Integer, primary_key=True)
    user_id: Mapped[int] = mapped_column(Integer, ForeignKey("users.user_id"), nullable=False)
@@ -57,6 +67,13 @@ class User(Base):
    - Relations avec achats, messages et notes
    """
    __tablename__ = "users"
+   __table_args__ = (
+       # Recherche et pagination de l'administration (préfixes, filtres, tri par clé)
+       Index("ix_users_username_nocase", text("username COLLATE NOCASE")),
+       Index("ix_users_banned", "is_banned", "user_id"),
+       Index("ix_users_created", "created_at", "user_id"),
+       Index("ix_users_last_login", "last_login", "user_id"),
+   )
 
    user_id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
    email: Mapped[str] = mapped_column(String(254), unique=True, index=True)  # RFC 5321
@@ -86,6 +103,9 @@ class Game(Base):
    - Relations avec achats, messages et notes
    """
    __tablename__ = "games"
+   __table_args__ = (
+       Index("ux_games_title_publisher", "title", "publisher", unique=True),  # Clé naturelle (import en masse)
+   )
 
    game_id: Mapped[int] = mapped_column(Integer, primary_key=True)
    title: Mapped[str] = mapped_column(String(100), nullable=False)
@@ -98,7 +118,10 @@ class Game(Base):
    category: Mapped[str] = mapped_column(String(50))  # RPG, Strategy, etc.
    platforms: Mapped[str] = mapped_column(String(100))  # CSV: "PC,PlayStation,Xbox"
    
-   # Note moyenne dénormalisée (recalculée après chaque note)
+   # Agrégats de notes dénormalisés (mis à jour en O(1) par un UPDATE atomique)
+   # rating_avg = rating_sum / rating_count, maintenu dans le même UPDATE
+   rating_sum: Mapped[int] = mapped_column(Integer, default=0, server_default="0")
+   rating_count: Mapped[int] = mapped_column(Integer, default=0, server_default="0")
    rating_avg: Mapped[float] = mapped_column(Float, default=0.0)
    image: Mapped[str] = mapped_column(String(200), default="#333")  # URL ou couleur
 
@@ -115,6 +138,9 @@ class Purchase(Base):
    - Vérification propriété pour features (chat, rating)
    """
    __tablename__ = "purchases"
+   __table_args__ = (
+       Index("ux_purchases_user_game", "user_id", "game_id", unique=True),  # Vérification propriété
+   )
 
    purchase_id: Mapped[int] = mapped_column(primary_key=True)
    user_id: Mapped[int] = mapped_column(ForeignKey("users.user_id"))
@@ -135,6 +161,11 @@ class Message(Base):
    - Ordre chronologique par created_at
    """
    __tablename__ = "messages"
+   __table_args__ = (
+       Index("ix_messages_game_created", "game_id", "created_at", "message_id"),  # Chat d'un jeu trié
+       Index("ix_messages_user_created", "user_id", "created_at"),  # Messages d'un utilisateur
+       Index("ix_messages_game_id", "game_id", "message_id"),  # Reprise du chat après un id (since)
+   )
 
    message_id: Mapped[int] = mapped_column(Integer, primary_key=True)
    user_id: Mapped[int] = mapped_column(ForeignKey("users.user_id"), nullable=False)
@@ -146,18 +177,85 @@ class Message(Base):
    user: Mapped["User"] = relationship(back_populates="messages")
    game: Mapped["Game"] = relationship(back_populates="messages")
 
+# ================== ARCHIVE DU CHAT ==================
+class MessageArchive(Base):
+   """
+   Messages sortis de la table chaude par l'archiveur (archiver.py)
+   - Même message_id que dans messages (rejeu idempotent)
+   - Sans clé étrangère: username copié, pas de cascade sur users/games
+   """
+   __tablename__ = "messages_archive"
+   __table_args__ = (
+       Index("ix_messages_archive_game", "game_id", "message_id"),  # Pagination de l'archive d'un jeu
+   )
+
+   message_id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=False)
+   game_id: Mapped[int] = mapped_column(Integer, nullable=False)
+   user_id: Mapped[int] = mapped_column(Integer, nullable=False)
+   username: Mapped[str] = mapped_column(String(50), nullable=False)
+   content: Mapped[str] = mapped_column(Text, nullable=False)
+   created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), nullable=False)
+   archived_at: Mapped[datetime] = mapped_column(DateTime, server_default=func.current_timestamp())
+
+class ChatRetention(Base):
+   """
+   Politique de rétention du chat surchargée pour un jeu
+   - keep_last: nombre de messages gardés en table chaude (NULL = défaut global)
+   - keep_days: ancienneté max en jours (NULL = défaut global)
+   """
+   __tablename__ = "chat_retention"
+
+   game_id: Mapped[int] = mapped_column(ForeignKey("games.game_id", ondelete="CASCADE"), primary_key=True)
+   keep_last: Mapped[Optional[int]] = mapped_column(Integer, nullable=True)
+   keep_days: Mapped[Optional[int]] = mapped_column(Integer, nullable=True)
+
+# ================== CLÉS D'IDEMPOTENCE ==================
+class IdempotencyKey(Base):
+   """
+   Réponse mémorisée d'une requête d'achat rejouable (en-tête Idempotency-Key)
+   - Clé propre à un utilisateur; fingerprint = empreinte de la requête d'origine
+   - Écrite dans la même transaction que les achats: réponse présente dès que visible
+   - Expirée après idempotency_key_ttl (réutilisable, purgée au fil des achats)
+   """
+   __tablename__ = "idempotency_keys"
+
+   user_id: Mapped[int] = mapped_column(ForeignKey("users.user_id", ondelete="CASCADE"), primary_key=True)
+   key: Mapped[str] = mapped_column(String(100), primary_key=True)
+   fingerprint: Mapped[str] = mapped_column(String(64), nullable=False)
+   status_code: Mapped[int] = mapped_column(Integer, nullable=False, default=200)
+   response: Mapped[Optional[str]] = mapped_column(Text, nullable=True)
+   created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), nullable=False)
+
+# ================== MODÈLE DATA VERSION ==================
+class DataVersion(Base):
+   """
+   Compteurs de version par jeu de données
+   - "catalog": incrémenté par triggers SQLite sur games et ratings (voir migrations.py)
+   - Partagé entre workers puisque stocké en base
+   """
+   __tablename__ = "data_versions"
+
+   name: Mapped[str] = mapped_column(String(50), primary_key=True)
+   version: Mapped[int] = mapped_column(Integer, default=0, server_default="0")
+   updated_at: Mapped[datetime] = mapped_column(DateTime, server_default=func.current_timestamp())
+
 # ================== CONFIGURATION BASE DE DONNÉES ==================
 
-# Configuration SQLite avec chemin absolu
+# Configuration SQLite avec chemin absolu (surchargeable via GAMESTORE_DATABASE_PATH)
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
-db_path = os.path.join(BASE_DIR, "game_store.db")
+db_path = os.path.abspath(settings.database_path)
 DATABASE_URL = f"sqlite:///{db_path}"
+ASYNC_DATABASE_URL = f"sqlite+aiosqlite:///{db_path}"
+
+# Moteur SQLAlchemy (WAL, PRAGMAs et pool dimensionné: voir database.py)
+engine = create_sqlite_engine(DATABASE_URL)
+
+# Factory de sessions (initialisation DB et scripts hors requêtes)
+SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
-# Moteur SQLAlchemy
-engine = create_engine(
-   DATABASE_URL,
-   connect_args={"check_same_thread": False}  # Nécessaire SQLite + threads
-)
+# Moteur asynchrone (aiosqlite) utilisé par les routes FastAPI
+async_engine = create_async_sqlite_engine(ASYNC_DATABASE_URL)
 
-# Factory de sessions
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
\ No newline at end of file
+# Factory de sessions async
+# - expire_on_commit=False: objets lisibles après commit sans lazy-load implicite
+AsyncSessionLocal = async_sessionmaker(bind=async_engine, class_=AsyncSession, autoflush=False, expire_on_commit=False)
\ No newline at end of file
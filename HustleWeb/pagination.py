@@ -0,0 +1,135 @@
+"""
+Pagination par curseur (keyset) pour les endpoints de liste
+
+Principe:
+- Tri sur une clé unique et stable: (created_at, id) ou clé primaire
+- Page suivante = lignes strictement après la dernière clé vue (WHERE (k1, k2) > (:v1, :v2))
+- Coût constant quelle que soit la profondeur (pas d'OFFSET qui relit les lignes sautées)
+- Les index composites (voir models.py) couvrent filtre + tri
+
+Contrat HTTP:
+- Paramètres: limit (1..MAX_PAGE_SIZE), after / before (curseurs opaques)
+- Corps de réponse inchangé (liste JSON) pour compatibilité frontend
+- En-têtes X-Next-Cursor / X-Prev-Cursor quand une page voisine existe
+- Les curseurs suivent l'ordre de tri de l'endpoint (after = plus loin dans cet ordre)
+"""
+import base64
+import json
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any, Callable, List, Optional, Sequence
+from fastapi import HTTPException, Query, Response
+from sqlalchemy import Select, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+# ================== CURSEURS OPAQUES ==================
+
+def encode_cursor(values: Sequence[Any]) -> str:
+   """Encode les valeurs de clé de tri en curseur base64url"""
+   payload = [{"dt": v.isoformat()} if isinstance(v, datetime) else v for v in values]
+   raw = json.dumps(payload, separators=(",", ":")).encode("utf-8")
+   return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+def _decode_value(value: Any) -> Any:
+   """Valeur scalaire de clé de tri (str, nombre, null) ou {"dt": ISO 8601}"""
+   if isinstance(value, dict):
+       if list(value) != ["dt"] or not isinstance(value["dt"], str):
+           raise ValueError("cursor datetime")
+       return datetime.fromisoformat(value["dt"])
+   if value is None or (isinstance(value, (str, int, float)) and not isinstance(value, bool)):
+       return value
+   raise ValueError("cursor value")
+
+def decode_cursor(cursor: str, size: int) -> List[Any]:
+   """Décode un curseur; 400 si altéré ou de mauvaise forme (jamais de valeur composite en SQL)"""
+   try:
+       raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+       payload = json.loads(raw)
+       if not isinstance(payload, list) or len(payload) != size:
+           raise ValueError("cursor size")
+       return [_decode_value(v) for v in payload]
+   except (ValueError, TypeError, KeyError):
+       raise HTTPException(400, "Invalid cursor")
+
+# ================== PARAMÈTRES ET PAGE ==================
+
+@dataclass
+class PageParams:
+   """Paramètres de pagination extraits de la query string"""
+   limit: int = DEFAULT_PAGE_SIZE
+   after: Optional[str] = None
+   before: Optional[str] = None
+
+def page_params(default_limit: int = DEFAULT_PAGE_SIZE) -> Callable[..., PageParams]:
+   """
+   Fabrique de dépendance FastAPI pour les paramètres de pagination
+   - Usage: page: PageParams = Depends(page_params(100))
+   """
+   def dependency(
+       limit: int = Query(default_limit, ge=1, le=MAX_PAGE_SIZE),
+       after: Optional[str] = Query(None),
+       before: Optional[str] = Query(None)
+   ) -> PageParams:
+       if after and before:
+           raise HTTPException(400, "Use either 'after' or 'before', not both")
+       return PageParams(limit=limit, after=after, before=before)
+   return dependency
+
+@dataclass
+class Page:
+   """Résultat paginé: éléments + curseurs des pages voisines"""
+   items: List[Any]
+   next_cursor: Optional[str] = None
+   prev_cursor: Optional[str] = None
+
+   def apply_headers(self, response: Response):
+       """Expose les curseurs en en-têtes HTTP"""
+       if self.next_cursor:
+           response.headers["X-Next-Cursor"] = self.next_cursor
+       if self.prev_cursor:
+           response.headers["X-Prev-Cursor"] = self.prev_cursor
+
+# ================== REQUÊTE KEYSET ==================
+
+async def paginate(db: AsyncSession, stmt: Select, keys: Sequence, page: PageParams, *, descending: bool = False, key_of: Callable[[Any], Sequence[Any]]) -> Page:
+   """
+   Exécute stmt (select d'entité ORM) paginé par clé composite
+   - keys: colonnes de tri (la dernière doit rendre la clé unique)
+   - key_of: extrait les valeurs de clé d'un élément du résultat
+   - limit+1 lignes lues pour savoir si une page suivante existe
+   - before: tri inversé en SQL puis remis dans l'ordre de l'endpoint
+   """
+   backwards = page.before is not None
+   cursor = page.before if backwards else page.after
+   row_key = tuple_(*keys) if len(keys) > 1 else keys[0]
+
+   if cursor:
+       values = decode_cursor(cursor, len(keys))
+       bound = tuple_(*values) if len(keys) > 1 else values[0]
+       forward_is_greater = not descending
+       if forward_is_greater != backwards:
+           stmt = stmt.where(row_key > bound)
+       else:
+           stmt = stmt.where(row_key < bound)
+
+   sql_descending = descending != backwards
+   stmt = stmt.order_by(*[k.desc() if sql_descending else k.asc() for k in keys]).limit(page.limit + 1)
+
+   result = await db.execute(stmt)
+   rows = list(result.scalars().unique())
+   has_more = len(rows) > page.limit
+   rows = rows[:page.limit]
+   if backwards:
+       rows.reverse()
+
+   if not rows:
+       return Page(items=[])
+
+   first_cursor = encode_cursor(key_of(rows[0]))
+   last_cursor = encode_cursor(key_of(rows[-1]))
+   if backwards:
+       return Page(items=rows, next_cursor=last_cursor, prev_cursor=first_cursor if has_more else None)
+   return Page(items=rows, next_cursor=last_cursor if has_more else None, prev_cursor=first_cursor if cursor else None)
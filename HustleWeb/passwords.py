@@ -0,0 +1,176 @@
+"""
+Hachage bcrypt hors de la boucle asyncio avec concurrence bornée
+
+Architecture:
+- ThreadPoolExecutor dédié: bcrypt libère le GIL pendant le calcul, les threads
+  suffisent et la boucle asyncio reste libre (chat, pages, API)
+- Nombre de threads = plafond de concurrence (password_hash_workers), les
+  demandes suivantes attendent dans la file de l'executor
+- File d'attente bornée: au-delà de password_hash_max_queue demandes en attente,
+  ou après password_hash_queue_timeout secondes d'attente, la requête reçoit un 503
+- Coût bcrypt configurable (bcrypt_rounds); needs_rehash() détecte les hash
+  créés avec un autre coût pour les recalculer à la connexion suivante
+
+Statistiques exposées:
+- queued / running: profondeur de file et calculs en cours
+- hash / verify: nombre, durée totale / max / moyenne (hors attente)
+- wait_time_*: temps passé dans la file, rejected: requêtes refusées
+"""
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, TypeVar
+import bcrypt
+from fastapi import HTTPException
+from config import settings
+
+T = TypeVar("T")
+
+# ================== FONCTIONS BLOQUANTES ==================
+
+def hash_password_blocking(password: str, rounds: int) -> str:
+   """Hash bcrypt avec salt unique (bloquant, à exécuter hors boucle)"""
+   return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt(rounds=rounds)).decode('utf-8')
+
+def verify_password_blocking(plain_password: str, hashed_password: str) -> bool:
+   """Vérification timing-safe d'un mot de passe (bloquant)"""
+   return bcrypt.checkpw(plain_password.encode('utf-8'), hashed_password.encode('utf-8'))
+
+def hash_rounds(hashed_password: str) -> int:
+   """Coût bcrypt encodé dans un hash ($2b$<rounds>$...), 0 si illisible"""
+   try:
+       return int(hashed_password.split("$")[2])
+   except (IndexError, ValueError):
+       return 0
+
+# ================== STATISTIQUES ==================
+
+class _OperationStats:
+   """Compteurs de durée d'une opération (hash ou verify)"""
+   def __init__(self):
+       self.count = 0
+       self.time_total = 0.0
+       self.time_max = 0.0
+
+   def record(self, elapsed: float):
+       self.count += 1
+       self.time_total += elapsed
+       if elapsed > self.time_max:
+           self.time_max = elapsed
+
+   def snapshot(self) -> Dict:
+       return {
+           "count": self.count,
+           "time_total": round(self.time_total, 6),
+           "time_max": round(self.time_max, 6),
+           "time_avg": round(self.time_total / self.count, 6) if self.count else 0.0
+       }
+
+# ================== HACHEUR ==================
+
+class PasswordHasher:
+   """
+   Exécute bcrypt dans un pool de threads dédié
+   - Usage: hashed = await password_hasher.hash(password)
+   """
+   def __init__(self, workers: int, max_queue: int, queue_timeout: float, rounds: int):
+       self.workers = workers
+       self.max_queue = max_queue
+       self.queue_timeout = queue_timeout
+       self.rounds = rounds
+       self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="bcrypt")
+       self._lock = threading.Lock()
+       self.queued = 0
+       self.running = 0
+       self.rejected = 0
+       self.wait_time_total = 0.0
+       self.wait_time_max = 0.0
+       self.waits = 0
+       self._ops = {"hash": _OperationStats(), "verify": _OperationStats()}
+
+   async def hash(self, password: str) -> str:
+       """Hash avec le coût configuré"""
+       return await self._run("hash", hash_password_blocking, password, self.rounds)
+
+   async def verify(self, plain_password: str, hashed_password: str) -> bool:
+       """Vérifie un mot de passe contre son hash"""
+       return await self._run("verify", verify_password_blocking, plain_password, hashed_password)
+
+   def needs_rehash(self, hashed_password: str) -> bool:
+       """Vrai si le hash a été produit avec un autre coût que celui configuré"""
+       return hash_rounds(hashed_password) != self.rounds
+
+   async def _run(self, operation: str, func: Callable[..., T], *args) -> T:
+       """
+       Soumet func au pool et attend son résultat
+       - 503 immédiat si la file d'attente est pleine
+       - 503 si la tâche a attendu plus de queue_timeout avant de démarrer
+         (le calcul n'est alors pas lancé: pas de travail pour un client parti)
+       """
+       with self._lock:
+           if self.max_queue and self.queued >= self.max_queue:
+               self.rejected += 1
+               raise HTTPException(503, "Server busy, retry later", headers={"Retry-After": "1"})
+           self.queued += 1
+
+       enqueued = time.perf_counter()
+
+       def task():
+           waited = time.perf_counter() - enqueued
+           with self._lock:
+               self.queued -= 1
+               self._record_wait(waited)
+               if waited > self.queue_timeout:
+                   self.rejected += 1
+                   return False, None
+               self.running += 1
+           start = time.perf_counter()
+           try:
+               return True, func(*args)
+           finally:
+               with self._lock:
+                   self.running -= 1
+                   self._ops[operation].record(time.perf_counter() - start)
+
+       def on_done(future):
+           # Annulée avant démarrage (client déconnecté): sortie de file
+           if future.cancelled():
+               with self._lock:
+                   self.queued -= 1
+
+       future = self._executor.submit(task)
+       future.add_done_callback(on_done)
+       started, result = await asyncio.wrap_future(future)
+       if not started:
+           raise HTTPException(503, "Server busy, retry later", headers={"Retry-After": "1"})
+       return result
+
+   def _record_wait(self, elapsed: float):
+       self.waits += 1
+       self.wait_time_total += elapsed
+       if elapsed > self.wait_time_max:
+           self.wait_time_max = elapsed
+
+   def stats(self) -> Dict:
+       """Profondeur de file, calculs en cours et latences"""
+       with self._lock:
+           return {
+               "workers": self.workers,
+               "rounds": self.rounds,
+               "queued": self.queued,
+               "running": self.running,
+               "rejected": self.rejected,
+               "wait_time_total": round(self.wait_time_total, 6),
+               "wait_time_max": round(self.wait_time_max, 6),
+               "wait_time_avg": round(self.wait_time_total / self.waits, 6) if self.waits else 0.0,
+               "hash": self._ops["hash"].snapshot(),
+               "verify": self._ops["verify"].snapshot()
+           }
+
+password_hasher = PasswordHasher(
+   workers=settings.password_hash_workers,
+   max_queue=settings.password_hash_max_queue,
+   queue_timeout=settings.password_hash_queue_timeout,
+   rounds=settings.bcrypt_rounds
+)
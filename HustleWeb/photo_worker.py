@@ -0,0 +1,41 @@
+"""
+Fonction des processus de travail des photos de profil (voir photos.PhotoProcessor)
+
+- Module volontairement minimal: seul import chargé par le serveur forkserver
+  et les processus de travail (ni FastAPI, ni base, ni configuration)
+- Pillow importé à l'appel seulement: son absence n'empêche pas le démarrage
+"""
+import os
+from typing import Dict, Sequence
+
+PHOTO_FORMATS = ("JPEG", "PNG", "GIF", "WEBP")
+
+def render_photo(source: str, digest: str, sizes: Sequence[int], directory: str, max_pixels: int) -> Dict[int, str]:
+   """
+   Décode source et écrit un JPEG carré par taille (bloquant, processus de travail)
+   - Écriture dans un fichier temporaire puis os.replace: jamais de fichier partiel visible
+   - ValueError si l'image est illisible, trop grande ou d'un format refusé
+   """
+   from PIL import Image, ImageOps, UnidentifiedImageError  # dépendance chargée dans le processus de travail
+
+   Image.MAX_IMAGE_PIXELS = max_pixels
+   try:
+       with Image.open(source) as image:
+           if image.format not in PHOTO_FORMATS:
+               raise ValueError(f"Unsupported image format: {image.format}")
+           if image.width * image.height > max_pixels:
+               raise ValueError("Image dimensions too large")
+           image = ImageOps.exif_transpose(image).convert("RGB")
+           names = {}
+           for size in sizes:
+               name = f"{digest}-{size}.jpg"
+               target = os.path.join(directory, name)
+               if not os.path.exists(target):
+                   square = ImageOps.fit(image, (size, size), Image.Resampling.LANCZOS)
+                   partial = f"{target}.{os.getpid()}.tmp"
+                   square.save(partial, "JPEG", quality=85, optimize=True, progressive=True)
+                   os.replace(partial, target)
+               names[size] = name
+           return names
+   except (UnidentifiedImageError, Image.DecompressionBombError, OSError, SyntaxError) as e:
+       raise ValueError(f"Invalid image: {e}")
@@ -0,0 +1,319 @@
+"""
+Photos de profil: réception en flux, redimensionnement hors processus, noms par contenu
+
+Réception (receive_photo):
+- Corps lu morceau par morceau (request.stream()), jamais entièrement en mémoire
+- multipart/form-data (champ "photo", comme le formulaire du profil) découpé par
+  le parseur incrémental de python-multipart; corps brut image/* accepté aussi
+- Content-Length annoncé trop grand: 413 avant toute lecture; sinon 413 dès
+  que photo_max_bytes est dépassé en cours de route
+- Écriture du fichier temporaire et empreinte SHA-256 dans un thread (asyncio.to_thread)
+
+Traitement (PhotoProcessor):
+- Pool de processus (photo_workers) : décodage Pillow, orientation EXIF,
+  recadrage carré et JPEG pour chaque taille de photo_sizes
+- Démarrage "forkserver" (jamais fork: le serveur a déjà des threads actifs);
+  le serveur forkserver ne précharge que photo_worker (render_photo)
+- Sous uvicorn main:app, le __main__ est celui d'uvicorn: rien n'est réexécuté
+  dans les processus de travail; sous python main.py, main.py y est importé
+  sous le nom __mp_main__ (bloc __main__ ignoré, init_db idempotente)
+- Pillow importé dans les processus de travail seulement (503 s'il manque)
+- File bornée (photo_max_queue): au-delà, 503 immédiat
+- Images > photo_max_pixels ou formats hors photo_worker.PHOTO_FORMATS refusés (400)
+
+Stockage:
+- static/photos/<empreinte>-<taille>.jpg: nom dérivé du contenu source, donc
+  immuable (Cache-Control immutable via PhotoStaticFiles) et dédupliqué
+  (même photo envoyée deux fois = aucun retraitement)
+- Anciennes photos conservées: un fichier peut être partagé par plusieurs comptes
+
+Statistiques exposées:
+- received / bytes_received / rejected_too_large: réception
+- processed / deduplicated / failed / queued / rejected_busy: traitement
+"""
+import asyncio
+import hashlib
+import multiprocessing
+import os
+import re
+import tempfile
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Sequence
+from fastapi import HTTPException, Request
+from fastapi.staticfiles import StaticFiles
+from multipart.multipart import MultipartParser, parse_options_header
+from config import settings
+from photo_worker import render_photo
+
+PHOTOS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "static", "photos")
+PHOTOS_URL = "/static/photos"
+PHOTO_FIELD = "photo"
+HASHED_NAME = re.compile(r"^[0-9a-f]{32}-\d+\.jpg$")
+CACHE_IMMUTABLE = "public, max-age=31536000, immutable"
+MULTIPART_OVERHEAD = 64 * 1024  # en-têtes de parties et autres champs du formulaire
+
+# ================== RÉCEPTION EN FLUX ==================
+
+@dataclass
+class PhotoUpload:
+   """Photo reçue: fichier temporaire, empreinte du contenu et taille"""
+   path: str
+   digest: str
+   size: int
+
+   async def discard(self):
+       """Supprime le fichier temporaire (hors boucle)"""
+       await asyncio.to_thread(_unlink, self.path)
+
+def _unlink(path: str):
+   try:
+       os.unlink(path)
+   except FileNotFoundError:
+       pass
+
+def _write(file, hasher, chunks: List[bytes]):
+   """Écrit des morceaux et met à jour l'empreinte (bloquant, thread)"""
+   for chunk in chunks:
+       file.write(chunk)
+       hasher.update(chunk)
+
+class _PhotoPart:
+   """
+   Callbacks du parseur multipart: ne garde que les octets du champ fichier "photo"
+   - Les autres champs sont ignorés (mais comptés dans la taille totale du corps)
+   """
+   def __init__(self):
+       self.headers: Dict[bytes, bytes] = {}
+       self.header_field = b""
+       self.header_value = b""
+       self.in_photo = False
+       self.found = False
+       self.content_type = b""
+       self.chunks: List[bytes] = []
+
+   def callbacks(self) -> Dict:
+       return {
+           "on_part_begin": self.on_part_begin,
+           "on_header_field": self.on_header_field,
+           "on_header_value": self.on_header_value,
+           "on_header_end": self.on_header_end,
+           "on_headers_finished": self.on_headers_finished,
+           "on_part_data": self.on_part_data,
+           "on_part_end": self.on_part_end,
+       }
+
+   def on_part_begin(self):
+       self.headers = {}
+
+   def on_header_field(self, data: bytes, start: int, end: int):
+       self.header_field += data[start:end]
+
+   def on_header_value(self, data: bytes, start: int, end: int):
+       self.header_value += data[start:end]
+
+   def on_header_end(self):
+       self.headers[self.header_field.lower()] = self.header_value
+       self.header_field = self.header_value = b""
+
+   def on_headers_finished(self):
+       _, options = parse_options_header(self.headers.get(b"content-disposition", b""))
+       self.in_photo = not self.found and options.get(b"name") == PHOTO_FIELD.encode() and b"filename" in options
+       if self.in_photo:
+           self.found = True
+           self.content_type = self.headers.get(b"content-type", b"")
+
+   def on_part_data(self, data: bytes, start: int, end: int):
+       if self.in_photo:
+           self.chunks.append(data[start:end])
+
+   def on_part_end(self):
+       self.in_photo = False
+
+async def receive_photo(request: Request, max_bytes: int) -> PhotoUpload:
+   """
+   Reçoit la photo en flux vers un fichier temporaire
+   - 400 si le corps n'est ni une image brute ni un formulaire avec un champ "photo" image
+   - 413 dès que la photo (ou le corps entier, marge multipart incluse) dépasse max_bytes
+   """
+   content_type, options = parse_options_header(request.headers.get("content-type", ""))
+   part: Optional[_PhotoPart] = None
+   parser: Optional[MultipartParser] = None
+   limit = max_bytes
+   if content_type == b"multipart/form-data" and options.get(b"boundary"):
+       part = _PhotoPart()
+       parser = MultipartParser(options[b"boundary"], part.callbacks())
+       limit = max_bytes + MULTIPART_OVERHEAD
+   elif not content_type.startswith(b"image/"):
+       raise HTTPException(400, "File must be an image")
+
+   content_length = request.headers.get("content-length")
+   if content_length and content_length.isdigit() and int(content_length) > limit:
+       photo_processor.rejected_too_large += 1
+       raise HTTPException(413, f"File too large (max {max_bytes} bytes)")
+
+   fd, path = await asyncio.to_thread(tempfile.mkstemp, prefix="photo-", suffix=".upload")
+   file = os.fdopen(fd, "wb")
+   hasher = hashlib.sha256()
+   received = size = 0
+   try:
+       async for chunk in request.stream():
+           received += len(chunk)
+           if parser is not None:
+               parser.write(chunk)
+               chunks, part.chunks = part.chunks, []
+               if part.found and not part.content_type.startswith(b"image/"):
+                   raise HTTPException(400, "File must be an image")
+           else:
+               chunks = [chunk] if chunk else []
+           size += sum(len(c) for c in chunks)
+           if size > max_bytes or received > limit:
+               photo_processor.rejected_too_large += 1
+               raise HTTPException(413, f"File too large (max {max_bytes} bytes)")
+           if chunks:
+               await asyncio.to_thread(_write, file, hasher, chunks)
+       if parser is not None:
+           parser.finalize()
+           if not part.found:
+               raise HTTPException(400, "Missing 'photo' file field")
+       if size == 0:
+           raise HTTPException(400, "Empty file")
+   except BaseException:
+       await asyncio.to_thread(file.close)
+       await asyncio.to_thread(_unlink, path)
+       raise
+   await asyncio.to_thread(file.close)
+
+   photo_processor.received += 1
+   photo_processor.bytes_received += size
+   return PhotoUpload(path=path, digest=hasher.hexdigest()[:32], size=size)
+
+# ================== TRAITEMENT ==================
+
+class PhotoProcessor:
+   """
+   Redimensionne les photos reçues dans un pool de processus dédié
+   - Usage: names = await photo_processor.render(upload)  ->  {taille: nom de fichier}
+   - Pool créé au premier usage, fermé par le lifespan (close)
+   """
+   def __init__(self, workers: int, max_queue: int, sizes: Sequence[int], max_pixels: int, directory: str):
+       self.workers = workers
+       self.max_queue = max_queue
+       self.sizes = tuple(sorted(set(sizes)))
+       self.max_pixels = max_pixels
+       self.directory = directory
+       self._executor: Optional[ProcessPoolExecutor] = None
+       self._lock = threading.Lock()
+       self.queued = 0
+       self.received = 0
+       self.bytes_received = 0
+       self.rejected_too_large = 0
+       self.rejected_busy = 0
+       self.processed = 0
+       self.deduplicated = 0
+       self.failed = 0
+       self.time_total = 0.0
+       self.time_max = 0.0
+
+   def names(self, digest: str) -> Dict[int, str]:
+       return {size: f"{digest}-{size}.jpg" for size in self.sizes}
+
+   @staticmethod
+   def url(name: str) -> str:
+       return f"{PHOTOS_URL}/{name}"
+
+   def _pool(self) -> ProcessPoolExecutor:
+       with self._lock:
+           if self._executor is None:
+               context = multiprocessing.get_context("forkserver")
+               context.set_forkserver_preload(["photo_worker"])
+               self._executor = ProcessPoolExecutor(max_workers=self.workers, mp_context=context)
+           return self._executor
+
+   async def render(self, upload: PhotoUpload) -> Dict[int, str]:
+       """
+       Fichiers de toutes les tailles pour cette photo (générés si absents)
+       - 400 image invalide, 503 file pleine ou Pillow indisponible
+       """
+       names = self.names(upload.digest)
+       exists = await asyncio.to_thread(lambda: all(os.path.exists(os.path.join(self.directory, n)) for n in names.values()))
+       if exists:
+           self.deduplicated += 1
+           return names
+
+       if self.max_queue and self.queued >= self.max_queue:
+           self.rejected_busy += 1
+           raise HTTPException(503, "Server busy, retry later", headers={"Retry-After": "1"})
+       self.queued += 1
+       start = time.perf_counter()
+       try:
+           await asyncio.to_thread(os.makedirs, self.directory, exist_ok=True)
+           future = self._pool().submit(render_photo, upload.path, upload.digest, self.sizes, self.directory, self.max_pixels)
+           names = await asyncio.wrap_future(future)
+       except ValueError as e:
+           self.failed += 1
+           raise HTTPException(400, str(e))
+       except ImportError:
+           self.failed += 1
+           raise HTTPException(503, "Image processing unavailable (Pillow not installed)")
+       except BrokenProcessPool:
+           self.failed += 1
+           self._reset()
+           raise HTTPException(503, "Image processing unavailable, retry later", headers={"Retry-After": "1"})
+       finally:
+           self.queued -= 1
+       elapsed = time.perf_counter() - start
+       self.processed += 1
+       self.time_total += elapsed
+       self.time_max = max(self.time_max, elapsed)
+       return names
+
+   def _reset(self):
+       """Abandonne un pool cassé (processus tué): recréé à la prochaine photo"""
+       with self._lock:
+           executor, self._executor = self._executor, None
+       if executor is not None:
+           executor.shutdown(wait=False, cancel_futures=True)
+
+   async def close(self):
+       """Arrêt de l'application: attend les traitements en cours"""
+       with self._lock:
+           executor, self._executor = self._executor, None
+       if executor is not None:
+           await asyncio.to_thread(executor.shutdown, True)
+
+   def stats(self) -> Dict:
+       return {
+           "workers": self.workers,
+           "sizes": list(self.sizes),
+           "queued": self.queued,
+           "received": self.received,
+           "bytes_received": self.bytes_received,
+           "rejected_too_large": self.rejected_too_large,
+           "rejected_busy": self.rejected_busy,
+           "processed": self.processed,
+           "deduplicated": self.deduplicated,
+           "failed": self.failed,
+           "time_total": round(self.time_total, 6),
+           "time_max": round(self.time_max, 6),
+           "time_avg": round(self.time_total / self.processed, 6) if self.processed else 0.0
+       }
+
+class PhotoStaticFiles(StaticFiles):
+   """Fichiers de static/photos; noms par empreinte servis avec un cache permanent"""
+   def file_response(self, full_path, stat_result, scope, status_code=200):
+       response = super().file_response(full_path, stat_result, scope, status_code)
+       if HASHED_NAME.match(os.path.basename(full_path)):
+           response.headers["Cache-Control"] = CACHE_IMMUTABLE
+       return response
+
+photo_processor = PhotoProcessor(
+   workers=settings.photo_workers,
+   max_queue=settings.photo_max_queue,
+   sizes=settings.photo_sizes,
+   max_pixels=settings.photo_max_pixels,
+   directory=PHOTOS_DIR
+)
@@ -3,38 +3,57 @@ Routes API pour l'application Game Store
 
 Architecture:
 - FastAPI pour le framework web avec validation Pydantic
-- SQLAlchemy ORM pour la base de données
+- SQLAlchemy ORM async (AsyncSession) pour la base de données
 - JWT pour authentification stateless
 - WebSocket pour chat temps réel
 - Middleware de sécurité pour validation/protection
 
 Endpoints principaux:
 - Authentification: /signup, /login, /logout
-- Jeux: /games/add, /purchase, /games/rate
-- Administration: /admin/ban, /admin/unban
+- Jeux: /games/add, /admin/games/import, /purchase, /cart/checkout, /games/rate
+- Administration: /admin/ban, /admin/unban, /admin/users/ban, /admin/users/unban,
+  /admin/games/{game_id}/retention
 - Reset password: /forgot, /validate-code, /reset-password
 - WebSocket: /ws/game/{game_id} pour chat temps réel
+- Supervision: /metrics (format Prometheus), /debug/* (admin only)
 """
-from fastapi import Request, Form, HTTPException, APIRouter, Depends, WebSocket, WebSocketDisconnect
-from fastapi.responses import RedirectResponse, JSONResponse
+from fastapi import Request, Form, HTTPException, APIRouter, BackgroundTasks, Depends, Query, WebSocket, WebSocketDisconnect
+from fastapi.responses import RedirectResponse, JSONResponse, PlainTextResponse
 from fastapi.templating import Jinja2Templates
 from fastapi.staticfiles import StaticFiles
-from sqlalchemy.orm import Session
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import AsyncSession
 from datetime import timedelta, timezone, datetime
-from fastapi import File, UploadFile
 import os
 import pathlib
 from pathlib import Path
-from pydantic import BaseModel
-from typing import Dict, List
+from pydantic import BaseModel, Field
+from typing import List, Optional
 import json
 import random
 
 from backend import (
    get_db, create_user, authenticate_user, 
-   create_game, ban_user, create_jwt, hash_password, unban_user
+   create_game, ban_user, create_jwt, hash_password, unban_user, record_rating, set_users_banned, UserFilter,
+   purchase_games,
+   get_catalog_game, catalog_cache, Principal, invalidate_principal, principal_cache, token_cache
+)
+from models import User, Game, Purchase, Rating, ChatRetention, engine, async_engine
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from archiver import archiver
+from config import settings
+from metrics import CONTENT_TYPE, Family, registry, render_metrics, stats_families
+from sqltrace import sql_statistics, mark_batched
+from catalog_import import detect_format, import_games, upload_chunks
+from photos import photo_processor, receive_photo
+from idempotency import idempotency_key, request_fingerprint, claim_idempotency_key, remember_response
+from database import pool_statistics
+from passwords import password_hasher
+from chat import manager, chat_writer, authenticate_websocket, handle_client_frame, publish_message, replay_since
+from ratelimit import (
+   login_ip_limiter, login_user_limiter, reset_ip_limiter, reset_email_limiter,
+   client_ip, check_attempts, enforce_attempts, limiter_statistics
 )
-from models import User, Game, Purchase, Rating, Message
 from middleware import (
    SecurityMiddleware, AuthMiddleware, ValidationMiddleware,
    get_validated_user, get_validated_admin
@@ -60,50 +79,38 @@ class ResetRequest(BaseModel):
    email: str
    new_password: str
 
-# ================== GESTIONNAIRE WEBSOCKET ==================
-class ConnectionManager:
-   """
-   Gestionnaire connexions WebSocket pour chat temps réel
-   - Connexions groupées par game_id
-   - Broadcast automatique aux connectés d'un même jeu
-   """
-   def __init__(self):
-       self.active_connections: Dict[int, List[WebSocket]] = {}
-
-   async def connect(self, websocket: WebSocket, game_id: int):
-       """Accepte et enregistre nouvelle connexion WebSocket"""
-       await websocket.accept()
-       if game_id not in self.active_connections:
-           self.active_connections[game_id] = []
-       self.active_connections[game_id].append(websocket)
-
-   def disconnect(self, websocket: WebSocket, game_id: int):
-       """Retire connexion et nettoie structures"""
-       if game_id in self.active_connections:
-           if websocket in self.active_connections[game_id]:
-               self.active_connections[game_id].remove(websocket)
-           if not self.active_connections[game_id]:
-               del self.active_connections[game_id]
-
-   async def broadcast_to_game(self, game_id: int, message: dict):
-       """Diffuse message à tous les connectés d'un jeu"""
-       if game_id not in self.active_connections:
-           return
-       
-       connections = self.active_connections[game_id].copy()
-       disconnected = []
-       
-       for connection in connections:
-           try:
-               await connection.send_text(json.dumps(message))
-           except Exception:
-               disconnected.append(connection)
-       
-       for conn in disconnected:
-           self.disconnect(conn, game_id)
+class CheckoutRequest(BaseModel):
+   """Modèle pour une commande de plusieurs jeux (panier)"""
+   game_ids: List[int] = Field(..., min_length=1, max_length=settings.cart_max_items)
+
+class RetentionRequest(BaseModel):
+   """Modèle pour la rétention du chat d'un jeu (None = défaut global)"""
+   keep_last: Optional[int] = Field(None, ge=1)
+   keep_days: Optional[int] = Field(None, ge=1)
+
+class UserFilterModel(BaseModel):
+   """Critères de sélection des utilisateurs (mêmes noms que les filtres de GET /admin/users)"""
+   username: Optional[str] = Field(None, max_length=30)  # préfixe, insensible à la casse
+   email: Optional[str] = Field(None, max_length=254)  # préfixe
+   banned: Optional[bool] = None
+   created_after: Optional[datetime] = None
+   created_before: Optional[datetime] = None
+   last_login_after: Optional[datetime] = None
+   last_login_before: Optional[datetime] = None
+
+   def to_filter(self) -> UserFilter:
+       return UserFilter(
+           username_prefix=self.username, email_prefix=self.email, banned=self.banned,
+           created_after=self.created_after, created_before=self.created_before,
+           last_login_after=self.last_login_after, last_login_before=self.last_login_before
+       )
+
+class BulkBanRequest(BaseModel):
+   """Modèle pour ban/unban en masse: liste d'ids ou filtre (exactement un des deux)"""
+   user_ids: Optional[List[int]] = Field(None, max_length=settings.admin_bulk_max_ids)
+   filter: Optional[UserFilterModel] = None
 
 # Configuration
-manager = ConnectionManager()
 router = APIRouter()
 templates_path = pathlib.Path(__file__).parent / "templates"
 templates = Jinja2Templates(directory=templates_path)
@@ -116,7 +123,7 @@ reset_codes = {}
 # ================== AUTHENTIFICATION ==================
 
 @router.post("/signup")
-async def register_user(request: Request, username: str = Form(...), email: str = Form(...), password: str = Form(...), db: Session = Depends(get_db)):
+async def register_user(request: Request, username: str = Form(...), email: str = Form(...), password: str = Form(...), db: AsyncSession = Depends(get_db)):
    """
    Inscription nouvel utilisateur
    - Validation stricte username/email/password
@@ -125,7 +132,7 @@ async def register_user(request: Request, username: str = Form(...), email: str
    """
    try:
        validated_data = ValidationMiddleware.validate_user_registration(username, email, password)
-       user = create_user(db, **validated_data)
+       user = await create_user(db, **validated_data)
        
        if not user:
            return templates.TemplateResponse("auth/signup.html", {"request": request, "error": "Username or email already exists"}, status_code=400)
@@ -136,15 +143,26 @@ async def register_user(request: Request, username: str = Form(...), email: str
        return templates.TemplateResponse("auth/signup.html", {"request": request, "error": e.detail}, status_code=e.status_code)
 
 @router.post("/login")
-async def login(request: Request, username: str = Form(...), password: str = Form(...), db: Session = Depends(get_db)):
+async def login(request: Request, username: str = Form(...), password: str = Form(...), db: AsyncSession = Depends(get_db)):
    """
    Connexion avec génération JWT
    - Vérifie credentials et statut non banni
    - Cookie httponly sécurisé 24h
    - Retour JSON avec flag admin
+   - Tentatives limitées par IP et par username avant tout accès DB / bcrypt
+   - Username invalide: même réponse 401 que des identifiants inconnus
    """
-   username = SecurityMiddleware.validate_username(username)
-   user = authenticate_user(db, username=username, password=password)
+   account = username.strip().lower()
+   retry_after = check_attempts((login_ip_limiter, client_ip(request)), (login_user_limiter, account))
+   if retry_after is not None:
+       return JSONResponse(status_code=429, headers={"Retry-After": str(int(retry_after) + 1)}, content={"success": False, "error": "Too many attempts, retry later"})
+   
+   try:
+       username = SecurityMiddleware.validate_username(username)
+   except HTTPException:
+       user = None
+   else:
+       user = await authenticate_user(db, username=username, password=password)
    
    if not user:
        return JSONResponse(status_code=401, content={"success": False, "error": "Invalid credentials"})
@@ -152,6 +170,7 @@ async def login(request: Request, username: str = Form(...), password: str = For
    if user.is_banned:
        return JSONResponse(status_code=403, content={"success": False, "error": "Account is banned"})
    
+   login_user_limiter.reset(account)
    token = create_jwt(user.user_id)
    response = JSONResponse({"success": True, "isAdmin": user.is_admin})
    response.set_cookie(key="token", value=token, httponly=True, samesite="Lax", secure=False, path="/", max_age=86400)
@@ -168,45 +187,34 @@ async def logout():
 # ================== PROFIL ==================
 
 @router.post("/profile/update")
-async def update_profile(photo: UploadFile = File(...), user: User = Depends(get_validated_user), db: Session = Depends(get_db)):
+async def update_profile(request: Request, user: Principal = Depends(get_validated_user), db: AsyncSession = Depends(get_db)):
    """
-   Upload photo de profil
-   - Type image uniquement, max 5MB
-   - Sauvegardé en user_id.jpg
-   - MAJ DB avec nouveau chemin
+   Upload photo de profil (voir photos.py)
+   - Champ multipart "photo" (ou corps image/* brut) reçu en flux, 413 au-delà de photo_max_bytes
+   - Carrés photo_sizes générés dans un pool de processus, noms par empreinte du contenu
+   - photo_url (plus grande taille) mis à jour en un UPDATE une fois les fichiers écrits
    """
+   upload = await receive_photo(request, settings.photo_max_bytes)
    try:
-       if not photo.content_type.startswith('image/'):
-           raise HTTPException(400, "File must be an image")
-       
-       if photo.size > 5 * 1024 * 1024:
-           raise HTTPException(400, "File too large (max 5MB)")
-
-       PHOTOS_DIR = os.path.join(BASE_DIR, "static", "photos")
-       os.makedirs(PHOTOS_DIR, exist_ok=True)
+       names = await photo_processor.render(upload)
+   finally:
+       await upload.discard()
 
-       filename = f"{user.user_id}.jpg"
-       filepath = os.path.join(PHOTOS_DIR, filename)
-
-       with open(filepath, "wb") as f:
-           contents = await photo.read()
-           f.write(contents)
-
-       user.photo_url = f"/static/photos/{filename}"
-       db.commit()
-       
-       return {"success": True, "photo_url": user.photo_url}
+   try:
+       photo_url = photo_processor.url(names[max(names)])
+       await db.execute(update(User).where(User.user_id == user.user_id).values(photo_url=photo_url))
+       await db.commit()
+       invalidate_principal(user.user_id)
+       return {"success": True, "photo_url": photo_url, "sizes": {str(size): photo_processor.url(name) for size, name in names.items()}}
 
-   except HTTPException:
-       raise
    except Exception:
-       db.rollback()
+       await db.rollback()
        raise HTTPException(500, "Upload failed")
 
 # ================== JEUX ==================
 
 @router.post("/games/add")
-async def add_new_game(request: Request, title: str = Form(...), price: float = Form(...), description: str = Form(...), publisher: str = Form(...), category: str = Form(...), platforms: str = Form(...), admin: User = Depends(get_validated_admin), db: Session = Depends(get_db)):
+async def add_new_game(request: Request, title: str = Form(...), price: float = Form(...), description: str = Form(...), publisher: str = Form(...), category: str = Form(...), platforms: str = Form(...), admin: Principal = Depends(get_validated_admin), db: AsyncSession = Depends(get_db)):
    """
    Ajout nouveau jeu (admin only)
    - Validation complète de tous les champs
@@ -214,105 +222,201 @@ async def add_new_game(request: Request, title: str = Form(...), price: float =
    """
    try:
        validated_data = ValidationMiddleware.validate_game_data(title, price, description, publisher, category, platforms)
-       game = create_game(db, **validated_data)
+       game = await create_game(db, **validated_data)
        if not game:
-           raise HTTPException(400, "Could not create game")
+           raise HTTPException(400, "A game with this title and publisher already exists")
 
        return RedirectResponse(url="/games", status_code=303)
        
    except HTTPException:
        raise
 
+@router.post("/admin/games/import")
+async def import_catalog(request: Request, fmt: Optional[str] = Query(None, alias="format"), admin: Principal = Depends(get_validated_admin), db: AsyncSession = Depends(get_db)):
+   """
+   Import en masse du catalogue (admin only), voir catalog_import.py
+   - Corps brut (Content-Type text/csv ou application/x-ndjson) lu en flux,
+     ou formulaire multipart avec un champ "file" (.csv / .ndjson)
+   - ?format=csv|ndjson force le format
+   - Upsert sur (title, publisher); rapport avec les erreurs ligne à ligne
+   """
+   content_type = request.headers.get("content-type", "")
+   content_length = request.headers.get("content-length")
+   if content_length and content_length.isdigit() and int(content_length) > settings.import_max_bytes:
+       raise HTTPException(413, f"Import too large (max {settings.import_max_bytes} bytes)")
+   mark_batched()
+
+   if content_type.startswith("multipart/form-data"):
+       form = await request.form()
+       upload = form.get("file")
+       if upload is None or isinstance(upload, str):
+           raise HTTPException(400, "Missing file field")
+       try:
+           report = await import_games(db, upload_chunks(upload), fmt or detect_format(upload.content_type or "", upload.filename))
+       finally:
+           await form.close()
+   else:
+       report = await import_games(db, request.stream(), fmt or detect_format(content_type))
+   return report.as_dict()
+
 @router.post("/purchase/{game_id}")
-async def purchase_game(game_id: int, db: Session = Depends(get_db), current_user: User = Depends(get_validated_user)):
+async def purchase_game(game_id: int, key: Optional[str] = Depends(idempotency_key), db: AsyncSession = Depends(get_db), current_user: Principal = Depends(get_validated_user)):
    """
    Achat d'un jeu
-   - Vérifie existence jeu et non possession
-   - Stocke prix historique dans Purchase
+   - Une instruction atomique (backend.purchase_games): prix historique figé,
+     double achat impossible même sous requêtes concurrentes
+   - Idempotency-Key optionnelle: une nouvelle tentative rejoue la réponse d'origine
+   - Un achat ne modifie aucune donnée du cache catalogue
    """
-   game = db.query(Game).filter(Game.game_id == game_id).first()
-   if not game:
+   if key:
+       replay = await claim_idempotency_key(db, current_user.user_id, key, request_fingerprint("purchase", game_id))
+       if replay is not None:
+           return replay
+
+   result = await purchase_games(db, current_user.user_id, [game_id])
+   if result.not_found:
        raise HTTPException(404, "Game not found")
-   
-   existing_purchase = db.query(Purchase).filter(Purchase.user_id == current_user.user_id, Purchase.game_id == game_id).first()
-   
-   if existing_purchase:
+   if not result.purchased:
        raise HTTPException(400, "Game already purchased")
 
-   try:
-       new_purchase = Purchase(user_id=current_user.user_id, game_id=game_id, price=game.price, purchase_date=datetime.now(timezone.utc))
-       db.add(new_purchase)
-       db.commit()
-       return {"success": True, "message": "Purchase successful"}
-       
-   except Exception:
-       db.rollback()
-       raise HTTPException(500, "Purchase failed")
+   body = {"success": True, "message": "Purchase successful", "price": result.total}
+   if key:
+       await remember_response(db, current_user.user_id, key, body)
+   await db.commit()
+   return body
+
+@router.post("/cart/checkout")
+async def checkout_cart(cart: CheckoutRequest, key: Optional[str] = Depends(idempotency_key), db: AsyncSession = Depends(get_db), current_user: Principal = Depends(get_validated_user)):
+   """
+   Achat de plusieurs jeux en une transaction (panier)
+   - Prix de tous les jeux lus et figés par la même instruction que l'insertion
+   - Jeu inconnu: 404, rien n'est acheté; jeux déjà possédés ignorés et listés
+   - Idempotency-Key optionnelle, comme /purchase/{game_id}
+   """
+   game_ids = sorted(set(cart.game_ids))
+   if key:
+       replay = await claim_idempotency_key(db, current_user.user_id, key, request_fingerprint("checkout", game_ids))
+       if replay is not None:
+           return replay
+
+   result = await purchase_games(db, current_user.user_id, game_ids)
+   if result.not_found:
+       raise HTTPException(404, f"Games not found: {', '.join(map(str, result.not_found))}")
+   if not result.purchased:
+       raise HTTPException(400, "Games already purchased")
+
+   body = {
+       "success": True,
+       "purchased": [{"game_id": game_id, "price": price} for game_id, price in result.purchased],
+       "already_owned": result.already_owned,
+       "total": result.total
+   }
+   if key:
+       await remember_response(db, current_user.user_id, key, body)
+   await db.commit()
+   return body
 
 @router.post("/games/rate")
-async def rate_game(evaluation: RatingRequest, db: Session = Depends(get_db), user: User = Depends(get_validated_user)):
+async def rate_game(evaluation: RatingRequest, db: AsyncSession = Depends(get_db), user: Principal = Depends(get_validated_user)):
    """
    Noter un jeu (propriétaires uniquement)
    - Note 1-5, vérifie possession
-   - Recalcule moyenne du jeu automatiquement
+   - Agrégats du jeu mis à jour atomiquement (voir backend.record_rating)
    """
    rating = SecurityMiddleware.validate_rating(evaluation.rating)
    
-   game = db.get(Game, evaluation.game_id)
-   if not game:
+   if not await get_catalog_game(db, evaluation.game_id):
        raise HTTPException(404, "Game not found")
 
-   purchase_exists = db.query(db.query(Purchase).filter(Purchase.user_id == user.user_id, Purchase.game_id == evaluation.game_id).exists()).scalar()
+   purchase_exists = await db.scalar(select(select(Purchase).where(Purchase.user_id == user.user_id, Purchase.game_id == evaluation.game_id).exists()))
    
    if not purchase_exists:
        raise HTTPException(403, "Game ownership required")
 
-   existing_rating = db.query(Rating).filter(Rating.user_id == user.user_id, Rating.game_id == evaluation.game_id).first()
-
-   if existing_rating:
-       existing_rating.value = rating
-   else:
-       new_rating = Rating(user_id=user.user_id, game_id=evaluation.game_id, value=rating)
-       db.add(new_rating)
-       db.flush()
-
-   # Recalcul moyenne
-   ratings = [r.value for r in game.ratings]
-   game.rating_avg = sum(ratings) / len(ratings)
-
-   db.commit()
+   new_average, existing_rating = await record_rating(db, user.user_id, evaluation.game_id, rating)
    
-   return {"success": True, "message": f"Rating {'updated' if existing_rating else 'added'} successfully", "new_average": game.rating_avg}
+   return {"success": True, "message": f"Rating {'updated' if existing_rating else 'added'} successfully", "new_average": new_average}
 
 # ================== ADMINISTRATION ==================
 
 @router.post("/admin/ban/{user_id}")
-async def ban_user_route(user_id: int, admin: User = Depends(get_validated_admin), db: Session = Depends(get_db)):
+async def ban_user_route(user_id: int, admin: Principal = Depends(get_validated_admin), db: AsyncSession = Depends(get_db)):
    """Bannir utilisateur (admin only)"""
-   result = ban_user(db, admin_id=admin.user_id, user_id=user_id)
+   result = await ban_user(db, user_id)
    if not result:
        raise HTTPException(403, "Ban failed")
+   await manager.disconnect_users([user_id])
    return {"success": True, "message": "User banned successfully"}
 
 @router.post("/admin/unban/{user_id}")
-async def unban_user_route(user_id: int, admin: User = Depends(get_validated_admin), db: Session = Depends(get_db)):
+async def unban_user_route(user_id: int, admin: Principal = Depends(get_validated_admin), db: AsyncSession = Depends(get_db)):
    """Débannir utilisateur (admin only)"""
-   result = unban_user(db, admin_id=admin.user_id, user_id=user_id)
+   result = await unban_user(db, user_id)
    if not result:
        raise HTTPException(403, "Unban failed")
    return {"success": True, "message": "User unbanned successfully"}
 
+async def apply_bulk_ban(request: BulkBanRequest, banned: bool, db: AsyncSession) -> dict:
+   """
+   Ban/unban en masse: un seul UPDATE ensembliste (backend.set_users_banned)
+   - Ids modifiés détaillés jusqu'à admin_bulk_max_ids (au-delà: comptés)
+   - Ban: sockets de chat des comptes touchés fermés sur tous les workers
+   """
+   if (request.user_ids is None) == (request.filter is None):
+       raise HTTPException(400, "Provide either 'user_ids' or 'filter'")
+   user_filter = request.filter.to_filter() if request.filter is not None else None
+   if user_filter is not None and user_filter.is_empty():
+       raise HTTPException(400, "Empty filter would match every user")
+
+   changed = await set_users_banned(db, banned, user_ids=request.user_ids, user_filter=user_filter)
+   if banned and changed:
+       await manager.disconnect_users(changed)
+   limit = settings.admin_bulk_max_ids
+   return {"success": True, "affected": len(changed), "user_ids": changed[:limit], "truncated": len(changed) > limit}
+
+@router.post("/admin/users/ban")
+async def bulk_ban_route(request: BulkBanRequest, admin: Principal = Depends(get_validated_admin), db: AsyncSession = Depends(get_db)):
+   """Bannir en masse par ids ou par filtre (admin only, admins jamais bannis)"""
+   return await apply_bulk_ban(request, True, db)
+
+@router.post("/admin/users/unban")
+async def bulk_unban_route(request: BulkBanRequest, admin: Principal = Depends(get_validated_admin), db: AsyncSession = Depends(get_db)):
+   """Débannir en masse par ids ou par filtre (admin only)"""
+   return await apply_bulk_ban(request, False, db)
+
+@router.post("/admin/games/{game_id}/retention")
+async def set_chat_retention(game_id: int, policy: RetentionRequest, background_tasks: BackgroundTasks, admin: Principal = Depends(get_validated_admin), db: AsyncSession = Depends(get_db)):
+   """
+   Politique de rétention du chat d'un jeu (admin only): active l'archivage de ce jeu
+   - keep_last / keep_days à null: retour au défaut global (sans limite par défaut)
+   - Appliquée aussitôt en tâche de fond, puis à chaque passage périodique
+     si chat_archive_interval > 0
+   """
+   if not await get_catalog_game(db, game_id):
+       raise HTTPException(404, "Game not found")
+
+   await db.execute(
+       sqlite_insert(ChatRetention)
+       .values(game_id=game_id, keep_last=policy.keep_last, keep_days=policy.keep_days)
+       .on_conflict_do_update(index_elements=["game_id"], set_={"keep_last": policy.keep_last, "keep_days": policy.keep_days})
+   )
+   await db.commit()
+   background_tasks.add_task(archiver.run_game, game_id)
+   return {"success": True, "game_id": game_id, "keep_last": policy.keep_last, "keep_days": policy.keep_days, "periodic": archiver.interval > 0}
+
 # ================== RESET PASSWORD ==================
 
 @router.post("/forgot")
-async def forgot_password(data: ForgotRequest, db: Session = Depends(get_db)):
+async def forgot_password(request: Request, data: ForgotRequest, db: AsyncSession = Depends(get_db)):
    """
    Demande réinitialisation mot de passe
    - Génère code 6 chiffres valide 15min
    - Affiche en console (dev mode)
+   - Demandes limitées par IP et par email
    """
    email = SecurityMiddleware.validate_email(data.email)
-   user = db.query(User).filter(User.email == email).first()
+   enforce_attempts((reset_ip_limiter, client_ip(request)), (reset_email_limiter, email))
+   user = await db.scalar(select(User).where(User.email == email))
    
    if not user:
        return JSONResponse({"message": "If email exists, code has been sent"})
@@ -325,9 +429,10 @@ async def forgot_password(data: ForgotRequest, db: Session = Depends(get_db)):
    return JSONResponse({"message": "If email exists, code has been sent"})
 
 @router.post("/validate-code")
-async def validate_reset_code(data: CodeValidation):
-   """Validation code réinitialisation"""
+async def validate_reset_code(request: Request, data: CodeValidation):
+   """Validation code réinitialisation (essais limités par IP et par email)"""
    email = SecurityMiddleware.validate_email(data.email)
+   enforce_attempts((reset_ip_limiter, client_ip(request)), (reset_email_limiter, email))
    
    if email not in reset_codes:
        raise HTTPException(400, "Invalid or expired code")
@@ -341,7 +446,7 @@ async def validate_reset_code(data: CodeValidation):
    return {"message": "Code valid"}
 
 @router.post("/reset-password")
-async def reset_password(data: ResetRequest, db: Session = Depends(get_db)):
+async def reset_password(data: ResetRequest, db: AsyncSession = Depends(get_db)):
    """Réinitialisation effective mot de passe"""
    email = SecurityMiddleware.validate_email(data.email)
    password = SecurityMiddleware.validate_password(data.new_password)
@@ -349,12 +454,13 @@ async def reset_password(data: ResetRequest, db: Session = Depends(get_db)):
    if email not in reset_codes:
        raise HTTPException(400, "Invalid reset session")
    
-   user = db.query(User).filter(User.email == email).first()
+   user = await db.scalar(select(User).where(User.email == email))
    if not user:
        raise HTTPException(404, "User not found")
 
-   user.hashed_password = hash_password(password)
-   db.commit()
+   user.hashed_password = await hash_password(password)
+   await db.commit()
+   invalidate_principal(user.user_id)
    
    del reset_codes[email]
    return {"message": "Password reset successful"}
@@ -362,25 +468,34 @@ async def reset_password(data: ResetRequest, db: Session = Depends(get_db)):
 # ================== WEBSOCKET & MESSAGES ==================
 
 @router.websocket("/ws/game/{game_id}")
-async def websocket_endpoint(websocket: WebSocket, game_id: int):
+async def websocket_endpoint(websocket: WebSocket, game_id: int, since: Optional[int] = None):
    """
    WebSocket pour chat temps réel par jeu
+   - Authentification unique au handshake (cookie JWT, ban, achat du jeu)
    - Heartbeat ping/pong
-   - Broadcast messages à tous les connectés
+   - Trames send_message (propriétaires uniquement), ack avec l'id persisté
+   - Broadcast messages à tous les connectés (anonymes en lecture seule)
+   - since=<message_id>: rejeu des messages manqués depuis cet id (reconnexion)
    """
-   await manager.connect(websocket, game_id)
+   principal, can_post = await authenticate_websocket(websocket, game_id)
+   connection = await manager.connect(websocket, game_id, principal, can_post)
+   connection.send(json.dumps({"type": "hello", "authenticated": principal is not None, "can_post": can_post}))
    try:
+       if since is not None:
+           await replay_since(connection, since)
        while True:
            data = await websocket.receive_text()
            if data == "ping":
-               await websocket.send_text("pong")
+               connection.send("pong")
+           else:
+               await handle_client_frame(connection, data)
    except WebSocketDisconnect:
        manager.disconnect(websocket, game_id)
    except Exception:
        manager.disconnect(websocket, game_id)
 
 @router.post("/games/{game_id}/messages")
-async def post_message_with_websocket(game_id: int, content: str = Form(...), db: Session = Depends(get_db), current_user: User = Depends(get_validated_user)):
+async def post_message_with_websocket(game_id: int, content: str = Form(...), db: AsyncSession = Depends(get_db), current_user: Principal = Depends(get_validated_user)):
    """
    Poster message dans chat jeu
    - Validation contenu (max 500 chars, anti-XSS)
@@ -390,31 +505,87 @@ async def post_message_with_websocket(game_id: int, content: str = Form(...), db
    try:
        validated_content = ValidationMiddleware.validate_message_content(content)
        
-       purchase = db.query(Purchase).filter(Purchase.user_id == current_user.user_id, Purchase.game_id == game_id).first()
+       purchase = await db.scalar(select(Purchase.purchase_id).where(Purchase.user_id == current_user.user_id, Purchase.game_id == game_id).limit(1))
        
        if not purchase:
            raise HTTPException(403, "Game ownership required to post messages")
        
-       new_message = Message(user_id=current_user.user_id, game_id=game_id, content=validated_content, created_at=datetime.now(timezone.utc))
-       
-       db.add(new_message)
-       db.commit()
-       db.refresh(new_message)
-       
-       response_data = {"status": "success", "message": new_message.content, "username": current_user.username, "created_at": new_message.created_at.isoformat()}
-       
-       websocket_message = {"type": "new_message", "data": {"content": new_message.content, "user": {"username": current_user.username}, "created_at": new_message.created_at.isoformat()}}
+       await db.rollback()  # libère la connexion avant l'écriture
+       payload = await publish_message(current_user, game_id, validated_content)
        
-       await manager.broadcast_to_game(game_id, websocket_message)
-       return response_data
+       return {"status": "success", "id": payload["id"], "message": payload["content"], "username": current_user.username, "created_at": payload["created_at"]}
        
    except HTTPException:
        raise
    except Exception as e:
-       db.rollback()
+       await db.rollback()
        raise HTTPException(500, f"Message failed to send: {str(e)}")
 
 @router.get("/debug/websockets")
-async def debug_websockets(admin: User = Depends(get_validated_admin)):
-   """Debug: voir connexions WebSocket actives (admin only)"""
-   return {"active_connections": {game_id: len(connections) for game_id, connections in manager.active_connections.items()}}
\ No newline at end of file
+async def debug_websockets(admin: Principal = Depends(get_validated_admin)):
+   """Debug: voir connexions WebSocket actives et compteurs de diffusion (admin only)"""
+   stats = manager.stats()
+   return {"active_connections": stats.pop("games"), **stats}
+
+@router.get("/debug/cache")
+async def debug_cache(admin: Principal = Depends(get_validated_admin)):
+   """Debug: compteurs des caches catalogue et authentification (admin only)"""
+   return {cache.name: cache.stats() for cache in (catalog_cache, principal_cache, token_cache)}
+
+@router.get("/debug/db-pool")
+async def debug_db_pool(admin: Principal = Depends(get_validated_admin)):
+   """Debug: statistiques des pools de connexions SQLite (admin only)"""
+   return pool_statistics(engine, async_engine)
+
+@router.get("/debug/password-hasher")
+async def debug_password_hasher(admin: Principal = Depends(get_validated_admin)):
+   """Debug: file d'attente et latences bcrypt (admin only)"""
+   return password_hasher.stats()
+
+@router.get("/debug/ratelimit")
+async def debug_ratelimit(admin: Principal = Depends(get_validated_admin)):
+   """Debug: tentatives autorisées / refusées par limiteur (admin only)"""
+   return limiter_statistics()
+
+@router.get("/debug/chat-writer")
+async def debug_chat_writer(admin: Principal = Depends(get_validated_admin)):
+   """Debug: taille des lots et latence de commit du chat (admin only)"""
+   return chat_writer.stats()
+
+@router.get("/debug/archiver")
+async def debug_archiver(admin: Principal = Depends(get_validated_admin)):
+   """Debug: passages et volumes de l'archiveur du chat (admin only)"""
+   return archiver.stats()
+
+@router.get("/debug/sql")
+async def debug_sql(admin: Principal = Depends(get_validated_admin)):
+   """Debug: derniers N+1 suspects et requêtes lentes de ce worker (admin only)"""
+   return sql_statistics()
+
+# ================== MÉTRIQUES ==================
+
+@registry.register_collector
+def collect_runtime_stats():
+   """Statistiques existantes (mêmes sources que /debug/*) lues au moment du scrape"""
+   chat_stats = manager.stats()
+   websockets = Family("gamestore_websocket_connections", "gauge", "Sockets de chat ouverts par jeu")
+   for game_id, count in chat_stats.pop("games").items():
+       websockets.add({"game_id": str(game_id)}, count)
+   pubsub_stats = chat_stats.pop("pubsub")
+   return [
+       websockets,
+       *stats_families("gamestore_chat", "Chat WebSocket", {"": chat_stats}, None),
+       *stats_families("gamestore_pubsub", "Pub/sub du chat", {pubsub_stats["backend"]: pubsub_stats}, "backend"),
+       *stats_families("gamestore_chat_writer", "Écriture groupée du chat", {"": chat_writer.stats()}, None),
+       *stats_families("gamestore_chat_archiver", "Archivage du chat", {"": archiver.stats()}, None),
+       *stats_families("gamestore_db_pool", "Pool de connexions", pool_statistics(engine, async_engine), "pool"),
+       *stats_families("gamestore_cache", "Cache", {c.name: c.stats() for c in (catalog_cache, principal_cache, token_cache)}, "cache"),
+       *stats_families("gamestore_password_hasher", "Hachage bcrypt", {"": password_hasher.stats()}, None),
+       *stats_families("gamestore_photos", "Photos de profil", {"": photo_processor.stats()}, None),
+       *stats_families("gamestore_ratelimit", "Limitation des tentatives", limiter_statistics(), "limiter"),
+   ]
+
+@router.get("/metrics")
+async def metrics_endpoint(admin: Principal = Depends(get_validated_admin)):
+   """Métriques du worker courant au format texte Prometheus (admin only)"""
+   return PlainTextResponse(render_metrics(), media_type=CONTENT_TYPE)
\ No newline at end of file
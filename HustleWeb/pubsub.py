@@ -0,0 +1,272 @@
+"""
+Pub/sub du chat entre workers uvicorn
+
+Backends (settings.pubsub_backend):
+- "memory": diffusion dans le processus courant (un seul worker)
+- "unix": broker local sur socket Unix, sans service externe; tous les workers
+  d'un même hôte reçoivent les messages publiés par n'importe lequel d'entre eux
+
+Broker "unix":
+- Élection par verrou fcntl sur <socket>.lock: le worker qui l'obtient héberge
+  le broker dans sa boucle asyncio, les autres sont simples clients
+- Chaque worker (broker compris) est client du broker: ordre de diffusion
+  identique pour tous
+- Perte du broker (worker arrêté): les clients se reconnectent et l'un d'eux
+  reprend le verrou et le socket
+- Protocole ligne à ligne: "<game_id> <trame JSON>\\n" (json.dumps n'émet pas
+  de saut de ligne brut)
+- Client broker trop lent (tampon d'écriture > pubsub_max_buffer): déconnecté
+
+Pendant une coupure du broker, les publications sont livrées localement
+uniquement (compteur local_fallbacks): complete est faux et le callback
+on_gap est appelé à la coupure puis à la reconnexion (trames des autres
+workers manquées entre les deux).
+"""
+import abc
+import asyncio
+import fcntl
+import os
+from typing import Awaitable, Callable, Dict, Optional, Set
+from config import settings
+
+Handler = Callable[[int, str], Awaitable[None]]
+GapHandler = Callable[[], None]
+
+class PubSub(abc.ABC):
+   """Interface: publish() diffuse, le handler reçoit (game_id, trame) dans chaque worker"""
+   name = "base"
+
+   def __init__(self):
+       self.handler: Optional[Handler] = None
+       self.on_gap: Optional[GapHandler] = None
+       self.published = 0
+       self.received = 0
+
+   @property
+   def complete(self) -> bool:
+       """Vrai si ce worker reçoit les trames de tous les workers"""
+       return True
+
+   async def start(self, handler: Handler, on_gap: Optional[GapHandler] = None):
+       self.handler = handler
+       self.on_gap = on_gap
+
+   def _notify_gap(self):
+       if self.on_gap is not None:
+           self.on_gap()
+
+   @abc.abstractmethod
+   async def publish(self, game_id: int, frame: str):
+       """Diffuse une trame à tous les workers (y compris celui-ci)"""
+
+   async def close(self):
+       pass
+
+   async def _deliver(self, game_id: int, frame: str):
+       self.received += 1
+       if self.handler is not None:
+           await self.handler(game_id, frame)
+
+   def stats(self) -> Dict:
+       return {"backend": self.name, "published": self.published, "received": self.received}
+
+class InProcessPubSub(PubSub):
+   """Diffusion directe dans le processus (comportement mono-worker)"""
+   name = "memory"
+
+   async def publish(self, game_id: int, frame: str):
+       self.published += 1
+       await self._deliver(game_id, frame)
+
+# ================== BROKER SOCKET UNIX ==================
+
+class _Broker:
+   """Serveur de diffusion hébergé par le worker élu"""
+   def __init__(self, path: str, max_buffer: int):
+       self.path = path
+       self.max_buffer = max_buffer
+       self.clients: Set[asyncio.StreamWriter] = set()
+       self._handlers: Set[asyncio.Task] = set()
+       self.server: Optional[asyncio.AbstractServer] = None
+       self.dropped_clients = 0
+
+   async def start(self):
+       if os.path.exists(self.path):
+           os.unlink(self.path)  # socket orphelin d'un broker arrêté (verrou détenu)
+       self.server = await asyncio.start_unix_server(self._serve, path=self.path)
+
+   async def _serve(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+       self._handlers.add(asyncio.current_task())
+       self.clients.add(writer)
+       try:
+           while True:
+               line = await reader.readline()
+               if not line:
+                   break
+               # Écriture non bloquante vers chaque worker, sans attendre les plus lents
+               for client in list(self.clients):
+                   if client.transport.get_write_buffer_size() > self.max_buffer:
+                       self._drop(client)
+                       continue
+                   client.write(line)
+       except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+           pass  # ValueError: ligne au-delà de la limite du StreamReader
+       except asyncio.CancelledError:
+           pass  # arrêt du broker: fin normale du handler de connexion
+       finally:
+           self._drop(writer)
+           self._handlers.discard(asyncio.current_task())
+
+   def _drop(self, writer: asyncio.StreamWriter):
+       if writer in self.clients:
+           self.clients.discard(writer)
+           self.dropped_clients += 1
+           writer.close()
+
+   async def close(self):
+       if self.server is not None:
+           self.server.close()
+           for writer in list(self.clients):
+               writer.close()
+           self.clients.clear()
+           for task in list(self._handlers):
+               task.cancel()
+           await asyncio.gather(*self._handlers, return_exceptions=True)
+           await self.server.wait_closed()
+           self.server = None
+       if os.path.exists(self.path):
+           os.unlink(self.path)
+
+class UnixSocketPubSub(PubSub):
+   """
+   Pub/sub multi-processus via un broker sur socket Unix
+   - Usage: même configuration dans tous les workers, aucun service à lancer
+   """
+   name = "unix"
+
+   def __init__(self, path: str, max_buffer: int = 4 * 1024 * 1024):
+       super().__init__()
+       self.path = path
+       self.max_buffer = max_buffer
+       self._lock_fd: Optional[int] = None
+       self._broker: Optional[_Broker] = None
+       self._writer: Optional[asyncio.StreamWriter] = None
+       self._connected = asyncio.Event()
+       self._task: Optional[asyncio.Task] = None
+       self.reconnects = 0
+       self.local_fallbacks = 0
+
+   @property
+   def complete(self) -> bool:
+       return self._connected.is_set()
+
+   async def start(self, handler: Handler, on_gap: Optional[GapHandler] = None):
+       await super().start(handler, on_gap)
+       self._task = asyncio.create_task(self._run())
+       try:
+           await asyncio.wait_for(self._connected.wait(), timeout=5.0)
+       except asyncio.TimeoutError:
+           pass  # démarrage non bloquant: repli local en attendant le broker
+
+   async def _try_become_broker(self):
+       """Prend le verrou d'élection et démarre le broker si libre"""
+       if self._broker is not None:
+           return
+       fd = os.open(self.path + ".lock", os.O_RDWR | os.O_CREAT, 0o600)
+       try:
+           fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+       except BlockingIOError:
+           os.close(fd)
+           return
+       broker = _Broker(self.path, self.max_buffer)
+       try:
+           await broker.start()
+       except OSError:
+           fcntl.flock(fd, fcntl.LOCK_UN)
+           os.close(fd)
+           raise
+       self._lock_fd = fd
+       self._broker = broker
+
+   async def _run(self):
+       """Connexion au broker, lecture des diffusions, reconnexion avec backoff"""
+       delay = 0.05
+       while True:
+           try:
+               await self._try_become_broker()
+               reader, writer = await asyncio.open_unix_connection(self.path)
+           except OSError:
+               await asyncio.sleep(delay)
+               delay = min(delay * 2, 2.0)
+               continue
+
+           self._writer = writer
+           self._connected.set()
+           if self.reconnects:
+               self._notify_gap()  # livraisons locales seulement pendant la coupure
+           delay = 0.05
+           try:
+               while True:
+                   line = await reader.readline()
+                   if not line:
+                       break
+                   game_id, _, frame = line.decode("utf-8").rstrip("\n").partition(" ")
+                   try:
+                       await self._deliver(int(game_id), frame)
+                   except Exception:
+                       pass  # une trame invalide ne coupe pas l'abonnement
+           except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+               pass
+           finally:
+               self._connected.clear()
+               self._writer = None
+               writer.close()
+               self._notify_gap()
+           self.reconnects += 1
+
+   async def publish(self, game_id: int, frame: str):
+       self.published += 1
+       writer = self._writer
+       if writer is None or writer.is_closing():
+           self.local_fallbacks += 1
+           await self._deliver(game_id, frame)
+           return
+       writer.write(f"{int(game_id)} {frame}\n".encode("utf-8"))
+       try:
+           await writer.drain()
+       except ConnectionError:
+           pass
+
+   async def close(self):
+       if self._task is not None:
+           self._task.cancel()
+           try:
+               await self._task
+           except asyncio.CancelledError:
+               pass
+           self._task = None
+       if self._broker is not None:
+           await self._broker.close()
+           self._broker = None
+       if self._lock_fd is not None:
+           fcntl.flock(self._lock_fd, fcntl.LOCK_UN)
+           os.close(self._lock_fd)
+           self._lock_fd = None
+
+   def stats(self) -> Dict:
+       stats = super().stats()
+       stats.update({
+           "socket": self.path,
+           "connected": self._connected.is_set(),
+           "is_broker": self._broker is not None,
+           "broker_clients": len(self._broker.clients) if self._broker else None,
+           "reconnects": self.reconnects,
+           "local_fallbacks": self.local_fallbacks
+       })
+       return stats
+
+def create_pubsub() -> PubSub:
+   """Backend pub/sub selon la configuration"""
+   if settings.pubsub_backend == "unix":
+       return UnixSocketPubSub(settings.pubsub_socket_path, settings.pubsub_max_buffer)
+   return InProcessPubSub()
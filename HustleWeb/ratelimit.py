@@ -0,0 +1,162 @@
+"""
+Limitation des tentatives (login, reset password) en mémoire
+
+Architecture:
+- Token bucket par clé ("ip:1.2.3.4", "user:alice"): capacité = rafale autorisée,
+  recharge continue sur la fenêtre (attempts / window secondes)
+- Verrouillage progressif: après lockout_after refus consécutifs la clé est
+  bloquée lockout_base secondes, durée doublée à chaque récidive (plafond lockout_max)
+- Vérification AVANT toute requête DB ou calcul bcrypt: un refus ne coûte rien
+- Mémoire bornée: LRU limité à max_keys + balayage périodique des clés inactives
+
+Limites:
+- Par processus: chaque worker uvicorn a ses propres compteurs
+- IP = request.client.host (pas de confiance aux en-têtes X-Forwarded-For)
+"""
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, Optional
+from fastapi import HTTPException, Request
+from config import settings
+
+@dataclass
+class _Bucket:
+   """État d'une clé: jetons restants, refus consécutifs, verrouillage"""
+   tokens: float
+   updated: float
+   strikes: int = 0
+   lockouts: int = 0
+   locked_until: float = 0.0
+
+class RateLimiter:
+   """
+   Token bucket par clé avec verrouillage progressif
+   - Usage: retry_after = limiter.hit(key); None = tentative autorisée
+   """
+   def __init__(self, name: str, attempts: int, window: float, lockout_after: int = 3, lockout_base: float = 60.0, lockout_max: float = 3600.0, max_keys: int = 100000):
+       self.name = name
+       self.capacity = float(attempts)
+       self.refill_rate = attempts / window  # jetons par seconde
+       self.lockout_after = lockout_after
+       self.lockout_base = lockout_base
+       self.lockout_max = lockout_max
+       self.max_keys = max_keys
+       self.idle_ttl = max(window, lockout_max)  # au-delà, une clé est revenue à l'état neuf
+       self._buckets: "OrderedDict[str, _Bucket]" = OrderedDict()
+       self._next_sweep = time.monotonic() + self.idle_ttl
+       self.allowed = 0
+       self.rejected = 0
+       self.lockouts = 0
+       self.evictions = 0
+
+   def hit(self, key: str) -> Optional[float]:
+       """
+       Consomme un jeton pour la clé
+       - Retourne None si autorisé, sinon le délai (secondes) avant nouvel essai
+       """
+       now = time.monotonic()
+       self._maybe_sweep(now)
+
+       bucket = self._buckets.get(key)
+       if bucket is None:
+           bucket = _Bucket(tokens=self.capacity, updated=now)
+           self._buckets[key] = bucket
+           while len(self._buckets) > self.max_keys:
+               self._buckets.popitem(last=False)
+               self.evictions += 1
+       else:
+           self._buckets.move_to_end(key)
+
+       if bucket.locked_until > now:
+           self.rejected += 1
+           return bucket.locked_until - now
+
+       bucket.tokens = min(self.capacity, bucket.tokens + (now - bucket.updated) * self.refill_rate)
+       bucket.updated = now
+       if bucket.tokens >= 1.0:
+           bucket.tokens -= 1.0
+           bucket.strikes = 0
+           self.allowed += 1
+           return None
+
+       # Refus: escalade en verrouillage après plusieurs refus consécutifs
+       self.rejected += 1
+       bucket.strikes += 1
+       if bucket.strikes >= self.lockout_after:
+           duration = min(self.lockout_max, self.lockout_base * (2 ** bucket.lockouts))
+           bucket.locked_until = now + duration
+           bucket.lockouts += 1
+           bucket.strikes = 0
+           self.lockouts += 1
+           return duration
+       return (1.0 - bucket.tokens) / self.refill_rate
+
+   def reset(self, key: str):
+       """Oublie une clé (ex: connexion réussie pour ce username)"""
+       self._buckets.pop(key, None)
+
+   def _maybe_sweep(self, now: float):
+       """Retire les clés inactives depuis idle_ttl (appelé au plus une fois par idle_ttl)"""
+       if now < self._next_sweep:
+           return
+       self._next_sweep = now + self.idle_ttl
+       # Ordre LRU: les plus anciennes en tête, arrêt à la première clé récente
+       while self._buckets:
+           key, bucket = next(iter(self._buckets.items()))
+           if now - bucket.updated < self.idle_ttl or bucket.locked_until > now:
+               break
+           del self._buckets[key]
+           self.evictions += 1
+
+   def stats(self) -> Dict:
+       """Compteurs de tentatives autorisées / refusées"""
+       return {
+           "name": self.name,
+           "keys": len(self._buckets),
+           "allowed": self.allowed,
+           "rejected": self.rejected,
+           "lockouts": self.lockouts,
+           "evictions": self.evictions
+       }
+
+# ================== LIMITEURS DE L'APPLICATION ==================
+
+def _limiter(name: str, attempts: int, window: float) -> RateLimiter:
+   return RateLimiter(
+       name, attempts, window,
+       lockout_after=settings.ratelimit_lockout_after,
+       lockout_base=settings.ratelimit_lockout_base,
+       lockout_max=settings.ratelimit_lockout_max,
+       max_keys=settings.ratelimit_max_keys
+   )
+
+login_ip_limiter = _limiter("login_ip", settings.ratelimit_login_ip_attempts, settings.ratelimit_login_ip_window)
+login_user_limiter = _limiter("login_user", settings.ratelimit_login_user_attempts, settings.ratelimit_login_user_window)
+reset_ip_limiter = _limiter("reset_ip", settings.ratelimit_reset_ip_attempts, settings.ratelimit_reset_ip_window)
+reset_email_limiter = _limiter("reset_email", settings.ratelimit_reset_email_attempts, settings.ratelimit_reset_email_window)
+
+LIMITERS = (login_ip_limiter, login_user_limiter, reset_ip_limiter, reset_email_limiter)
+
+def client_ip(request: Request) -> str:
+   """Adresse du client (connexion directe)"""
+   return request.client.host if request.client else "unknown"
+
+def check_attempts(*checks) -> Optional[float]:
+   """
+   Vérifie plusieurs (limiteur, clé); retourne le plus long délai si refusé
+   - Toutes les clés consomment un jeton: un script qui varie les usernames
+     reste limité par IP, et inversement
+   """
+   delays = [delay for limiter, key in checks if (delay := limiter.hit(key)) is not None]
+   return max(delays) if delays else None
+
+def enforce_attempts(*checks):
+   """Comme check_attempts mais lève un 429 avec Retry-After"""
+   retry_after = check_attempts(*checks)
+   if retry_after is not None:
+       raise HTTPException(429, "Too many attempts, retry later", headers={"Retry-After": str(int(retry_after) + 1)})
+
+def limiter_statistics() -> Dict[str, Dict]:
+   """Statistiques de tous les limiteurs"""
+   return {limiter.name: limiter.stats() for limiter in LIMITERS}
@@ -0,0 +1,286 @@
+"""
+Génération d'un jeu de données synthétique pour les tests de capacité
+
+Usage:
+   GAMESTORE_DATABASE_PATH=/tmp/big.db python seed.py --reset
+   GAMESTORE_DATABASE_PATH=/tmp/small.db python seed.py --scale 0.01 --seed 7
+   (1k jeux, 10k utilisateurs, ...)
+- Refuse la base par défaut (game_store.db du dépôt) sans --force
+
+Volumes par défaut (--scale 1):
+- 100 000 jeux, 1 000 000 utilisateurs, 10 000 000 achats
+- notes: 30% des achats (--rating-ratio), 2 000 000 messages de chat
+
+Réalisme:
+- Popularité des jeux en loi de Zipf: quelques titres concentrent les achats,
+  les notes et le chat
+- Activité des utilisateurs asymétrique: gros acheteurs et utilisateurs bavards
+- Notes centrées sur une "qualité" propre à chaque jeu
+- Messages datés dans l'ordre des ids (pagination et reprise du chat réalistes)
+
+Performance:
+- INSERT Core en executemany par lots, une transaction par tranche de
+  --commit-every lignes, synchronous=OFF pendant la génération
+- Un seul hachage bcrypt partagé par tous les comptes (mot de passe --password)
+- Agrégats rating_sum / rating_count / rating_avg recalculés en une passe
+  (migrations.backfill_rating_aggregates), puis ANALYZE
+
+Déterminisme:
+- Même graine + mêmes volumes = même base (un générateur par table: changer le
+  nombre de messages ne change pas les achats)
+- Dates calculées depuis une époque fixe (--now, défaut DEFAULT_NOW), jamais
+  depuis l'horloge
+- Ajout possible à une base existante: les ids reprennent après le maximum
+"""
+import argparse
+import bisect
+import itertools
+import os
+import random
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Iterator, List, Sequence
+from sqlalchemy import func, insert, select
+from sqlalchemy.engine import Connection
+from config import Settings, settings
+from models import Base, Game, Message, Purchase, Rating, User, db_path, engine
+from migrations import backfill_rating_aggregates, run_migrations
+from passwords import hash_password_blocking
+
+DEFAULT_NOW = datetime(2025, 1, 1, tzinfo=timezone.utc)
+DEFAULTS = {"games": 100_000, "users": 1_000_000, "purchases": 10_000_000, "messages": 2_000_000}
+
+CATEGORIES = ["RPG", "Strategy", "Racing", "Action", "Adventure", "Simulation", "Sports", "Puzzle", "Shooter", "Horror"]
+PLATFORMS = ["PC", "PlayStation", "Xbox", "Switch", "Mobile"]
+ADJECTIVES = ["Cyber", "Galaxy", "Mystic", "Iron", "Silent", "Crimson", "Hidden", "Lost", "Eternal", "Neon", "Savage", "Frozen"]
+NOUNS = ["Odyssey", "Commander", "Lands", "Legends", "Frontier", "Protocol", "Kingdom", "Racers", "Tactics", "Echoes", "Empire", "Quest"]
+PUBLISHERS = [f"{a} {b}" for a in ("Neon", "Strategy", "Racing", "Fantasy", "Pixel", "Blue") for b in ("Games", "Soft", "Studios", "Interactive")]
+PRICES = [0.0, 4.99, 9.99, 14.99, 19.99, 29.99, 39.99, 49.99, 59.99, 69.99]
+WORDS = ["gg", "nice", "lag", "boss", "raid", "loot", "patch", "build", "speedrun", "team", "anyone", "tonight", "wow", "nerf", "buff"]
+
+# ================== DISTRIBUTIONS ==================
+
+def zipf_cum_weights(n: int, exponent: float) -> List[float]:
+   """Poids cumulés d'une loi de Zipf sur n rangs (rang 0 = le plus populaire)"""
+   return list(itertools.accumulate(1.0 / (rank + 1) ** exponent for rank in range(n)))
+
+class SkewedPicker:
+   """Tirage pondéré d'ids, rangs de popularité mélangés (le plus populaire n'est pas l'id 1)"""
+   def __init__(self, ids: Sequence[int], exponent: float, rng: random.Random):
+       self.ids = list(ids)
+       rng.shuffle(self.ids)
+       self.cum = zipf_cum_weights(len(self.ids), exponent)
+       self.total = self.cum[-1]
+
+   def pick(self, rng: random.Random) -> int:
+       return self.ids[bisect.bisect_left(self.cum, rng.random() * self.total)]
+
+def batched(rows: Iterator[Dict], size: int) -> Iterator[List[Dict]]:
+   while True:
+       batch = list(itertools.islice(rows, size))
+       if not batch:
+           return
+       yield batch
+
+# ================== GÉNÉRATEURS ==================
+
+def game_rows(first_id: int, count: int, rng: random.Random, now: datetime) -> Iterator[Dict]:
+   for game_id in range(first_id, first_id + count):
+       category = rng.choice(CATEGORIES)
+       yield {
+           "game_id": game_id,
+           "title": f"{rng.choice(ADJECTIVES)} {rng.choice(NOUNS)} {game_id}",
+           "description": f"{category} game #{game_id} " + " ".join(rng.choices(WORDS, k=12)),
+           "price": rng.choice(PRICES),
+           "release_date": now - timedelta(days=rng.randint(0, 3650)),
+           "publisher": rng.choice(PUBLISHERS),
+           "category": category,
+           "platforms": ",".join(sorted(rng.sample(PLATFORMS, rng.randint(1, 3)))),
+           "rating_avg": 0.0,
+           "image": f"#{rng.randint(0, 0xFFFFFF):06x}"
+       }
+
+def user_rows(first_id: int, count: int, hashed_password: str, rng: random.Random, now: datetime) -> Iterator[Dict]:
+   for user_id in range(first_id, first_id + count):
+       created_at = now - timedelta(seconds=rng.randint(0, 3 * 365 * 86400))
+       yield {
+           "user_id": user_id,
+           "username": f"user{user_id}",
+           "email": f"user{user_id}@seed.test",
+           "hashed_password": hashed_password,
+           "created_at": created_at,
+           "last_login": created_at + timedelta(seconds=rng.randint(0, int((now - created_at).total_seconds()))),
+           "is_admin": False,
+           "is_banned": rng.random() < 0.001
+       }
+
+def purchase_and_rating_rows(user_ids: Sequence[int], games: SkewedPicker, prices: Dict[int, float], quality: Dict[int, float], purchases: int, rating_ratio: float, rng: random.Random, now: datetime) -> Iterator[tuple]:
+   """
+   Achats (et notes associées) utilisateur par utilisateur
+   - Nombre d'achats par utilisateur en loi de Pareto (gros acheteurs), total ≈ purchases
+   - Jeux distincts par utilisateur (index unique ux_purchases_user_game)
+   """
+   activity = [rng.paretovariate(1.5) for _ in user_ids]
+   scale = purchases / sum(activity)
+   max_per_user = max(1, len(prices) // 2)
+   for user_id, weight in zip(user_ids, activity):
+       wanted = min(max_per_user, int(weight * scale + rng.random()))
+       owned = set()
+       attempts = 0
+       while len(owned) < wanted and attempts < wanted * 4:
+           owned.add(games.pick(rng))
+           attempts += 1
+       for game_id in owned:
+           purchased_at = now - timedelta(seconds=rng.randint(0, 2 * 365 * 86400))
+           yield "purchase", {"user_id": user_id, "game_id": game_id, "price": prices[game_id], "purchase_date": purchased_at}
+           if rng.random() < rating_ratio:
+               value = min(5, max(1, round(rng.gauss(quality[game_id], 1.0))))
+               yield "rating", {"user_id": user_id, "game_id": game_id, "value": value, "created_at": purchased_at + timedelta(days=rng.randint(0, 30))}
+
+def message_rows(count: int, users: SkewedPicker, games: SkewedPicker, rng: random.Random, now: datetime) -> Iterator[Dict]:
+   """Messages dans l'ordre chronologique: auteurs bavards et jeux populaires surreprésentés"""
+   start = now - timedelta(days=365)
+   step = timedelta(days=365) / max(count, 1)
+   for index in range(count):
+       yield {
+           "user_id": users.pick(rng),
+           "game_id": games.pick(rng),
+           "content": " ".join(rng.choices(WORDS, k=rng.randint(1, 12))),
+           "created_at": start + step * index
+       }
+
+# ================== INSERTION ==================
+
+class BulkWriter:
+   """executemany par lots, commit toutes les commit_every lignes"""
+   def __init__(self, conn: Connection, batch_size: int, commit_every: int):
+       self.conn = conn
+       self.batch_size = batch_size
+       self.commit_every = commit_every
+       self.pending = 0
+       self.inserted: Dict[str, int] = {}
+
+   def write(self, table, rows: List[Dict]):
+       if not rows:
+           return
+       self.conn.execute(insert(table), rows)
+       self.inserted[table.__tablename__] = self.inserted.get(table.__tablename__, 0) + len(rows)
+       self.pending += len(rows)
+       if self.pending >= self.commit_every:
+           self.conn.commit()
+           self.pending = 0
+
+   def write_all(self, table, rows: Iterator[Dict]):
+       for batch in batched(rows, self.batch_size):
+           self.write(table, batch)
+       self.conn.commit()
+       self.pending = 0
+
+def parse_now(value: str) -> datetime:
+   """--now: date ISO 8601, UTC si sans fuseau"""
+   moment = datetime.fromisoformat(value)
+   return (moment if moment.tzinfo else moment.replace(tzinfo=timezone.utc)).replace(microsecond=0)
+
+def next_id(conn: Connection, column) -> int:
+   return (conn.scalar(select(func.max(column))) or 0) + 1
+
+def seed(counts: Dict[str, int], seed_value: int, rating_ratio: float, password: str, batch_size: int, commit_every: int, now: datetime = DEFAULT_NOW) -> Dict[str, int]:
+   """Génère le jeu de données (dates relatives à now); retourne le nombre de lignes insérées par table"""
+   rng = lambda name: random.Random(f"{seed_value}:{name}")
+
+   Base.metadata.create_all(bind=engine)
+   run_migrations(engine)
+
+   with engine.connect() as conn:
+       conn.exec_driver_sql("PRAGMA synchronous = OFF")
+       conn.commit()
+       writer = BulkWriter(conn, batch_size, commit_every)
+       started = time.perf_counter()
+
+       def step(label: str):
+           print(f"🌱 {label} ({time.perf_counter() - started:.1f}s)")
+
+       first_game = next_id(conn, Game.game_id)
+       game_rng = rng("games")
+       writer.write_all(Game, game_rows(first_game, counts["games"], game_rng, now))
+       step(f"{counts['games']} jeux")
+
+       first_user = next_id(conn, User.user_id)
+       hashed = hash_password_blocking(password, settings.bcrypt_rounds)
+       writer.write_all(User, user_rows(first_user, counts["users"], hashed, rng("users"), now))
+       step(f"{counts['users']} utilisateurs")
+
+       game_ids = range(first_game, first_game + counts["games"])
+       user_ids = range(first_user, first_user + counts["users"])
+       if game_ids and user_ids:
+           quality_rng = rng("quality")
+           prices = dict(conn.execute(select(Game.game_id, Game.price).where(Game.game_id >= first_game)).all())
+           quality = {game_id: quality_rng.uniform(2.0, 4.8) for game_id in game_ids}
+
+           purchase_rng = rng("purchases")
+           popular_games = SkewedPicker(game_ids, 1.1, purchase_rng)
+           purchases: List[Dict] = []
+           ratings: List[Dict] = []
+           for kind, row in purchase_and_rating_rows(user_ids, popular_games, prices, quality, counts["purchases"], rating_ratio, purchase_rng, now):
+               (purchases if kind == "purchase" else ratings).append(row)
+               if len(purchases) >= batch_size:
+                   writer.write(Purchase, purchases)
+                   purchases = []
+               if len(ratings) >= batch_size:
+                   writer.write(Rating, ratings)
+                   ratings = []
+           writer.write(Purchase, purchases)
+           writer.write(Rating, ratings)
+           conn.commit()
+           step(f"{writer.inserted.get('purchases', 0)} achats, {writer.inserted.get('ratings', 0)} notes")
+
+           message_rng = rng("messages")
+           chatty_users = SkewedPicker(user_ids, 1.2, message_rng)
+           chatty_games = SkewedPicker(game_ids, 1.1, message_rng)
+           writer.write_all(Message, message_rows(counts["messages"], chatty_users, chatty_games, message_rng, now))
+           step(f"{counts['messages']} messages")
+
+       backfill_rating_aggregates(conn)
+       conn.commit()
+       step("agrégats de notes recalculés")
+       conn.exec_driver_sql("ANALYZE")
+       conn.commit()
+       step("statistiques du planificateur (ANALYZE)")
+       return writer.inserted
+
+def parse_args(argv=None):
+   parser = argparse.ArgumentParser(description="Jeu de données synthétique du Game Store (base: GAMESTORE_DATABASE_PATH)")
+   parser.add_argument("--seed", type=int, default=42, help="graine (même graine = même base)")
+   parser.add_argument("--scale", type=float, default=1.0, help="multiplie les volumes par défaut")
+   for name, default in DEFAULTS.items():
+       parser.add_argument(f"--{name}", type=int, default=None, help=f"défaut: {default} x scale")
+   parser.add_argument("--rating-ratio", type=float, default=0.3, help="part des achats notés")
+   parser.add_argument("--password", default="SeedPass1", help="mot de passe de tous les comptes générés")
+   parser.add_argument("--batch-size", type=int, default=10_000, help="lignes par executemany")
+   parser.add_argument("--commit-every", type=int, default=500_000, help="lignes par transaction")
+   parser.add_argument("--now", type=parse_now, default=DEFAULT_NOW, help=f"date de référence des données (défaut: {DEFAULT_NOW.isoformat()})")
+   parser.add_argument("--reset", action="store_true", help="supprime la base avant génération")
+   parser.add_argument("--force", action="store_true", help="autorise la base par défaut du dépôt (game_store.db)")
+   return parser.parse_args(argv)
+
+def main(argv=None):
+   args = parse_args(argv)
+   settings.sql_slow_query_ms = 0  # lots de 10k lignes: lents par construction, log inutile
+   counts = {name: getattr(args, name) if getattr(args, name) is not None else int(default * args.scale) for name, default in DEFAULTS.items()}
+   if db_path == os.path.abspath(Settings.model_fields["database_path"].default) and not args.force:
+       raise SystemExit(
+           f"Refus: {db_path} est la base par défaut du dépôt. "
+           "Indiquer une autre base (GAMESTORE_DATABASE_PATH=/tmp/seed.db) ou ajouter --force."
+       )
+   if args.reset:
+       engine.dispose()
+       for suffix in ("", "-wal", "-shm"):
+           if os.path.exists(db_path + suffix):
+               os.remove(db_path + suffix)
+   print(f"Base: {db_path}")
+   print(f"Volumes: {counts}, graine {args.seed}")
+   inserted = seed(counts, args.seed, args.rating_ratio, args.password, args.batch_size, args.commit_every, args.now)
+   print(f"✅ Terminé: {inserted}")
+
+if __name__ == "__main__":
+   main()
@@ -0,0 +1,204 @@
+"""
+Instrumentation SQL: requêtes attribuées à la requête HTTP courante
+
+Architecture:
+- Événements SQLAlchemy before/after_cursor_execute sur les deux moteurs
+- QueryTraceMiddleware (ASGI pur) ouvre un RequestQueries par requête HTTP,
+  porté par une ContextVar: les requêtes SQL exécutées dans la tâche de la
+  requête (routes, dépendances, lazy loads) lui sont attribuées
+- Tâches de fond (écriture du chat, archiveur): hors requête, comptées
+  uniquement dans les totaux globaux
+
+Détection:
+- Requête lente (> sql_slow_query_ms): log avec route et paramètres (types et
+  longueurs seulement pour les chaînes: aucune donnée sensible)
+- N+1 suspect: même instruction SQL exécutée sql_n_plus_one_threshold fois ou
+  plus dans une requête (typiquement un lazy load dans une boucle)
+
+Exposition:
+- Logs (logger "gamestore.sql")
+- /metrics: requêtes par moteur, durée, requêtes par requête HTTP, lentes, N+1
+- /debug/sql: derniers N+1 et requêtes lentes détectés
+"""
+import logging
+import time
+from collections import deque
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from datetime import date, datetime
+from typing import Deque, Dict, Optional
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from config import settings
+from metrics import Counter, Histogram, db_queries, registry, route_template, statement_kind
+
+logger = logging.getLogger("gamestore.sql")
+
+QUERY_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.5, 1.0)
+PER_REQUEST_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100, 250)
+
+db_query_duration = registry.register(Histogram(
+   "gamestore_db_query_duration_seconds", "Durée d'exécution des requêtes SQL", ("engine",), buckets=QUERY_BUCKETS
+))
+db_request_queries = registry.register(Histogram(
+   "gamestore_db_queries_per_request", "Requêtes SQL par requête HTTP", ("route",), buckets=PER_REQUEST_BUCKETS
+))
+db_request_time = registry.register(Counter(
+   "gamestore_db_request_query_seconds_total", "Temps SQL cumulé des requêtes HTTP", ("route",)
+))
+db_slow_queries = registry.register(Counter(
+   "gamestore_db_slow_queries_total", "Requêtes SQL au-delà de sql_slow_query_ms", ("route",)
+))
+db_n_plus_one = registry.register(Counter(
+   "gamestore_db_n_plus_one_total", "Requêtes HTTP avec une instruction SQL répétée (N+1 suspect)", ("route",)
+))
+
+@dataclass
+class RequestQueries:
+   """Requêtes SQL d'une requête HTTP"""
+   scope: dict
+   count: int = 0
+   total_time: float = 0.0
+   slow: int = 0
+   statements: Dict[str, int] = field(default_factory=dict)
+   closed: bool = False
+   batched: bool = False
+
+   @property
+   def route(self) -> str:
+       return route_template(self.scope)
+
+   @property
+   def method(self) -> str:
+       return self.scope.get("method", "GET")
+
+_current: ContextVar[Optional[RequestQueries]] = ContextVar("gamestore_request_queries", default=None)
+
+# Derniers incidents pour /debug/sql (par worker)
+recent_n_plus_one: Deque[Dict] = deque(maxlen=50)
+recent_slow: Deque[Dict] = deque(maxlen=50)
+
+def current_request_queries() -> Optional[RequestQueries]:
+   """Compteurs de la requête HTTP en cours (None hors requête)"""
+   return _current.get()
+
+def mark_batched():
+   """Requête volontairement découpée en lots (import en masse): pas d'alerte N+1"""
+   queries = _current.get()
+   if queries is not None:
+       queries.batched = True
+
+def _format_parameters(parameters) -> str:
+   """
+   Paramètres pour le log et /debug/sql, sans aucune valeur textuelle
+   - Chaînes et octets réduits à leur type et leur longueur (hash de mot de
+     passe, email, code de reset, contenu de message jamais écrits)
+   - Nombres, booléens, dates et NULL conservés (ids, bornes de pagination)
+   """
+   def describe(value):
+       if isinstance(value, str):
+           return f"<str:{len(value)}>"
+       if isinstance(value, (bytes, bytearray, memoryview)):
+           return f"<bytes:{len(value)}>"
+       if value is None or isinstance(value, (bool, int, float, datetime, date)):
+           return repr(value)
+       return f"<{type(value).__name__}>"
+   if isinstance(parameters, dict):
+       return "{" + ", ".join(f"{k}: {describe(v)}" for k, v in parameters.items()) + "}"
+   if isinstance(parameters, (list, tuple)):
+       if parameters and isinstance(parameters[0], (list, tuple, dict)):
+           return f"[{len(parameters)} lignes] {_format_parameters(parameters[0])}"
+       return "(" + ", ".join(describe(v) for v in parameters) + ")"
+   return describe(parameters)
+
+# ================== ÉVÉNEMENTS SQLALCHEMY ==================
+
+def install_query_tracing(sync_engine: Engine, engine_name: str):
+   """Branche comptage, chronométrage et attribution sur un moteur (sync_engine pour l'async)"""
+
+   def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+       conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+   def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+       elapsed = time.perf_counter() - conn.info["query_start"].pop()
+       db_queries.labels(engine_name, statement_kind(statement)).inc()
+       db_query_duration.labels(engine_name).observe(elapsed)
+
+       queries = _current.get()
+       if queries is not None and queries.closed:
+           queries = None  # tâche lancée pendant une requête terminée depuis
+       if queries is not None:
+           queries.count += 1
+           queries.total_time += elapsed
+           queries.statements[statement] = queries.statements.get(statement, 0) + 1
+
+       threshold = settings.sql_slow_query_ms
+       if threshold > 0 and elapsed * 1000 >= threshold:
+           route = queries.route if queries is not None else "<background>"
+           if queries is not None:
+               queries.slow += 1
+           db_slow_queries.labels(route).inc()
+           recent_slow.append({
+               "route": route,
+               "duration_ms": round(elapsed * 1000, 3),
+               "statement": statement,
+               "parameters": _format_parameters(parameters),
+               "at": time.time()
+           })
+           logger.warning("Requête SQL lente (%.1f ms) sur %s: %s | params=%s", elapsed * 1000, route, " ".join(statement.split()), _format_parameters(parameters))
+
+   def handle_error(exception_context):
+       starts = exception_context.connection.info.get("query_start") if exception_context.connection is not None else None
+       if starts:
+           starts.pop()
+
+   event.listen(sync_engine, "before_cursor_execute", before_cursor_execute)
+   event.listen(sync_engine, "after_cursor_execute", after_cursor_execute)
+   event.listen(sync_engine, "handle_error", handle_error)
+
+# ================== ATTRIBUTION PAR REQUÊTE HTTP ==================
+
+def finish_request(queries: RequestQueries):
+   """Bilan d'une requête HTTP: métriques, puis détection N+1"""
+   queries.closed = True
+   route = queries.route
+   db_request_queries.labels(route).observe(queries.count)
+   if queries.total_time:
+       db_request_time.labels(route).inc(queries.total_time)
+
+   threshold = settings.sql_n_plus_one_threshold
+   if threshold <= 0 or queries.batched or queries.count < threshold:
+       return
+   repeated = {statement: n for statement, n in queries.statements.items() if n >= threshold}
+   if not repeated:
+       return
+   db_n_plus_one.labels(route).inc()
+   for statement, n in sorted(repeated.items(), key=lambda item: -item[1]):
+       recent_n_plus_one.append({"route": route, "method": queries.method, "executions": n, "queries_in_request": queries.count, "statement": statement, "at": time.time()})
+       logger.warning("N+1 suspect sur %s %s: %d× la même requête (%d au total, %.1f ms): %s", queries.method, route, n, queries.count, queries.total_time * 1000, " ".join(statement.split()))
+
+class QueryTraceMiddleware:
+   """Ouvre le suivi SQL de chaque requête HTTP (WebSockets exclus: connexions longues)"""
+   def __init__(self, app):
+       self.app = app
+
+   async def __call__(self, scope, receive, send):
+       if scope["type"] != "http":
+           await self.app(scope, receive, send)
+           return
+       queries = RequestQueries(scope)
+       token = _current.set(queries)
+       try:
+           await self.app(scope, receive, send)
+       finally:
+           _current.reset(token)
+           finish_request(queries)
+
+def sql_statistics() -> Dict:
+   """Derniers incidents détectés par ce worker"""
+   return {
+       "slow_query_ms": settings.sql_slow_query_ms,
+       "n_plus_one_threshold": settings.sql_n_plus_one_threshold,
+       "n_plus_one": list(recent_n_plus_one),
+       "slow_queries": list(recent_slow)
+   }
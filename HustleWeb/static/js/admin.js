@@ -171,25 +171,111 @@ function setupAdminPage() {
         });
     }
     
+    setupUsersPanel();
+    
     const manageUsersTab = document.getElementById('manage-users');
     if (manageUsersTab && manageUsersTab.classList.contains('active')) {
         loadUsers();
     }
 }
 
-async function loadUsers() {
+// État de la liste: filtres appliqués + curseurs de pagination (en-têtes X-Next-Cursor / X-Prev-Cursor)
+const usersState = {
+    filter: {},
+    sort: 'user_id',
+    cursor: null,
+    nextCursor: null,
+    prevCursor: null
+};
+
+function setupUsersPanel() {
+    const searchForm = document.getElementById('users-search-form');
+    if (!searchForm) return;
+    
+    searchForm.addEventListener('submit', (e) => {
+        e.preventDefault();
+        usersState.filter = readUsersFilter();
+        usersState.sort = document.getElementById('search-sort').value;
+        loadUsers();
+    });
+    
+    document.getElementById('users-prev').addEventListener('click', () => {
+        if (usersState.prevCursor) loadUsers({ before: usersState.prevCursor });
+    });
+    document.getElementById('users-next').addEventListener('click', () => {
+        if (usersState.nextCursor) loadUsers({ after: usersState.nextCursor });
+    });
+    
+    document.getElementById('users-select-all').addEventListener('change', (e) => {
+        document.querySelectorAll('.user-select').forEach(box => { box.checked = e.target.checked; });
+    });
+    
+    document.getElementById('bulk-ban-selected').addEventListener('click', () => bulkUpdateSelected(true));
+    document.getElementById('bulk-unban-selected').addEventListener('click', () => bulkUpdateSelected(false));
+    document.getElementById('bulk-ban-filter').addEventListener('click', () => bulkUpdateFilter(true));
+    document.getElementById('bulk-unban-filter').addEventListener('click', () => bulkUpdateFilter(false));
+}
+
+function readUsersFilter() {
+    // Mêmes noms que les paramètres de GET /admin/users et le filtre de /admin/users/ban
+    const filter = {};
+    const username = document.getElementById('search-username').value.trim();
+    const email = document.getElementById('search-email').value.trim();
+    const banned = document.getElementById('search-banned').value;
+    const createdAfter = document.getElementById('search-created-after').value;
+    const createdBefore = document.getElementById('search-created-before').value;
+    
+    if (username) filter.username = username;
+    if (email) filter.email = email;
+    if (banned) filter.banned = banned === 'true';
+    if (createdAfter) filter.created_after = `${createdAfter}T00:00:00Z`;
+    if (createdBefore) {
+        // Borne exclue: lendemain du jour choisi pour l'inclure entièrement
+        const end = new Date(`${createdBefore}T00:00:00Z`);
+        end.setUTCDate(end.getUTCDate() + 1);
+        filter.created_before = end.toISOString();
+    }
+    return filter;
+}
+
+async function loadUsers(cursor = {}) {
+    const params = new URLSearchParams({ ...usersState.filter, sort: usersState.sort });
+    if (cursor.after) params.set('after', cursor.after);
+    if (cursor.before) params.set('before', cursor.before);
+    
     try {
-        const response = await fetch('/admin/users');
+        const response = await fetch(`/admin/users?${params}`);
         if (!response.ok) throw new Error('Erreur serveur');
         
         const users = await response.json();
+        usersState.cursor = cursor;
+        usersState.nextCursor = response.headers.get('X-Next-Cursor');
+        usersState.prevCursor = response.headers.get('X-Prev-Cursor');
         renderUsers(users);
+        updateUsersPagination();
     } catch (err) {
         console.error('Erreur chargement utilisateurs:', err);
         alert('Impossible de charger les utilisateurs');
     }
 }
 
+function reloadUsersPage() {
+    loadUsers(usersState.cursor || {});
+}
+
+function updateUsersPagination() {
+    const prev = document.getElementById('users-prev');
+    const next = document.getElementById('users-next');
+    if (prev) prev.disabled = !usersState.prevCursor;
+    if (next) next.disabled = !usersState.nextCursor;
+    const selectAll = document.getElementById('users-select-all');
+    if (selectAll) selectAll.checked = false;
+}
+
+function formatDate(value) {
+    return value ? new Date(value).toLocaleDateString('fr-FR') : '—';
+}
+
 function renderUsers(users) {
     const tbody = document.getElementById('users-list-body');
     if (!tbody) return;
@@ -199,6 +285,14 @@ function renderUsers(users) {
     users.forEach(user => {
         const tr = document.createElement('tr');
         
+        const tdSelect = document.createElement('td');
+        const selectBox = document.createElement('input');
+        selectBox.type = 'checkbox';
+        selectBox.classList.add('user-select');
+        selectBox.value = user.user_id;
+        selectBox.disabled = user.is_admin;
+        tdSelect.appendChild(selectBox);
+        
         const tdId = document.createElement('td');
         tdId.textContent = user.user_id;
         
@@ -208,31 +302,42 @@ function renderUsers(users) {
         const tdEmail = document.createElement('td');
         tdEmail.textContent = user.email;
         
+        const tdCreated = document.createElement('td');
+        tdCreated.textContent = formatDate(user.created_at);
+        
+        const tdLastLogin = document.createElement('td');
+        tdLastLogin.textContent = formatDate(user.last_login);
+        
         const tdStatus = document.createElement('td');
         const statusSpan = document.createElement('span');
         statusSpan.classList.add('user-status');
         statusSpan.classList.add(user.is_banned ? 'status-banned' : 'status-active');
-        statusSpan.textContent = user.is_banned ? 'Banni' : 'Actif';
+        statusSpan.textContent = user.is_admin ? 'Admin' : (user.is_banned ? 'Banni' : 'Actif');
         tdStatus.appendChild(statusSpan);
         
         const tdActions = document.createElement('td');
-        const actionBtn = document.createElement('button');
-        
-        if (user.is_banned) {
-            actionBtn.classList.add('action-btn', 'unban-btn');
-            actionBtn.textContent = 'Débannir';
-            actionBtn.addEventListener('click', () => unbanUser(user.user_id));
-        } else {
-            actionBtn.classList.add('action-btn', 'ban-btn');
-            actionBtn.textContent = 'Bannir';
-            actionBtn.addEventListener('click', () => banUser(user.user_id));
+        if (!user.is_admin) {
+            const actionBtn = document.createElement('button');
+            
+            if (user.is_banned) {
+                actionBtn.classList.add('action-btn', 'unban-btn');
+                actionBtn.textContent = 'Débannir';
+                actionBtn.addEventListener('click', () => unbanUser(user.user_id));
+            } else {
+                actionBtn.classList.add('action-btn', 'ban-btn');
+                actionBtn.textContent = 'Bannir';
+                actionBtn.addEventListener('click', () => banUser(user.user_id));
+            }
+            
+            tdActions.appendChild(actionBtn);
         }
         
-        tdActions.appendChild(actionBtn);
-        
+        tr.appendChild(tdSelect);
         tr.appendChild(tdId);
         tr.appendChild(tdUsername);
         tr.appendChild(tdEmail);
+        tr.appendChild(tdCreated);
+        tr.appendChild(tdLastLogin);
         tr.appendChild(tdStatus);
         tr.appendChild(tdActions);
         
@@ -240,6 +345,48 @@ function renderUsers(users) {
     });
 }
 
+async function bulkUpdate(banned, body) {
+    try {
+        const response = await fetch(banned ? '/admin/users/ban' : '/admin/users/unban', {
+            method: 'POST',
+            headers: {
+                'Content-Type': 'application/json'
+            },
+            body: JSON.stringify(body)
+        });
+        
+        if (response.ok) {
+            const result = await response.json();
+            alert(`${result.affected} utilisateur(s) ${banned ? 'banni(s)' : 'débanni(s)'}`);
+            reloadUsersPage();
+        } else {
+            const error = await response.text();
+            alert(`Erreur: ${error}`);
+        }
+    } catch (err) {
+        alert('Erreur réseau: ' + err.message);
+    }
+}
+
+async function bulkUpdateSelected(banned) {
+    const userIds = Array.from(document.querySelectorAll('.user-select:checked')).map(box => parseInt(box.value, 10));
+    if (userIds.length === 0) {
+        alert('Aucun utilisateur sélectionné');
+        return;
+    }
+    if (!confirm(`${banned ? 'Bannir' : 'Débannir'} ${userIds.length} utilisateur(s) ?`)) return;
+    await bulkUpdate(banned, { user_ids: userIds });
+}
+
+async function bulkUpdateFilter(banned) {
+    if (Object.keys(usersState.filter).length === 0) {
+        alert('Appliquez d\'abord un filtre de recherche');
+        return;
+    }
+    if (!confirm(`${banned ? 'Bannir' : 'Débannir'} tous les utilisateurs correspondant à la recherche (toutes pages) ?`)) return;
+    await bulkUpdate(banned, { filter: usersState.filter });
+}
+
 async function banUser(userId) {
     if (!confirm('Êtes-vous sûr de vouloir bannir cet utilisateur ?')) return;
     
@@ -249,7 +396,7 @@ async function banUser(userId) {
         });
         
         if (response.ok) {
-            loadUsers();
+            reloadUsersPage();
         } else {
             const error = await response.text();
             alert(`Erreur: ${error}`);
@@ -268,7 +415,7 @@ async function unbanUser(userId) {
         });
         
         if (response.ok) {
-            loadUsers();
+            reloadUsersPage();
         } else {
             const error = await response.text();
             alert(`Erreur: ${error}`);
@@ -198,13 +198,23 @@ function createGameCards(games, featured = false) {
     });
 }
 
-function searchGames() {
+async function searchGames() {
     const searchTerm = document.getElementById('game-search').value.trim().toLowerCase();
     if (!searchTerm) {
         loadGames();
         return;
     }
     
+    // Recherche côté serveur (index FTS5), filtre local en secours
+    try {
+        const response = await fetch(`/api/games/search?q=${encodeURIComponent(searchTerm)}&limit=50`);
+        if (!response.ok) throw new Error(`HTTP error! status: ${response.status}`);
+        displaySearchResults(await response.json(), searchTerm);
+        return;
+    } catch (error) {
+        console.error('Erreur recherche serveur:', error);
+    }
+    
     const results = window.allGames.filter(game => 
         game.title.toLowerCase().includes(searchTerm) || 
         game.description.toLowerCase().includes(searchTerm)
@@ -2,6 +2,12 @@ const allGames = window.allGames || [];
 let currentGame = null;
 let currentUsername = localStorage.getItem('username') || 'Utilisateur';
 let socket = null;
+let socketCanPost = false;
+const pendingAcks = new Map();
+const ACK_TIMEOUT_MS = 5000;
+// Reprise du chat: dernier id affiché, envoyé en ?since= à la reconnexion
+let lastMessageId = 0;
+const seenMessageIds = new Set();
 
 document.addEventListener('DOMContentLoaded', function() {
     if (typeof checkAuth === 'function') {
@@ -161,6 +167,15 @@ async function submitRating(gameId) {
     }
 }
 
+// Clés d'idempotence des achats en cours, par jeu: conservées tant que la réponse n'est pas
+// connue (double clic, erreur réseau), pour qu'une nouvelle tentative ne débite pas deux fois
+const pendingPurchaseKeys = new Map();
+
+function newIdempotencyKey() {
+    if (window.crypto && crypto.randomUUID) return crypto.randomUUID();
+    return `${Date.now().toString(36)}-${Math.random().toString(36).slice(2)}`;
+}
+
 async function processPayment(event, gameId) {
     event.preventDefault();
     
@@ -175,16 +190,22 @@ async function processPayment(event, gameId) {
     }
 
     const confirmButton = document.getElementById('confirm-purchase');
+    if (confirmButton.disabled) return;
     confirmButton.disabled = true;
+    if (!pendingPurchaseKeys.has(gameId)) pendingPurchaseKeys.set(gameId, newIdempotencyKey());
     confirmButton.textContent = 'Traitement...';
 
     try {
         const response = await fetch(`/purchase/${gameId}`, {
             method: 'POST',
-            credentials: 'include'
+            credentials: 'include',
+            headers: {
+                'Idempotency-Key': pendingPurchaseKeys.get(gameId)
+            }
         });
 
         const data = await response.json();
+        pendingPurchaseKeys.delete(gameId);
         
         if (!response.ok) {
             if (response.status === 400 && data.detail.includes("déjà")) {
@@ -265,6 +286,9 @@ function setupForumChat(gameId) {
         });
     }
     
+    // Nouveau jeu: ids suivis repartent de zéro (sinon ?since= viserait l'ancien jeu)
+    lastMessageId = 0;
+    seenMessageIds.clear();
     loadForumMessages(gameId);
     setupWebSocket(gameId);
 }
@@ -272,13 +296,9 @@ function setupForumChat(gameId) {
 function setupWebSocket(gameId) {
     if (socket) socket.close();
 
-    const host = window.location.hostname === 'localhost' 
-        ? '127.0.0.1' 
-        : window.location.hostname;
-
+    // Même hôte que la page: le cookie d'authentification accompagne le handshake
     const protocol = window.location.protocol === 'https:' ? 'wss:' : 'ws:';
-    const port = window.location.port ? `:${window.location.port}` : '';
-    const wsUrl = `${protocol}//${host}${port}/ws/game/${gameId}`;
+    const wsUrl = `${protocol}//${window.location.host}/ws/game/${gameId}`;
 
     console.log('🔌 Connexion WebSocket:', wsUrl);
 
@@ -287,7 +307,8 @@ function setupWebSocket(gameId) {
     const reconnectDelay = 3000;
 
     const connect = () => {
-        socket = new WebSocket(wsUrl);
+        // Reconnexion: le serveur ne renvoie que les messages manqués
+        socket = new WebSocket(lastMessageId > 0 ? `${wsUrl}?since=${lastMessageId}` : wsUrl);
 
         socket.onopen = () => {
             console.log('✅ WebSocket connecté');
@@ -300,6 +321,8 @@ function setupWebSocket(gameId) {
 
         socket.onclose = (event) => {
             console.log(`🔒 WebSocket fermé (${event.code})`);
+            socketCanPost = false;
+            rejectPendingAcks('WebSocket fermé');
             if (reconnectAttempts < maxReconnectAttempts) {
                 setTimeout(() => {
                     console.log(`🔄 Reconnexion (tentative ${reconnectAttempts+1}/${maxReconnectAttempts})`);
@@ -320,6 +343,13 @@ function setupWebSocket(gameId) {
 
             if (msg.type === 'new_message' && msg.data) {
                 addMessageToForum(msg.data);
+            } else if (msg.type === 'hello') {
+                socketCanPost = msg.can_post === true;
+            } else if (msg.type === 'ack' || msg.type === 'error') {
+                settlePendingAck(msg);
+            } else if (msg.type === 'replay_done') {
+                console.log(`🔁 ${msg.count} message(s) rejoué(s) (${msg.source})`);
+                if (msg.truncated) loadForumMessages(gameId);
             } else {
                 console.warn('WS message ignored', msg);
             }
@@ -329,7 +359,16 @@ function setupWebSocket(gameId) {
     connect();
 }
 
+function trackMessageId(id) {
+    if (id === undefined || id === null) return true;
+    if (seenMessageIds.has(id)) return false;
+    seenMessageIds.add(id);
+    if (id > lastMessageId) lastMessageId = id;
+    return true;
+}
+
 function addMessageToForum(messageData) {
+    if (!trackMessageId(messageData.id)) return;  // déjà affiché (rejeu + live)
     const { content, created_at } = messageData;
     const username = messageData.user?.username || 'Anonyme';
     const container = document.getElementById('forum-messages');
@@ -395,6 +434,9 @@ async function loadForumMessages(gameId) {
         const messages = await response.json();
 
         messagesContainer.replaceChildren();
+        lastMessageId = 0;
+        seenMessageIds.clear();
+        messages.forEach(msg => trackMessageId(msg.id));
 
         if (messages.length === 0) {
             const noMessages = document.createElement('div');
@@ -467,6 +509,13 @@ async function sendForumMessage(gameId) {
     sendButton.textContent = 'Envoi...';
     
     try {
+        if (socket && socket.readyState === WebSocket.OPEN && socketCanPost) {
+            const ack = await sendMessageOverSocket(content);
+            messageInput.value = '';
+            console.log('✅ Message envoyé via WebSocket:', ack);
+            return;
+        }
+
         const formData = new URLSearchParams();
         formData.append('content', content);
 
@@ -562,6 +611,41 @@ window.addEventListener('beforeunload', function() {
     }
 });
 
+function sendMessageOverSocket(content) {
+    const clientId = `${Date.now()}-${Math.random().toString(36).slice(2)}`;
+    return new Promise((resolve, reject) => {
+        const timer = setTimeout(() => {
+            pendingAcks.delete(clientId);
+            reject(new Error('Pas de réponse du serveur'));
+        }, ACK_TIMEOUT_MS);
+        pendingAcks.set(clientId, { resolve, reject, timer });
+        socket.send(JSON.stringify({ type: 'send_message', content, client_id: clientId }));
+    });
+}
+
+function settlePendingAck(msg) {
+    const pending = pendingAcks.get(msg.client_id);
+    if (!pending) {
+        if (msg.type === 'error') console.warn('WS error', msg.error);
+        return;
+    }
+    pendingAcks.delete(msg.client_id);
+    clearTimeout(pending.timer);
+    if (msg.type === 'ack') {
+        pending.resolve(msg);
+    } else {
+        pending.reject(new Error(msg.error || 'Message refusé'));
+    }
+}
+
+function rejectPendingAcks(reason) {
+    pendingAcks.forEach(pending => {
+        clearTimeout(pending.timer);
+        pending.reject(new Error(reason));
+    });
+    pendingAcks.clear();
+}
+
 function reconnectWebSocket(gameId) {
     console.log('🔄 Reconnexion manuelle WebSocket...');
     setupWebSocket(gameId);
@@ -66,7 +66,7 @@ function setupPhotoUpload() {
 
             if (response.ok) {
                 const data = await response.json();
-                const newPhotoUrl = data.photo_url + "?t=" + Date.now();
+                const newPhotoUrl = data.photo_url;  // Nom unique par contenu: pas de cache à contourner
                 document.getElementById('profile-pic').src = newPhotoUrl;
                 
                 localStorage.setItem('profilePic', newPhotoUrl);
@@ -96,6 +96,21 @@ function setupTabs() {
     });
 }
 
+// Listes paginées par curseur: suit l'en-tête X-Next-Cursor jusqu'à la dernière page
+async function fetchAllPages(url, options) {
+    const items = [];
+    let cursor = null;
+    do {
+        const params = new URLSearchParams({ limit: '200' });
+        if (cursor) params.set('after', cursor);
+        const response = await fetch(`${url}?${params}`, options);
+        if (!response.ok) throw new Error('Erreur de chargement');
+        items.push(...await response.json());
+        cursor = response.headers.get('X-Next-Cursor');
+    } while (cursor);
+    return items;
+}
+
 async function loadPurchasedGames() {
     const purchasedGamesContainer = document.getElementById('purchased-games');
     
@@ -107,16 +122,12 @@ async function loadPurchasedGames() {
         purchasedGamesContainer.replaceChildren();
         purchasedGamesContainer.appendChild(loader);
         
-        const response = await fetch('/api/user/purchases', {
+        const purchasedGames = await fetchAllPages('/api/user/purchases', {
             headers: {
                 'Authorization': `Bearer ${localStorage.getItem('token')}`
             }
         });
         
-        if (!response.ok) throw new Error('Erreur de chargement');
-        
-        const purchasedGames = await response.json();
-        
         const gamesCountElement = document.getElementById('games-count');
         if (gamesCountElement) {
             gamesCountElement.textContent = purchasedGames.length;
@@ -207,16 +218,12 @@ async function loadUserMessages() {
         messagesContainer.replaceChildren();
         messagesContainer.appendChild(loader);
         
-        const response = await fetch('/api/user/messages', {
+        const userMessages = await fetchAllPages('/api/user/messages', {
             headers: {
                 'Authorization': `Bearer ${localStorage.getItem('token')}`
             }
         });
         
-        if (!response.ok) throw new Error('Erreur de chargement');
-        
-        const userMessages = await response.json();
-        
         messagesContainer.replaceChildren();
         
         if (userMessages.length === 0) {
@@ -0,0 +1,90 @@
+"""
+Fixtures communes des tests (pytest)
+
+Principe:
+- Base SQLite temporaire (GAMESTORE_DATABASE_PATH) fixée avant tout import
+  de l'application: la base de développement n'est jamais touchée
+- Un seul TestClient pour la session: lifespan exécuté une fois, une seule
+  boucle asyncio (client.portal) pour l'application et les appels directs
+- Noms uniques par test: les tests ne dépendent pas de leur ordre
+"""
+import os
+import shutil
+import sqlite3
+import sys
+import tempfile
+import uuid
+import pytest
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+TMP_DIR = tempfile.mkdtemp(prefix="gamestore-tests-")
+os.environ["GAMESTORE_DATABASE_PATH"] = os.path.join(TMP_DIR, "game_store.db")
+os.environ["GAMESTORE_BCRYPT_ROUNDS"] = "4"  # coût minimal: les tests créent beaucoup de comptes
+os.environ["GAMESTORE_RATELIMIT_LOGIN_IP_ATTEMPTS"] = "100000"  # tous les tests partagent l'IP "testclient"
+sys.path.insert(0, APP_DIR)
+
+from fastapi.testclient import TestClient
+import main
+from backend import create_game
+from config import settings
+from models import AsyncSessionLocal
+
+PASSWORD = "Password123"
+ADMIN_USERNAME = "Ziad"  # membre de backend.ListeAdmin
+
+def unique(prefix: str) -> str:
+   """Nom unique (username, titre) pour isoler les tests"""
+   return f"{prefix}_{uuid.uuid4().hex[:10]}"
+
+def query(sql: str, params: tuple = ()) -> list:
+   """Lecture directe de la base de test (hors application)"""
+   conn = sqlite3.connect(settings.database_path)
+   try:
+       return conn.execute(sql, params).fetchall()
+   finally:
+       conn.close()
+
+def execute(sql: str, params: tuple = ()):
+   """Écriture directe par une autre connexion (ex: autre worker, outil externe)"""
+   conn = sqlite3.connect(settings.database_path)
+   try:
+       with conn:
+           conn.execute(sql, params)
+   finally:
+       conn.close()
+
+@pytest.fixture(scope="session")
+def client():
+   with TestClient(main.app) as client:
+       yield client
+   shutil.rmtree(TMP_DIR, ignore_errors=True)
+
+@pytest.fixture
+def login(client):
+   """
+   Inscrit (si besoin) puis connecte un utilisateur sur le client partagé
+   - Le cookie token du client est remplacé: un seul utilisateur actif à la fois
+   """
+   def login(username: str = None, password: str = PASSWORD) -> str:
+       username = username or unique("user")
+       client.post("/signup", data={"username": username, "email": f"{username.lower()}@example.com", "password": password}, follow_redirects=False)
+       response = client.post("/login", data={"username": username, "password": password})
+       assert response.status_code == 200, response.text
+       return username
+   return login
+
+@pytest.fixture
+def login_admin(login):
+   """Connecte le compte administrateur de test"""
+   return lambda: login(ADMIN_USERNAME)
+
+@pytest.fixture
+def add_game(client):
+   """Crée un jeu directement par backend.create_game; retourne son game_id"""
+   def add_game(price: float = 10.0, title: str = None) -> int:
+       async def create():
+           async with AsyncSessionLocal() as db:
+               game = await create_game(db, title=title or unique("Game"), description="Test game", price=price, publisher="Test Publisher", category="Action", platforms="PC")
+               return game.game_id
+       return client.portal.call(create)
+   return add_game
@@ -0,0 +1,46 @@
+"""
+Cache catalogue (backend.catalog_cache): clés préfixées par le compteur
+data_versions, donc aucune donnée périmée après une écriture, y compris une
+écriture faite hors de ce processus
+"""
+from backend import catalog_cache, create_user, get_catalog_game, get_catalog_games, get_catalog_version, record_rating
+from models import AsyncSessionLocal
+from conftest import PASSWORD, execute, unique
+
+def call(client, fn, *args, **kwargs):
+   """Appelle une fonction backend avec sa propre session, dans la boucle du client"""
+   async def run():
+      async with AsyncSessionLocal() as db:
+         return await fn(db, *args, **kwargs)
+   return client.portal.call(run)
+
+def test_repeated_reads_hit_the_cache(client, add_game):
+   game_id = add_game(price=12.5)
+   first = call(client, get_catalog_game, game_id)
+   hits = catalog_cache.hits
+   assert call(client, get_catalog_game, game_id) is first
+   assert catalog_cache.hits == hits + 1
+   assert first["price"] == 12.5
+
+def test_external_write_changes_the_cache_key(client, add_game):
+   game_id = add_game(price=20.0)
+   version, _ = call(client, get_catalog_version)
+   assert call(client, get_catalog_game, game_id)["price"] == 20.0
+
+   # Autre processus (worker, outil SQL): le trigger incrémente la version
+   execute("UPDATE games SET price = 15.0 WHERE game_id = ?", (game_id,))
+   assert call(client, get_catalog_version)[0] > version
+   assert call(client, get_catalog_game, game_id)["price"] == 15.0
+
+def test_new_games_and_ratings_are_visible(client, add_game):
+   before = call(client, get_catalog_games, limit=200)
+   game_id = add_game()
+   after = call(client, get_catalog_games, limit=200)
+   assert game_id not in [game["game_id"] for game in before]
+   assert game_id in [game["game_id"] for game in after]
+
+   assert call(client, get_catalog_game, game_id)["rating_avg"] == 0.0
+   name = unique("rater")
+   user = call(client, create_user, username=name, email=f"{name}@example.com", password=PASSWORD)
+   call(client, record_rating, user.user_id, game_id, 4)
+   assert call(client, get_catalog_game, game_id)["rating_avg"] == 4.0
@@ -0,0 +1,71 @@
+"""
+Import en masse du catalogue (catalog_import.py) et unicité (title, publisher)
+à la création d'un jeu
+"""
+import asyncio
+import json
+from backend import create_game
+from models import AsyncSessionLocal
+from conftest import query, unique
+
+HEADER = "title,price,description,publisher,category,platforms\n"
+
+def import_csv(client, body: str):
+   return client.post("/admin/games/import", content=body.encode("utf-8"), headers={"Content-Type": "text/csv"})
+
+def prices(publisher: str):
+   return dict(query("SELECT title, price FROM games WHERE publisher = ?", (publisher,)))
+
+def test_csv_import_reports_row_errors_and_keeps_valid_rows(client, login_admin):
+   login_admin()
+   publisher = unique("Publisher")
+   body = HEADER + "\n".join([
+      f"Alpha,10,First game,{publisher},Action,PC",
+      f"Bravo,-5,Negative price,{publisher},Action,PC",
+      f"Charlie,abc,Not a price,{publisher},Action,PC",
+      f"Delta,20,Fourth game,{publisher},RPG,PC",
+   ]) + "\n"
+   response = import_csv(client, body)
+   assert response.status_code == 200
+   report = response.json()
+   assert (report["rows"], report["created"], report["updated"], report["failed"]) == (4, 2, 0, 2)
+   assert [error["title"] for error in report["errors"]] == ["Bravo", "Charlie"]
+   assert prices(publisher) == {"Alpha": 10.0, "Delta": 20.0}
+
+   # Même clé (title, publisher): mise à jour, pas de doublon
+   report = import_csv(client, HEADER + f"Alpha,12.5,First game,{publisher},Action,PC\n").json()
+   assert (report["created"], report["updated"], report["failed"]) == (0, 1, 0)
+   assert prices(publisher) == {"Alpha": 12.5, "Delta": 20.0}
+
+def test_ndjson_import_skips_malformed_lines(client, login_admin):
+   login_admin()
+   publisher = unique("Publisher")
+   lines = [
+      json.dumps({"title": "Echo", "price": 5, "description": "Fine", "publisher": publisher, "category": "Puzzle", "platforms": "PC"}),
+      "{not json",
+      json.dumps({"title": "Foxtrot", "price": 7, "publisher": publisher, "category": "Puzzle", "platforms": "PC"}),
+   ]
+   response = client.post("/admin/games/import", params={"format": "ndjson"}, content="\n".join(lines).encode("utf-8"))
+   report = response.json()
+   assert (report["rows"], report["created"], report["failed"]) == (3, 1, 2)
+   assert [error["line"] for error in report["errors"]] == [2, 3]
+   assert prices(publisher) == {"Echo": 5.0}
+
+def test_import_requires_admin(client, login):
+   login()
+   assert import_csv(client, HEADER).status_code == 403
+
+def test_concurrent_create_game_keeps_one_row(client):
+   title, publisher = unique("Game"), unique("Publisher")
+
+   async def create():
+      async with AsyncSessionLocal() as db:
+         return await create_game(db, title=title, description="Race", price=9.99, publisher=publisher, category="Action", platforms="PC")
+
+   async def race():
+      return await asyncio.gather(*(create() for _ in range(5)))
+
+   games = client.portal.call(race)
+   created = [game for game in games if game is not None]
+   assert len(created) == 1
+   assert query("SELECT game_id FROM games WHERE publisher = ?", (publisher,)) == [(created[0].game_id,)]
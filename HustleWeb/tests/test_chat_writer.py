@@ -0,0 +1,62 @@
+"""
+Écriture groupée du chat (chat_writer.ChatWriter): un commit par lot, et un
+message fautif n'empêche pas les autres messages du lot d'être persistés
+"""
+import asyncio
+from datetime import datetime
+from chat_writer import ChatWriter
+from conftest import query
+
+def run_writer(client, messages, on_commit=None):
+   """Soumet les messages en parallèle à un ChatWriter neuf; retourne (résultats, lots diffusés, stats)"""
+   committed = []
+
+   async def record(batch):
+      committed.append([item.message_id for item in batch])
+      if on_commit:
+         await on_commit(batch)
+
+   async def scenario():
+      writer = ChatWriter(record, max_batch=50, window=0.05, max_pending=100)
+      results = await asyncio.gather(*(writer.submit(*message) for message in messages), return_exceptions=True)
+      await writer.close()
+      return results, committed, writer.stats()
+
+   return client.portal.call(scenario)
+
+def stored(game_id: int):
+   return [row[0] for row in query("SELECT content FROM messages WHERE game_id = ? ORDER BY message_id", (game_id,))]
+
+def test_concurrent_messages_share_one_commit(client, add_game):
+   game_id = add_game()
+   results, committed, stats = run_writer(client, [(1, "alice", game_id, f"message {i}") for i in range(5)])
+   assert [result["content"] for result in results] == [f"message {i}" for i in range(5)]
+   assert stats["batches"] == 1 and stats["messages"] == 5
+   assert committed == [[result["id"] for result in results]]
+   assert stored(game_id) == [f"message {i}" for i in range(5)]
+
+   # created_at diffusé = created_at relu par l'historique (UTC naïf des deux côtés)
+   rows = query("SELECT created_at FROM messages WHERE game_id = ? ORDER BY message_id", (game_id,))
+   assert [datetime.fromisoformat(result["created_at"]) for result in results] == [datetime.fromisoformat(row[0]) for row in rows]
+   assert all(datetime.fromisoformat(result["created_at"]).tzinfo is None for result in results)
+
+def test_failing_message_is_isolated_from_its_batch(client, add_game):
+   game_id = add_game()
+   # content NULL: violation NOT NULL, le lot entier échoue puis est rejoué ligne à ligne
+   results, committed, stats = run_writer(client, [(1, "alice", game_id, "first"), (1, "alice", game_id, None), (1, "alice", game_id, "third")])
+   assert isinstance(results[1], RuntimeError)
+   assert results[0]["content"] == "first" and results[2]["content"] == "third"
+   assert stats["failures"] == 1 and stats["messages"] == 2
+   assert committed == [[results[0]["id"]], [results[2]["id"]]]
+   assert stored(game_id) == ["first", "third"]
+
+def test_broadcast_failure_does_not_fail_persisted_messages(client, add_game):
+   game_id = add_game()
+
+   async def broken_broadcast(batch):
+      raise ConnectionError("broker down")
+
+   results, _, stats = run_writer(client, [(1, "alice", game_id, "kept")], on_commit=broken_broadcast)
+   assert results[0]["content"] == "kept" and results[0]["id"] is not None
+   assert stats["failures"] == 0
+   assert stored(game_id) == ["kept"]
@@ -0,0 +1,52 @@
+"""
+Requêtes conditionnelles (conditional.py): 304 sur ETag / date inchangés, et
+ETag toujours calculé depuis la version qui a produit le corps en cache
+"""
+from conftest import execute
+
+def price_of(response, game_id: int) -> float:
+   return next(game["price"] for game in response.json() if game["game_id"] == game_id)
+
+def test_catalog_revalidation_returns_304(client, add_game):
+   add_game()
+   response = client.get("/api/games")
+   etag = response.headers["etag"]
+   assert response.status_code == 200
+   assert etag.startswith('W/"')
+   assert response.headers["cache-control"] == "public, max-age=0, must-revalidate"
+
+   response = client.get("/api/games", headers={"If-None-Match": etag})
+   assert response.status_code == 304
+   assert response.content == b""
+   assert response.headers["etag"] == etag
+
+   response = client.get("/api/games", headers={"If-Modified-Since": response.headers["last-modified"]})
+   assert response.status_code == 304
+
+def test_etag_and_cached_body_describe_the_same_version(client, add_game):
+   game_id = add_game(price=30.0)
+   first = client.get("/api/games", params={"limit": 200})
+   assert price_of(first, game_id) == 30.0
+
+   # Écriture hors de ce processus: la page en cache ne doit plus être servie
+   execute("UPDATE games SET price = 25.0 WHERE game_id = ?", (game_id,))
+   second = client.get("/api/games", params={"limit": 200}, headers={"If-None-Match": first.headers["etag"]})
+   assert second.status_code == 200
+   assert second.headers["etag"] != first.headers["etag"]
+   assert price_of(second, game_id) == 25.0
+
+   third = client.get("/api/games", params={"limit": 200}, headers={"If-None-Match": second.headers["etag"]})
+   assert third.status_code == 304
+
+def test_purchases_etag_is_private_and_follows_purchases(client, login, add_game):
+   login()
+   response = client.get("/api/user/purchases")
+   assert response.headers["cache-control"] == "private, max-age=0, must-revalidate"
+   assert response.headers["vary"] == "Cookie"
+   etag = response.headers["etag"]
+
+   assert client.post(f"/purchase/{add_game()}").status_code == 200
+   response = client.get("/api/user/purchases", headers={"If-None-Match": etag})
+   assert response.status_code == 200
+   assert len(response.json()) == 1
+   assert client.get("/api/user/purchases", headers={"If-None-Match": response.headers["etag"]}).status_code == 304
@@ -0,0 +1,41 @@
+"""
+Limitation des tentatives de connexion (ratelimit.py): par compte (username
+brut en minuscules) avant toute validation, lecture DB ou calcul bcrypt
+"""
+from config import settings
+from conftest import PASSWORD, unique
+
+ATTEMPTS = settings.ratelimit_login_user_attempts
+
+def attempt(client, username: str, password: str = "WrongPassword1"):
+   return client.post("/login", data={"username": username, "password": password})
+
+def test_invalid_username_gets_the_same_401(client):
+   for username in ("x", "not a valid name!", "a" * 40):
+      response = attempt(client, username)
+      assert response.status_code == 401
+      assert response.json() == {"success": False, "error": "Invalid credentials"}
+
+def test_account_locked_after_failed_attempts(client, login):
+   username = login()
+   for _ in range(ATTEMPTS):
+      assert attempt(client, username).status_code == 401
+
+   # Mot de passe correct, autre casse: même compteur, refusé sans vérification
+   response = attempt(client, username.upper(), PASSWORD)
+   assert response.status_code == 429
+   assert int(response.headers["retry-after"]) >= 1
+
+def test_invalid_usernames_are_throttled_too(client):
+   username = unique("bad name!")
+   for _ in range(ATTEMPTS):
+      assert attempt(client, username).status_code == 401
+   assert attempt(client, username).status_code == 429
+
+def test_successful_login_resets_the_account_counter(client, login):
+   username = login()
+   for _ in range(ATTEMPTS - 1):
+      assert attempt(client, username).status_code == 401
+   assert attempt(client, username, PASSWORD).status_code == 200
+   for _ in range(ATTEMPTS - 1):
+      assert attempt(client, username).status_code == 401
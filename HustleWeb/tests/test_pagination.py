@@ -0,0 +1,65 @@
+"""
+Pagination par curseur: aller-retour des curseurs, parcours complet d'une
+liste et rejet (400) des curseurs altérés
+"""
+import base64
+import json
+from datetime import datetime
+import pytest
+from fastapi import HTTPException
+from pagination import decode_cursor, encode_cursor
+
+def raw_cursor(payload) -> str:
+   return base64.urlsafe_b64encode(json.dumps(payload).encode("utf-8")).decode("ascii").rstrip("=")
+
+def test_cursor_round_trip():
+   values = [datetime(2024, 5, 1, 12, 30, 15, 250000), 42]
+   assert decode_cursor(encode_cursor(values), 2) == values
+   assert decode_cursor(encode_cursor(["Title", None, 1.5]), 3) == ["Title", None, 1.5]
+
+@pytest.mark.parametrize("cursor", [
+   "not-base64!",
+   raw_cursor({"id": 1}),
+   raw_cursor([1, 2]),
+   raw_cursor([[1, 2]]),
+   raw_cursor([{"id": 1}]),
+   raw_cursor([{"dt": "yesterday"}]),
+   raw_cursor([{"dt": 3}]),
+   raw_cursor([True]),
+])
+def test_invalid_cursor_is_rejected(cursor):
+   with pytest.raises(HTTPException) as error:
+      decode_cursor(cursor, 1)
+   assert error.value.status_code == 400
+
+def test_games_pages_cover_catalog_once(client, add_game):
+   for _ in range(5):
+      add_game()
+   expected = [game["game_id"] for game in client.get("/api/games", params={"limit": 200}).json()]
+
+   seen, pages, cursor = [], [], None
+   while True:
+      params = {"limit": 2, **({"after": cursor} if cursor else {})}
+      response = client.get("/api/games", params=params)
+      assert response.status_code == 200
+      page = [game["game_id"] for game in response.json()]
+      seen += page
+      pages.append((page, response.headers.get("x-prev-cursor")))
+      cursor = response.headers.get("x-next-cursor")
+      if not cursor:
+         break
+   assert seen == expected == sorted(expected)
+
+   # before=X-Prev-Cursor de la dernière page rend l'avant-dernière page
+   (previous, _), (last, prev_cursor) = pages[-2], pages[-1]
+   response = client.get("/api/games", params={"limit": 2, "before": prev_cursor})
+   assert [game["game_id"] for game in response.json()] == previous
+
+@pytest.mark.parametrize("params", [
+   {"after": raw_cursor([[1]])},
+   {"after": raw_cursor(["1", "2"])},
+   {"before": "%%%"},
+   {"after": raw_cursor([1]), "before": raw_cursor([2])},
+])
+def test_games_invalid_cursor_returns_400(client, params):
+   assert client.get("/api/games", params=params).status_code == 400
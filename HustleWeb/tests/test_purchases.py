@@ -0,0 +1,103 @@
+"""
+Achats (backend.purchase_games) et requêtes rejouables (idempotency.py):
+une nouvelle tentative avec la même Idempotency-Key rejoue la réponse d'origine
+sans second achat
+"""
+import asyncio
+import uuid
+from backend import purchase_games
+from models import AsyncSessionLocal
+from conftest import query
+
+def key() -> str:
+   return str(uuid.uuid4())
+
+def purchase_count(username: str, game_id: int) -> int:
+   return query("SELECT COUNT(*) FROM purchases JOIN users USING (user_id) WHERE username = ? AND game_id = ?", (username, game_id))[0][0]
+
+def test_purchase_retry_replays_the_original_response(client, login, add_game):
+   username = login()
+   game_id = add_game(price=19.99)
+   headers = {"Idempotency-Key": key()}
+
+   first = client.post(f"/purchase/{game_id}", headers=headers)
+   assert first.status_code == 200
+   assert first.json() == {"success": True, "message": "Purchase successful", "price": 19.99}
+   assert "idempotent-replayed" not in first.headers
+
+   retry = client.post(f"/purchase/{game_id}", headers=headers)
+   assert retry.status_code == 200
+   assert retry.json() == first.json()
+   assert retry.headers["idempotent-replayed"] == "true"
+   assert purchase_count(username, game_id) == 1
+
+   # Sans clé, un second achat reste refusé
+   assert client.post(f"/purchase/{game_id}").status_code == 400
+
+def test_key_reused_for_another_request_is_rejected(client, login, add_game):
+   login()
+   headers = {"Idempotency-Key": key()}
+   assert client.post(f"/purchase/{add_game()}", headers=headers).status_code == 200
+   assert client.post(f"/purchase/{add_game()}", headers=headers).status_code == 422
+
+def test_failed_request_releases_its_key(client, login, add_game):
+   username = login()
+   headers = {"Idempotency-Key": key()}
+   assert client.post("/purchase/999999", headers=headers).status_code == 404
+
+   game_id = add_game()
+   assert client.post(f"/purchase/{game_id}", headers=headers).status_code == 200
+   assert purchase_count(username, game_id) == 1
+
+def test_malformed_key_is_rejected(client, login, add_game):
+   login()
+   game_id = add_game()
+   assert client.post(f"/purchase/{game_id}", headers={"Idempotency-Key": "not a key!"}).status_code == 400
+   assert client.post(f"/purchase/{game_id}", headers={"Idempotency-Key": "k" * 101}).status_code == 400
+
+def test_checkout_buys_missing_games_once(client, login, add_game):
+   username = login()
+   owned, first, second = add_game(price=5.0), add_game(price=7.5), add_game(price=2.25)
+   assert client.post(f"/purchase/{owned}").status_code == 200
+
+   headers = {"Idempotency-Key": key()}
+   response = client.post("/cart/checkout", json={"game_ids": [second, first, owned, first]}, headers=headers)
+   assert response.status_code == 200
+   assert response.json() == {
+      "success": True,
+      "purchased": [{"game_id": first, "price": 7.5}, {"game_id": second, "price": 2.25}],
+      "already_owned": [owned],
+      "total": 9.75
+   }
+
+   # Même panier dans un autre ordre: même empreinte, réponse rejouée
+   retry = client.post("/cart/checkout", json={"game_ids": [owned, first, second]}, headers=headers)
+   assert retry.json() == response.json()
+   assert retry.headers["idempotent-replayed"] == "true"
+   assert [purchase_count(username, game_id) for game_id in (owned, first, second)] == [1, 1, 1]
+
+def test_checkout_with_unknown_game_buys_nothing(client, login, add_game):
+   username = login()
+   game_id = add_game()
+   response = client.post("/cart/checkout", json={"game_ids": [game_id, 999999]})
+   assert response.status_code == 404
+   assert purchase_count(username, game_id) == 0
+
+def test_concurrent_purchases_of_the_same_game(client, login, add_game):
+   username = login()
+   game_id = add_game(price=3.0)
+   user_id = query("SELECT user_id FROM users WHERE username = ?", (username,))[0][0]
+
+   async def buy():
+      async with AsyncSessionLocal() as db:
+         result = await purchase_games(db, user_id, [game_id])
+         await db.commit()
+         return result
+
+   async def race():
+      return await asyncio.gather(*(buy() for _ in range(5)))
+
+   results = client.portal.call(race)
+   assert sum(len(result.purchased) for result in results) == 1
+   assert sum(result.already_owned == [game_id] for result in results) == 4
+   assert purchase_count(username, game_id) == 1
@@ -0,0 +1,61 @@
+"""
+Agrégats de notes (backend.record_rating): somme, compte et moyenne tenus à jour
+par un seul UPDATE atomique
+"""
+import asyncio
+from backend import create_user, record_rating
+from models import AsyncSessionLocal
+from conftest import PASSWORD, query, unique
+
+def aggregates(game_id: int):
+   return query("SELECT rating_sum, rating_count, rating_avg FROM games WHERE game_id = ?", (game_id,))[0]
+
+def test_rate_and_revote_update_aggregates(client, login, add_game):
+   game_id = add_game()
+   for rating in (5, 3):
+       login()
+       assert client.post(f"/purchase/{game_id}").status_code == 200
+       response = client.post("/games/rate", json={"game_id": game_id, "rating": rating})
+       assert response.status_code == 200
+   assert response.json()["new_average"] == 4.0
+   assert aggregates(game_id) == (8, 2, 4.0)
+
+   # Re-vote du dernier utilisateur: delta appliqué, compte inchangé
+   response = client.post("/games/rate", json={"game_id": game_id, "rating": 1})
+   assert response.json()["message"] == "Rating updated successfully"
+   assert response.json()["new_average"] == 3.0
+   assert aggregates(game_id) == (6, 2, 3.0)
+
+def test_rating_requires_ownership(client, login, add_game):
+   game_id = add_game()
+   login()
+   response = client.post("/games/rate", json={"game_id": game_id, "rating": 4})
+   assert response.status_code == 403
+   assert aggregates(game_id) == (0, 0, 0.0)
+
+def test_concurrent_ratings_keep_aggregates_consistent(client, add_game):
+   game_id = add_game()
+   values = [1, 2, 3, 4, 5, 5, 4, 3]
+
+   async def rate_all():
+       user_ids = []
+       for _ in values:
+           async with AsyncSessionLocal() as db:
+               name = unique("rater")
+               user = await create_user(db, username=name, email=f"{name}@example.com", password=PASSWORD)
+               user_ids.append(user.user_id)
+
+       async def rate(user_id: int, value: int):
+           async with AsyncSessionLocal() as db:
+               return await record_rating(db, user_id, game_id, value)
+
+       await asyncio.gather(*(rate(user_id, value) for user_id, value in zip(user_ids, values)))
+       # Re-votes concurrents: seul le delta de chaque utilisateur est appliqué
+       await asyncio.gather(*(rate(user_id, 5) for user_id in user_ids[:4]))
+
+   client.portal.call(rate_all)
+   expected = [5, 5, 5, 5, 5, 5, 4, 3]
+   rating_sum, rating_count, rating_avg = aggregates(game_id)
+   assert (rating_sum, rating_count) == (sum(expected), len(expected))
+   assert rating_avg == sum(expected) / len(expected)
+   assert query("SELECT COUNT(*), SUM(value) FROM ratings WHERE game_id = ?", (game_id,))[0] == (len(expected), sum(expected))
@@ -12,15 +12,26 @@ Templates utilisés:
 - index.html, profile.html, browse.html, games.html
 - ratings.html, message.html, admin.html
 """
-from fastapi import Request, APIRouter, HTTPException, Depends
+from fastapi import Request, APIRouter, HTTPException, Depends, Response, Query
 from fastapi.responses import HTMLResponse, RedirectResponse, JSONResponse
 from fastapi.templating import Jinja2Templates
-from backend import get_db, get_all_games, get_game_by_id, get_game_messages, get_current_user, verify_admin
-from models import Game, User, Message, Purchase, Rating
+from backend import (
+    get_db, get_all_games, get_game_by_id, get_game_messages, get_current_user, verify_admin, search_games, Principal,
+    get_catalog_games, catalog_cache,
+    get_catalog_version, get_game_messages_version, get_game_archive_version, get_user_purchases_version,
+    UserFilter
+)
+from conditional import Validator, CACHE_PUBLIC, CACHE_PRIVATE, make_etag, is_not_modified, not_modified_response
+from models import Game, User, Message, MessageArchive, Purchase, Rating
+from pagination import PageParams, Page, page_params, paginate, encode_cursor, decode_cursor
 import pathlib
 import json
 import traceback
-from sqlalchemy.orm import Session, joinedload
+from datetime import datetime
+from typing import Literal, Optional, Tuple
+from sqlalchemy import select
+from sqlalchemy.orm import joinedload, contains_eager
+from sqlalchemy.ext.asyncio import AsyncSession
 
 router = APIRouter()
 
@@ -28,6 +39,14 @@ router = APIRouter()
 templates_path = pathlib.Path(__file__).parent / "templates"
 templates = Jinja2Templates(directory=templates_path)
 
+async def catalog_validator(db: AsyncSession, *parts) -> Tuple[int, Validator]:
+    """
+    Version du catalogue (compteur data_versions) et validateur HTTP de ses représentations
+    - La même version sert de clé au cache catalogue: ETag et corps décrivent les mêmes données
+    """
+    version, updated_at = await get_catalog_version(db)
+    return version, Validator(make_etag("catalog", version, *parts), updated_at, CACHE_PUBLIC)
+
 # ================== PAGES PUBLIQUES ==================
 
 @router.get("/", response_class=HTMLResponse)
@@ -53,7 +72,7 @@ async def forgot_password(request: Request):
 # ================== PAGES AUTHENTIFIÉES ==================
 
 @router.get("/profile")
-async def profile_page(request: Request, user: User = Depends(get_current_user)):
+async def profile_page(request: Request, user: Principal = Depends(get_current_user)):
     """
     Page profil utilisateur
     - Requiert authentification
@@ -71,23 +90,27 @@ async def browse_page(request: Request):
     return templates.TemplateResponse("browse.html", {"request": request})    
 
 @router.get("/games", response_class=HTMLResponse)
-async def browse_games(request: Request):
+async def browse_games(request: Request, db: AsyncSession = Depends(get_db)):
     """
     Page de navigation avec liste des jeux
-    - Charge tous les jeux depuis la DB
+    - 304 si le catalogue n'a pas changé depuis la dernière visite
+    - Charge les jeux via le cache catalogue (DB en cas de miss)
     - Passe les données en JSON pour le JS frontend
     """
-    db = next(get_db())
-    games = get_all_games(db)
+    version, validator = await catalog_validator(db, "browse.html")
+    if is_not_modified(request, validator):
+        return not_modified_response(validator)
+
+    games = await get_catalog_games(db, version=version)
     
     # Préparation des données pour le JavaScript
     games_data = [{
-        "game_id": game.game_id,
-        "title": game.title,
-        "description": game.description,
-        "price": float(game.price),
-        "rating_avg": float(game.rating_avg or 0),
-        "image": game.image or "#333"
+        "game_id": game["game_id"],
+        "title": game["title"],
+        "description": game["description"],
+        "price": game["price"],
+        "rating_avg": game["rating_avg"],
+        "image": game["image"]
     } for game in games]
 
     return templates.TemplateResponse(
@@ -96,7 +119,8 @@ async def browse_games(request: Request):
             "request": request,
             "games": games,
             "games_data": json.dumps(games_data)  # Pour utilisation JS
-        }
+        },
+        headers=validator.headers()
     )
 
 @router.get("/game/{game_id}")
@@ -105,13 +129,12 @@ async def get_game_page(request: Request, game_id: int):
     return templates.TemplateResponse("games.html", {"request": request})
 
 @router.get("/ratings", response_class=HTMLResponse)
-async def ratings_page(request: Request):
+async def ratings_page(request: Request, db: AsyncSession = Depends(get_db)):
     """
     Page des évaluations
     - Affiche les jeux les mieux notés
     """
-    db = next(get_db())
-    top_games = get_all_games(db, limit=10)  # Top 10 games
+    top_games = await get_catalog_games(db, limit=10)  # Top 10 games
     return templates.TemplateResponse(
         "ratings.html",
         {"request": request, "top_games": top_games}
@@ -125,47 +148,116 @@ async def message_page(request: Request):
 # ================== API ENDPOINTS (JSON) ==================
 
 @router.get("/games/{game_id}/messages")
-async def get_messages(game_id: int, db: Session = Depends(get_db)):
+async def get_messages(game_id: int, request: Request, response: Response, page: PageParams = Depends(page_params(100)), db: AsyncSession = Depends(get_db)):
     """
     API: Récupère les messages d'un jeu
-    - Retourne les 100 derniers messages
-    - Triés par date décroissante
+    - Retourne les 100 derniers messages par défaut
+    - Triés par date décroissante, after = historique plus ancien
+    - ETag = dernier message du jeu + dernier message archivé (304 sans relire
+      l'historique; l'archivage retire des messages sans en ajouter)
+    - Pas de Last-Modified: l'archivage ne change pas la date du dernier message
     """
     try:
-        messages = db.query(Message)\
-            .join(User)\
-            .filter(Message.game_id == game_id)\
-            .order_by(Message.created_at.desc())\
-            .limit(100)\
-            .all()
+        last_id, _ = await get_game_messages_version(db, game_id)
+        last_archived_id = await get_game_archive_version(db, game_id)
+        validator = Validator(make_etag("messages", game_id, last_id, last_archived_id), cache_control=CACHE_PUBLIC)
+        if is_not_modified(request, validator):
+            return not_modified_response(validator)
+
+        result = await paginate(
+            db,
+            select(Message)
+            .join(User)
+            .options(contains_eager(Message.user))
+            .where(Message.game_id == game_id),
+            [Message.created_at, Message.message_id],
+            page,
+            descending=True,
+            key_of=lambda msg: (msg.created_at, msg.message_id)
+        )
+        result.apply_headers(response)
+        validator.apply(response)
 
         return [
             {
+                "id": msg.message_id,
                 "content": msg.content,
                 "created_at": msg.created_at.isoformat(),
                 "user": {"username": msg.user.username}
             }
-            for msg in messages
+            for msg in result.items
         ]
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"ERREUR BDD: {str(e)}")
         raise HTTPException(status_code=500)
 
+@router.get("/games/{game_id}/messages/archive")
+async def get_archived_messages(game_id: int, request: Request, response: Response, page: PageParams = Depends(page_params(100)), db: AsyncSession = Depends(get_db)):
+    """
+    API: Historique archivé du chat d'un jeu (messages sortis de la rétention)
+    - Même format que /games/{game_id}/messages, du plus récent au plus ancien
+    - Paginé par message_id (index ix_messages_archive_game)
+    - ETag = dernier message archivé du jeu
+    """
+    last_archived_id = await get_game_archive_version(db, game_id)
+    validator = Validator(make_etag("archive", game_id, last_archived_id), cache_control=CACHE_PUBLIC)
+    if is_not_modified(request, validator):
+        return not_modified_response(validator)
+
+    result = await paginate(
+        db,
+        select(MessageArchive).where(MessageArchive.game_id == game_id),
+        [MessageArchive.message_id],
+        page,
+        descending=True,
+        key_of=lambda msg: (msg.message_id,)
+    )
+    result.apply_headers(response)
+    validator.apply(response)
+
+    return [
+        {
+            "id": msg.message_id,
+            "content": msg.content,
+            "created_at": msg.created_at.isoformat(),
+            "user": {"username": msg.username}
+        }
+        for msg in result.items
+    ]
+
 @router.get("/api/user/purchases")
 async def get_user_purchases(
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    request: Request,
+    response: Response,
+    current_user: Principal = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
 ):
     """
     API: Liste les achats de l'utilisateur connecté
     - Utilise joinedload pour optimiser les requêtes
     - Retourne les infos du jeu avec chaque achat
+    - ETag privé: version des achats + version du catalogue (notes affichées)
     """
     try:
+        count, last_id, last_date = await get_user_purchases_version(db, current_user.user_id)
+        catalog_version, catalog_updated_at = await get_catalog_version(db)
+        last_modified = max((d for d in (last_date, catalog_updated_at) if d), default=None)
+        validator = Validator(
+            make_etag("purchases", current_user.user_id, count, last_id, catalog_version),
+            last_modified, CACHE_PRIVATE
+        )
+        if is_not_modified(request, validator):
+            return not_modified_response(validator)
+        validator.apply(response)
+
         # Eager loading pour éviter N+1 queries
-        purchases = db.query(Purchase).options(joinedload(Purchase.game)).filter(
-            Purchase.user_id == current_user.user_id
-        ).all()
+        purchases = (await db.scalars(
+            select(Purchase).options(joinedload(Purchase.game)).where(
+                Purchase.user_id == current_user.user_id
+            )
+        )).all()
         
         if not purchases:
             return []
@@ -186,6 +278,8 @@ async def get_user_purchases(
         
         return result
         
+    except HTTPException:
+        raise
     except Exception as e:
         traceback.print_exc()
         raise HTTPException(
@@ -195,24 +289,34 @@ async def get_user_purchases(
 
 @router.get("/api/user/messages")
 async def get_user_messages(
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    response: Response,
+    page: PageParams = Depends(page_params()),
+    current_user: Principal = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
 ):
     """
     API: Liste les messages postés par l'utilisateur
-    - Triés par date décroissante
+    - Triés par date décroissante, paginés par curseur
     - Inclut les infos du jeu concerné
     """
     try:
-        messages = db.query(Message).options(joinedload(Message.game)).filter(
-            Message.user_id == current_user.user_id
-        ).order_by(Message.created_at.desc()).all()
+        messages = await paginate(
+            db,
+            select(Message).options(joinedload(Message.game)).where(
+                Message.user_id == current_user.user_id
+            ),
+            [Message.created_at, Message.message_id],
+            page,
+            descending=True,
+            key_of=lambda message: (message.created_at, message.message_id)
+        )
+        messages.apply_headers(response)
         
-        if not messages:
+        if not messages.items:
             return []
 
         result = []
-        for message in messages:
+        for message in messages.items:
             result.append({
                 "message_id": message.message_id,
                 "content": message.content,
@@ -225,6 +329,8 @@ async def get_user_messages(
         
         return result
         
+    except HTTPException:
+        raise
     except Exception as e:
         traceback.print_exc()
         raise HTTPException(
@@ -233,43 +339,119 @@ async def get_user_messages(
         )
 
 @router.get("/api/games")
-async def get_all_games_api(db: Session = Depends(get_db)):
+async def get_all_games_api(request: Request, response: Response, page: PageParams = Depends(page_params()), db: AsyncSession = Depends(get_db)):
     """
-    API: Liste tous les jeux (format JSON)
+    API: Liste les jeux (format JSON)
     - Version simplifiée pour listing
+    - Paginée par game_id croissant, page entière mise en cache
+    - 304 si le catalogue n'a pas changé
     """
+    async def load():
+        games = await paginate(db, select(Game), [Game.game_id], page, key_of=lambda game: (game.game_id,))
+        return Page(
+            items=[{
+                "game_id": game.game_id,
+                "title": game.title,
+                "image": game.image,
+                "price": game.price,
+                "category": game.category
+            } for game in games.items],
+            next_cursor=games.next_cursor,
+            prev_cursor=games.prev_cursor
+        )
+
     try:
-        games = db.query(Game).all()
-        return [{
-            "game_id": game.game_id,
-            "title": game.title,
-            "image": game.image,
-            "price": game.price,
-            "category": game.category
-        } for game in games]
+        version, validator = await catalog_validator(db, "api/games")
+        if is_not_modified(request, validator):
+            return not_modified_response(validator)
+        validator.apply(response)
+
+        # Clé versionnée: une page en cache n'est jamais servie sous l'ETag d'une autre version
+        games = await catalog_cache.get_or_load(("api_games", version, page.limit, page.after, page.before), load)
+        games.apply_headers(response)
+        return games.items
     
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(
             status_code=500,
             detail=f"Erreur serveur: {str(e)}"
         )
 
+@router.get("/api/games/search")
+async def search_games_api(
+    request: Request,
+    response: Response,
+    q: str = Query(..., min_length=1, max_length=100),
+    page: PageParams = Depends(page_params(20)),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    API: Recherche plein texte dans le catalogue (FTS5)
+    - Titre, description, éditeur et catégorie, correspondance par préfixe
+    - Résultats classés par pertinence (bm25)
+    - Pagination par curseur (after uniquement: un classement n'a pas de page précédente stable)
+    """
+    if page.before:
+        raise HTTPException(400, "Search results only support 'after' cursors")
+    after = tuple(decode_cursor(page.after, 2)) if page.after else None
+
+    _, validator = await catalog_validator(db, "api/games/search")
+    if is_not_modified(request, validator):
+        return not_modified_response(validator)
+    validator.apply(response)
+
+    rows = await search_games(db, q, limit=page.limit + 1, after=after)
+    result = Page(items=rows[:page.limit])
+    if len(rows) > page.limit:
+        last = result.items[-1]
+        result.next_cursor = encode_cursor((last.score, last.game_id))
+    result.apply_headers(response)
+
+    return [{
+        "game_id": row.game_id,
+        "title": row.title,
+        "description": row.description,
+        "price": float(row.price),
+        "release_date": row.release_date.isoformat() if row.release_date else None,
+        "publisher": row.publisher,
+        "category": row.category,
+        "platforms": row.platforms,
+        "rating_avg": float(row.rating_avg or 0),
+        "image": row.image or "#333",
+        "score": row.score
+    } for row in result.items]
+
 @router.get("/api/ratings")
-async def get_all_ratings(db: Session = Depends(get_db)):
+async def get_all_ratings(request: Request, response: Response, page: PageParams = Depends(page_params()), db: AsyncSession = Depends(get_db)):
     """
-    API: Liste toutes les évaluations
+    API: Liste les évaluations
     - Eager loading des relations user/game
-    - Retourne les infos complètes
+    - Retourne les infos complètes, paginées par rating_id
+    - 304 si aucune note ni aucun jeu n'a changé (compteur catalogue)
     """
     try:
+        _, validator = await catalog_validator(db, "api/ratings")
+        if is_not_modified(request, validator):
+            return not_modified_response(validator)
+        validator.apply(response)
+
         # Optimisation avec joinedload
-        ratings = db.query(Rating).options(
-            joinedload(Rating.user),
-            joinedload(Rating.game)
-        ).all()
+        ratings = await paginate(
+            db,
+            select(Rating).options(
+                joinedload(Rating.user),
+                joinedload(Rating.game)
+            ),
+            [Rating.rating_id],
+            page,
+            key_of=lambda rating: (rating.rating_id,)
+        )
+        ratings.apply_headers(response)
         
         result = []
-        for rating in ratings:
+        for rating in ratings.items:
             result.append({
                 "rating_id": rating.rating_id,
                 "value": rating.value,
@@ -287,6 +469,8 @@ async def get_all_ratings(db: Session = Depends(get_db)):
         
         return result
         
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(
             status_code=500,
@@ -296,30 +480,73 @@ async def get_all_ratings(db: Session = Depends(get_db)):
 # ================== ADMINISTRATION ==================
 
 @router.get("/admin")
-async def admin_page(request: Request, admin: User = Depends(verify_admin)):
+async def admin_page(request: Request, admin: Principal = Depends(verify_admin)):
     """
     Page d'administration
     - Requiert droits admin
     """
     return templates.TemplateResponse("admin.html", {"request": request})
 
+# Tris de la liste admin: colonnes de clé (la dernière rend la clé unique), ordre décroissant
+USER_SORTS = {
+    "user_id": ([User.user_id], False),
+    "-user_id": ([User.user_id], True),
+    "created_at": ([User.created_at, User.user_id], False),
+    "-created_at": ([User.created_at, User.user_id], True),
+}
+
+def user_filter_params(
+    username: Optional[str] = Query(None, max_length=30),
+    email: Optional[str] = Query(None, max_length=254),
+    banned: Optional[bool] = Query(None),
+    created_after: Optional[datetime] = Query(None),
+    created_before: Optional[datetime] = Query(None),
+    last_login_after: Optional[datetime] = Query(None),
+    last_login_before: Optional[datetime] = Query(None)
+) -> UserFilter:
+    """Dépendance FastAPI: filtres de la liste admin (mêmes noms que le corps de /admin/users/ban)"""
+    return UserFilter(
+        username_prefix=username, email_prefix=email, banned=banned,
+        created_after=created_after, created_before=created_before,
+        last_login_after=last_login_after, last_login_before=last_login_before
+    )
+
 @router.get("/admin/users")
 async def get_users_admin(
-    db: Session = Depends(get_db),
-    admin: User = Depends(verify_admin)
+    response: Response,
+    page: PageParams = Depends(page_params()),
+    user_filter: UserFilter = Depends(user_filter_params),
+    sort: Literal["user_id", "-user_id", "created_at", "-created_at"] = Query("user_id"),
+    db: AsyncSession = Depends(get_db),
+    admin: Principal = Depends(verify_admin)
 ):
     """
-    API Admin: Liste tous les utilisateurs
+    API Admin: Recherche les utilisateurs
+    - Filtres: préfixe username (insensible à la casse) ou email, statut de
+      bannissement, intervalles created_at / last_login
     - Infos sensibles limitées
-    - Inclut statut de bannissement
+    - Paginée par clé (user_id ou created_at, user_id), index ix_users_*
+    - Curseurs liés au tri: les conserver avec les mêmes filtres et le même sort
     """
-    users = db.query(User).all()
+    keys, descending = USER_SORTS[sort]
+    users = await paginate(
+        db,
+        select(User).where(*user_filter.conditions()),
+        keys,
+        page,
+        descending=descending,
+        key_of=lambda u: tuple(getattr(u, key.key) for key in keys)
+    )
+    users.apply_headers(response)
     return [
         {
             "user_id": u.user_id,
             "username": u.username,
             "email": u.email,
-            "is_banned": u.is_banned
-        } 
-        for u in users
+            "is_banned": u.is_banned,
+            "is_admin": u.is_admin,
+            "created_at": u.created_at.isoformat() if u.created_at else None,
+            "last_login": u.last_login.isoformat() if u.last_login else None
+        }
+        for u in users.items
     ]
\ No newline at end of file